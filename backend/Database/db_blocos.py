@@ -0,0 +1,273 @@
+# backend/Database/db_blocos.py
+# -----------------------------------------------------------------------------
+#  Snapshot do banco no Drive em blocos endereçados por conteúdo
+#  • O arquivo <DB_NAME> no Drive passa a ser um manifesto (JSON comprimido)
+#    com a lista ordenada dos blocos que formam o snapshot
+#  • Cada bloco é um trecho de DB_BLOCO_BYTES do arquivo (múltiplo do tamanho
+#    de página), guardado como <DB_NAME>.blk.<sha256>.gz
+#  • Publicar envia só os blocos que ainda não existem no Drive; baixar
+#    busca só os blocos que não estão em cópias locais (base, réplica)
+#  • coletar_lixo() remove blocos que nenhum manifesto recente referencia
+#  Snapshots antigos (arquivo SQLite inteiro, com ou sem gzip) continuam
+#  sendo aceitos no download.
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from Services import Service_googledrive as gdrive
+
+logger = logging.getLogger(__name__)
+
+# Tamanho de cada bloco (arredondado para múltiplo da página do SQLite)
+DB_BLOCO_BYTES = int(os.getenv("DB_BLOCO_BYTES", str(256 * 1024)))
+
+# Blocos não referenciados só são removidos depois deste tempo no Drive
+# (uploads de publicações concorrentes que ainda não gravaram o manifesto)
+DB_BLOCOS_RETENCAO_SECONDS = float(os.getenv("DB_BLOCOS_RETENCAO_SECONDS", "3600"))
+
+FORMATO = "blocos-v1"
+_PAGINA_PADRAO = 4096
+
+
+def _prefixo(db_name: str) -> str:
+    return f"{db_name}.blk."
+
+
+def nome_bloco(db_name: str, hash_bloco: str) -> str:
+    return f"{_prefixo(db_name)}{hash_bloco}.gz"
+
+
+def _tamanho_bloco(caminho: Path) -> int:
+    """DB_BLOCO_BYTES arredondado para múltiplo do tamanho de página do arquivo."""
+    pagina = _PAGINA_PADRAO
+    with open(caminho, "rb") as f:
+        cabecalho = f.read(18)
+    if cabecalho.startswith(b"SQLite format 3\x00") and len(cabecalho) >= 18:
+        pagina = int.from_bytes(cabecalho[16:18], "big")
+        pagina = 65536 if pagina == 1 else (pagina or _PAGINA_PADRAO)
+    return max(pagina, DB_BLOCO_BYTES // pagina * pagina)
+
+
+def _ler_blocos(caminho: Path, tamanho: int) -> Iterator[Tuple[str, bytes]]:
+    with open(caminho, "rb") as f:
+        for dados in iter(lambda: f.read(tamanho), b""):
+            yield hashlib.sha256(dados).hexdigest(), dados
+
+
+def hashes(caminho: Path, tamanho: Optional[int] = None) -> List[str]:
+    """Hashes dos blocos de `caminho` (vazia se o arquivo não existe)."""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return []
+    tamanho = tamanho or _tamanho_bloco(caminho)
+    return [h for h, _ in _ler_blocos(caminho, tamanho)]
+
+# -----------------------------------------------------------------------------
+#  Manifesto ----------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def eh_manifesto(caminho: Path) -> bool:
+    """True se `caminho` (já descomprimido) é um manifesto e não um banco SQLite."""
+    with open(caminho, "rb") as f:
+        return f.read(1) == b"{"
+
+
+def ler_manifesto(caminho: Path) -> dict:
+    manifesto = json.loads(Path(caminho).read_text(encoding="utf-8"))
+    if manifesto.get("formato") != FORMATO:
+        raise IOError(f"Formato de manifesto desconhecido: {manifesto.get('formato')}")
+    return manifesto
+
+
+def gravar_manifesto(manifesto: dict, destino: Path) -> None:
+    """Grava o manifesto comprimido com gzip (é o arquivo <DB_NAME> enviado ao Drive)."""
+    with gzip.open(destino, "wt", encoding="utf-8") as f:
+        json.dump(manifesto, f)
+
+# -----------------------------------------------------------------------------
+#  Blocos no Drive ------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def listar_blocos_remotos(db_name: str, folder_id: str) -> Dict[str, dict]:
+    """{hash: arquivo do Drive} dos blocos existentes na pasta do banco."""
+    prefixo = _prefixo(db_name)
+    blocos = {}
+    for arquivo in gdrive.list_files_by_prefix(prefixo, folder_id):
+        hash_bloco = arquivo["name"][len(prefixo):].split(".", 1)[0]
+        blocos[hash_bloco] = arquivo
+    return blocos
+
+
+def enviar_blocos(caminho: Path, db_name: str, folder_id: str) -> dict:
+    """Envia os blocos de `caminho` que ainda não estão no Drive e devolve o manifesto.
+
+    O manifesto só deve ser publicado depois que esta função retornar: todos
+    os blocos que ele referencia já existem no Drive.
+    """
+    caminho = Path(caminho)
+    tamanho = _tamanho_bloco(caminho)
+    remotos = listar_blocos_remotos(db_name, folder_id)
+    ordem: List[str] = []
+    enviados: Set[str] = set()
+    bytes_enviados = 0
+    sha_total = hashlib.sha256()
+    for hash_bloco, dados in _ler_blocos(caminho, tamanho):
+        sha_total.update(dados)
+        ordem.append(hash_bloco)
+        if hash_bloco in remotos or hash_bloco in enviados:
+            continue
+        temporario = Path(tempfile.gettempdir()) / nome_bloco(db_name, hash_bloco)
+        try:
+            temporario.write_bytes(gzip.compress(dados, compresslevel=6))
+            gdrive.upload_file(str(temporario), folder_id)
+            bytes_enviados += temporario.stat().st_size
+        finally:
+            temporario.unlink(missing_ok=True)
+        enviados.add(hash_bloco)
+
+    logger.info(
+        f"Blocos do snapshot: {len(enviados)} de {len(set(ordem))} enviados "
+        f"({bytes_enviados} bytes comprimidos)."
+    )
+    return {
+        "formato": FORMATO,
+        "bloco_bytes": tamanho,
+        "tamanho": caminho.stat().st_size,
+        "sha256": sha_total.hexdigest(),
+        "blocos": ordem,
+        "criado_em": time.time(),
+    }
+
+
+def _baixar_bloco(hash_bloco: str, remotos: Dict[str, dict]) -> bytes:
+    arquivo = remotos.get(hash_bloco)
+    if arquivo is None:
+        raise IOError(f"Bloco {hash_bloco[:12]} do snapshot não encontrado no Drive.")
+    temporario = Path(tempfile.gettempdir()) / arquivo["name"]
+    try:
+        if not gdrive.download_file(arquivo["id"], str(temporario)):
+            raise IOError(f"Falha ao baixar o bloco {hash_bloco[:12]} do Drive.")
+        dados = gzip.decompress(temporario.read_bytes())
+    finally:
+        temporario.unlink(missing_ok=True)
+    if hashlib.sha256(dados).hexdigest() != hash_bloco:
+        raise IOError(f"Bloco {hash_bloco[:12]} baixado não confere com o hash.")
+    return dados
+
+
+def montar(
+    manifesto: dict,
+    destino: Path,
+    db_name: str,
+    folder_id: str,
+    locais: Iterable[Path] = (),
+) -> int:
+    """Reconstrói em `destino` o arquivo descrito pelo manifesto.
+
+    Blocos encontrados em `locais` (cópias do banco já presentes na máquina)
+    são reaproveitados; os demais são baixados do Drive. Cada bloco e o
+    arquivo final são conferidos pelo sha256. Retorna quantos blocos foram
+    baixados; levanta IOError se algum não puder ser obtido.
+    """
+    tamanho = manifesto["bloco_bytes"]
+    necessarios = set(manifesto["blocos"])
+    # Só a posição dos blocos locais é guardada ({hash: (arquivo, posição)});
+    # eles são relidos na montagem
+    locais_por_hash: Dict[str, Tuple[Path, int]] = {}
+    for local in locais:
+        local = Path(local)
+        if not local.exists() or len(locais_por_hash) == len(necessarios):
+            continue
+        try:
+            for indice, (hash_bloco, _) in enumerate(_ler_blocos(local, tamanho)):
+                if hash_bloco in necessarios:
+                    locais_por_hash.setdefault(hash_bloco, (local, indice * tamanho))
+        except OSError as e:
+            logger.warning(f"Não foi possível ler blocos de {local}: {e}")
+
+    remotos: Optional[Dict[str, dict]] = None
+    baixados: Dict[str, bytes] = {}
+
+    def obter(hash_bloco: str) -> bytes:
+        nonlocal remotos
+        if hash_bloco in baixados:
+            return baixados[hash_bloco]
+        if hash_bloco in locais_por_hash:
+            local, posicao = locais_por_hash[hash_bloco]
+            with open(local, "rb") as origem:
+                origem.seek(posicao)
+                dados = origem.read(tamanho)
+            if hashlib.sha256(dados).hexdigest() == hash_bloco:
+                return dados
+            # A cópia local mudou desde a leitura (ex.: escrita na réplica)
+            del locais_por_hash[hash_bloco]
+        if remotos is None:
+            remotos = listar_blocos_remotos(db_name, folder_id)
+        baixados[hash_bloco] = _baixar_bloco(hash_bloco, remotos)
+        return baixados[hash_bloco]
+
+    temporario = Path(destino).with_name(Path(destino).name + ".montagem")
+    sha_total = hashlib.sha256()
+    try:
+        with open(temporario, "wb") as f:
+            for hash_bloco in manifesto["blocos"]:
+                dados = obter(hash_bloco)
+                sha_total.update(dados)
+                f.write(dados)
+        if sha_total.hexdigest() != manifesto["sha256"] or temporario.stat().st_size != manifesto["tamanho"]:
+            raise IOError("Arquivo montado a partir dos blocos não confere com o manifesto.")
+        temporario.replace(destino)
+    finally:
+        temporario.unlink(missing_ok=True)
+
+    logger.info(
+        f"Snapshot montado: {len(baixados)} de {len(necessarios)} blocos baixados do Drive."
+    )
+    return len(baixados)
+
+
+def _idade(arquivo: dict) -> Optional[float]:
+    """Segundos desde a última modificação do arquivo no Drive (None se desconhecida)."""
+    modificado = arquivo.get("modifiedTime")
+    if not modificado:
+        return None
+    try:
+        instante = datetime.fromisoformat(modificado.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+    return time.time() - instante
+
+
+def coletar_lixo(referenciados: Iterable[str], db_name: str, folder_id: str) -> int:
+    """Remove do Drive os blocos fora de `referenciados` com mais de DB_BLOCOS_RETENCAO_SECONDS.
+
+    `referenciados` deve incluir os blocos do manifesto publicado e do
+    anterior, que ainda pode estar sendo baixado por outra instância.
+    Retorna quantos blocos foram removidos.
+    """
+    manter = set(referenciados)
+    removidos = 0
+    for hash_bloco, arquivo in listar_blocos_remotos(db_name, folder_id).items():
+        if hash_bloco in manter:
+            continue
+        idade = _idade(arquivo)
+        if idade is None or idade < DB_BLOCOS_RETENCAO_SECONDS:
+            continue
+        if gdrive.delete_file(arquivo["id"]):
+            removidos += 1
+    if removidos:
+        logger.info(f"{removidos} bloco(s) sem referência removidos do Drive.")
+    return removidos
@@ -0,0 +1,159 @@
+# backend/Database/db_cache.py
+# -----------------------------------------------------------------------------
+#  Cache de resultados das consultas de listagem (nível de processo)
+#  • em_cache(*tabelas) guarda o resultado por função + argumentos, marcado
+#    com a versão de cada tabela lida
+#  • Escritas confirmadas incrementam a versão das tabelas alteradas
+#    (db_escritas); a troca/atualização da réplica incrementa todas
+#  • Entradas com versão antiga são descartadas na leitura; o total é
+#    limitado por DB_CACHE_MAX_BYTES, com descarte do menos usado (LRU)
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Memória máxima (estimada) ocupada pelos resultados em cache
+DB_CACHE_MAX_BYTES = int(os.getenv("DB_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_versoes: Dict[str, int] = {}
+_epoca = 0   # incrementa quando a réplica inteira muda
+_entradas: "OrderedDict[tuple, tuple]" = OrderedDict()   # chave -> (marca, resultado, bytes)
+_bytes = 0
+_estatisticas = {"acertos": 0, "falhas": 0, "descartes": 0}
+
+# Definidos por db_gestaodecontratos (ver configurar)
+_ignorar: Optional[Callable[[], bool]] = None
+_atualizar: Optional[Callable[[], object]] = None
+
+
+def configurar(ignorar: Callable[[], bool], atualizar: Callable[[], object]) -> None:
+    """Liga o cache à réplica local.
+
+    `ignorar()` True faz a consulta ir direto ao banco (ex.: a thread está com
+    uma transação de escrita aberta e enxergaria dados não confirmados).
+    `atualizar()` é chamado antes de cada leitura do cache, para que a réplica
+    continue sendo atualizada pelo Drive (e o cache invalidado) mesmo quando
+    todas as consultas são atendidas pelo cache.
+    """
+    global _ignorar, _atualizar
+    _ignorar = ignorar
+    _atualizar = atualizar
+
+
+def invalidar(tabelas: Iterable[str]) -> None:
+    """Incrementa a versão das tabelas alteradas; entradas que as leem ficam obsoletas."""
+    with _lock:
+        for tabela in tabelas:
+            _versoes[tabela] = _versoes.get(tabela, 0) + 1
+
+
+def invalidar_tudo() -> None:
+    """Descarta todo o cache (réplica baixada, mesclada ou migrada)."""
+    global _epoca, _bytes
+    with _lock:
+        _epoca += 1
+        _entradas.clear()
+        _bytes = 0
+
+
+def estatisticas() -> dict:
+    with _lock:
+        return {**_estatisticas, "entradas": len(_entradas), "bytes": _bytes}
+
+
+def _marca(tabelas: tuple) -> tuple:
+    return (_epoca, tuple(_versoes.get(t, 0) for t in tabelas))
+
+
+def _tamanho(resultado) -> int:
+    """Estimativa do tamanho em memória de uma lista de linhas."""
+    total = sys.getsizeof(resultado)
+    if isinstance(resultado, (list, tuple)):
+        for linha in resultado:
+            total += sys.getsizeof(linha)
+            try:
+                total += sum(sys.getsizeof(v) for v in linha)
+            except TypeError:
+                pass
+    return total
+
+
+def _guardar(chave: tuple, marca: tuple, resultado) -> None:
+    global _bytes
+    tamanho = _tamanho(resultado)
+    if tamanho > DB_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        if marca[0] != _epoca:
+            return  # a réplica mudou durante a consulta
+        antiga = _entradas.pop(chave, None)
+        if antiga is not None:
+            _bytes -= antiga[2]
+        _entradas[chave] = (marca, resultado, tamanho)
+        _bytes += tamanho
+        while _bytes > DB_CACHE_MAX_BYTES and _entradas:
+            _, (_, _, liberado) = _entradas.popitem(last=False)
+            _bytes -= liberado
+            _estatisticas["descartes"] += 1
+
+
+def _congelar(valor):
+    """Listas/conjuntos viram tuplas para poderem compor a chave do cache."""
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, (set, frozenset)):
+        return tuple(sorted(valor, key=repr))
+    return valor
+
+
+def em_cache(*tabelas: str):
+    """Decorator: guarda o resultado (lista) por argumentos até uma das `tabelas` mudar.
+
+    Devolve uma cópia rasa da lista, para que o chamador possa alterá-la.
+    """
+    def decorador(func):
+        nome = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _ignorar is not None and _ignorar():
+                return func(*args, **kwargs)
+            if _atualizar is not None:
+                _atualizar()
+            try:
+                chave = (
+                    nome,
+                    _congelar(args),
+                    tuple(sorted((k, _congelar(v)) for k, v in kwargs.items())),
+                )
+                hash(chave)
+            except TypeError:
+                return func(*args, **kwargs)  # argumentos não hashable (ex.: dict)
+
+            with _lock:
+                marca = _marca(tabelas)
+                entrada = _entradas.get(chave)
+                if entrada is not None and entrada[0] == marca:
+                    _entradas.move_to_end(chave)
+                    _estatisticas["acertos"] += 1
+                    return list(entrada[1])
+                _estatisticas["falhas"] += 1
+
+            # A marca é tirada antes da consulta: uma escrita concorrente a deixa obsoleta
+            resultado = func(*args, **kwargs)
+            _guardar(chave, marca, resultado)
+            return list(resultado)
+
+        wrapper.tabelas = tabelas
+        return wrapper
+    return decorador
@@ -0,0 +1,405 @@
+# backend/Database/db_changeset.py
+# -----------------------------------------------------------------------------
+#  Sincronização incremental (delta) do banco com o Google Drive
+#  • Triggers registram cada INSERT / UPDATE / DELETE em _sync_changelog
+#  • publicar_changeset() envia só as linhas alteradas como um JSON pequeno
+#    comprimido (<DB_NAME>.chg.<timestamp>_<origem>.json.gz) na pasta do banco
+#  • aplicar_changesets_remotos() reexecuta na réplica os changesets que
+#    ela ainda não conhece (_sync_aplicados)
+#  • a compactação (db_gestaodecontratos.compactar_changesets) publica um snapshot
+#    completo e remove os changesets já incorporados a ele
+#
+#  As linhas são identificadas pela chave natural da tabela
+#  (db_merge.CHAVES_NATURAIS), com o rowid como último recurso; vale a última
+#  escrita, exceto quando a réplica tem alteração própria ainda não publicada
+#  na mesma linha: a local é mantida e o conflito fica registrado.
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import contextlib
+import gzip
+import json
+import logging
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from Services import Service_googledrive as gdrive
+from Database import db_merge
+
+logger = logging.getLogger(__name__)
+
+CHANGELOG_TABLE = "_sync_changelog"
+APLICADOS_TABLE = "_sync_aplicados"
+_PREFIXO_INTERNO = ("_sync_", "sqlite_")
+
+# Identifica os changesets gerados por este processo
+ORIGEM = uuid.uuid4().hex[:8]
+
+# -----------------------------------------------------------------------------
+#  Captura de alterações --------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def _tabelas_capturadas(conn: sqlite3.Connection) -> List[str]:
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+    ).fetchall()
+    return [r[0] for r in rows if not r[0].startswith(_PREFIXO_INTERNO)]
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> List[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{tabela}")').fetchall()]
+
+
+def _sql_triggers(tabela: str, colunas: List[str]) -> dict[str, str]:
+    """Gera o SQL dos três triggers de captura de uma tabela.
+
+    Exclusões guardam a linha removida, para que a réplica que reexecuta o
+    changeset a encontre pela chave natural. Colunas locais da réplica
+    (db_merge.CHAVES_INTEIRAS) ficam de fora, e um UPDATE só delas não é capturado.
+    """
+    locais = db_merge.colunas_locais(tabela)
+    colunas = [c for c in colunas if c not in locais]
+    quando_atualiza = "AFTER UPDATE"
+    if locais:
+        quando_atualiza += " OF " + ", ".join(f'"{c}"' for c in colunas)
+    def dados(ref: str) -> str:
+        par = ", ".join(f"'{c}', {ref}.\"{c}\"" for c in colunas)
+        return f"json_object({par})"
+    base = f"_sync_{tabela}"
+    insert_log = f"INSERT INTO {CHANGELOG_TABLE} (tabela, op, row_id, dados)"
+    return {
+        f"{base}_ins": (
+            f'CREATE TRIGGER {base}_ins AFTER INSERT ON "{tabela}" BEGIN '
+            f"{insert_log} VALUES ('{tabela}', 'U', NEW.rowid, {dados('NEW')}); END"
+        ),
+        f"{base}_upd": (
+            f'CREATE TRIGGER {base}_upd {quando_atualiza} ON "{tabela}" BEGIN '
+            f"{insert_log} VALUES ('{tabela}', 'U', NEW.rowid, {dados('NEW')}); END"
+        ),
+        f"{base}_del": (
+            f'CREATE TRIGGER {base}_del AFTER DELETE ON "{tabela}" BEGIN '
+            f"{insert_log} VALUES ('{tabela}', 'D', OLD.rowid, {dados('OLD')}); END"
+        ),
+    }
+
+
+def instalar_captura(conn: sqlite3.Connection) -> bool:
+    """Cria as tabelas de controle e (re)cria os triggers de captura.
+
+    Idempotente: só altera o esquema quando um trigger não existe ou foi
+    gerado para outro conjunto de colunas. Retorna True se algo mudou.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGELOG_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            op TEXT NOT NULL CHECK(op IN ('U', 'D')),
+            row_id INTEGER NOT NULL,
+            dados TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {APLICADOS_TABLE} (
+            nome TEXT PRIMARY KEY,
+            aplicado_em REAL NOT NULL,
+            compactado INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    existentes = dict(conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='trigger' AND name LIKE '\\_sync\\_%' ESCAPE '\\'"
+    ).fetchall())
+    alterou = False
+    for tabela in _tabelas_capturadas(conn):
+        for nome, sql in _sql_triggers(tabela, _colunas(conn, tabela)).items():
+            if existentes.get(nome) == sql:
+                continue
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(sql)
+            alterou = True
+    if alterou:
+        logger.info("Triggers de captura de alterações instalados/atualizados.")
+    return alterou
+
+
+def possui_pendencias(conn: sqlite3.Connection) -> bool:
+    """True se há alterações locais ainda não publicadas."""
+    try:
+        return conn.execute(f"SELECT 1 FROM {CHANGELOG_TABLE} LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        return False  # banco sem captura instalada
+
+
+def ultimo_seq(conn: sqlite3.Connection) -> int:
+    """Maior `seq` presente no changelog (0 se vazio)."""
+    try:
+        return conn.execute(f"SELECT COALESCE(MAX(seq), 0) FROM {CHANGELOG_TABLE}").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def descartar_pendencias(conn: sqlite3.Connection, ate_seq: Optional[int] = None) -> None:
+    """Limpa o changelog (ex.: após publicar um snapshot completo ou baixar um novo).
+
+    Com `ate_seq`, remove apenas as entradas contidas no snapshot publicado.
+    """
+    try:
+        if ate_seq is None:
+            conn.execute(f"DELETE FROM {CHANGELOG_TABLE}")
+        else:
+            conn.execute(f"DELETE FROM {CHANGELOG_TABLE} WHERE seq <= ?", (ate_seq,))
+    except sqlite3.OperationalError:
+        pass
+
+# -----------------------------------------------------------------------------
+#  Publicação -------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def _prefixo(db_name: str) -> str:
+    return f"{db_name}.chg."
+
+
+def _coletar_pendentes(conn: sqlite3.Connection) -> tuple[int, list[dict]]:
+    """Lê o changelog e condensa as entradas no último estado de cada linha."""
+    rows = conn.execute(
+        f"SELECT seq, tabela, op, row_id, dados FROM {CHANGELOG_TABLE} ORDER BY seq"
+    ).fetchall()
+    if not rows:
+        return 0, []
+    ultimo: dict[tuple[str, int], dict] = {}
+    for _seq, tabela, op, row_id, dados in rows:
+        chave = (tabela, row_id)
+        ultimo.pop(chave, None)  # mantém a ordem da última alteração
+        ultimo[chave] = {
+            "t": tabela,
+            "op": op,
+            "id": row_id,
+            "dados": json.loads(dados) if dados else None,
+        }
+    return rows[-1][0], list(ultimo.values())
+
+
+def publicar_changeset(conn: sqlite3.Connection, db_name: str, folder_id: str) -> Optional[str]:
+    """Envia as alterações pendentes como um changeset. Retorna o nome ou None se não havia nada.
+
+    Levanta IOError se o envio falhar; o changelog é mantido para a próxima tentativa.
+    """
+    max_seq, linhas = _coletar_pendentes(conn)
+    if not linhas:
+        return None
+
+    nome = f"{_prefixo(db_name)}{time.time():017.6f}_{ORIGEM}.json.gz"
+    caminho = Path(tempfile.gettempdir()) / nome
+    try:
+        with gzip.open(caminho, "wt", encoding="utf-8") as f:
+            json.dump({"origem": ORIGEM, "linhas": linhas}, f, ensure_ascii=False)
+        if not gdrive.upload_file(str(caminho), folder_id):
+            raise IOError(f"Falha ao enviar o changeset {nome} ao Drive.")
+    finally:
+        caminho.unlink(missing_ok=True)
+
+    conn.execute(f"DELETE FROM {CHANGELOG_TABLE} WHERE seq <= ?", (max_seq,))
+    conn.execute(
+        f"INSERT OR IGNORE INTO {APLICADOS_TABLE} (nome, aplicado_em) VALUES (?, ?)",
+        (nome, time.time()),
+    )
+    conn.commit()
+    logger.info(f"Changeset {nome} publicado ({len(linhas)} linha(s)).")
+    return nome
+
+# -----------------------------------------------------------------------------
+#  Reexecução de changesets remotos ----------------------------------------------
+# -----------------------------------------------------------------------------
+
+def _chaves_pendentes(conn: sqlite3.Connection, ate_seq: int) -> dict[tuple, dict]:
+    """Linhas com alteração local ainda não publicada.
+
+    (tabela, chave natural) -> estado local da linha (None se foi excluída).
+    """
+    pendentes: dict[tuple, Optional[dict]] = {}
+    colunas: dict[str, list[str]] = {}
+    for tabela, op, dados in conn.execute(
+        f"SELECT tabela, op, dados FROM {CHANGELOG_TABLE} WHERE seq <= ? ORDER BY seq", (ate_seq,)
+    ).fetchall():
+        if tabela not in colunas:
+            colunas[tabela] = _colunas(conn, tabela)
+        chave = db_merge.chave_natural(tabela, colunas[tabela])
+        linha = json.loads(dados) if dados else None
+        valor = db_merge.valor_chave(chave, linha) if chave else None
+        if valor is not None:
+            pendentes[(tabela, valor)] = None if op == "D" else linha
+    return pendentes
+
+
+def _aplicar_linhas(conn: sqlite3.Connection, linhas: list[dict], pendentes: dict[tuple, Optional[dict]]) -> list[dict]:
+    """Reexecuta as linhas de um changeset. Retorna os conflitos com alterações locais pendentes."""
+    colunas_cache: dict[str, list[str]] = {}
+    conflitos = []
+    for linha in linhas:
+        tabela = linha["t"]
+        if tabela not in colunas_cache:
+            colunas_cache[tabela] = _colunas(conn, tabela)
+        colunas = colunas_cache[tabela]
+        if not colunas:
+            logger.warning(f"Tabela {tabela} do changeset não existe localmente; linha ignorada.")
+            continue
+        locais = db_merge.colunas_locais(tabela)
+        dados = {k: v for k, v in (linha["dados"] or {}).items() if k in colunas and k not in locais}
+        chave = db_merge.chave_natural(tabela, colunas)
+        valor = db_merge.valor_chave(chave, dados) if chave else None
+
+        if valor is None:
+            # Sem chave natural (ou changeset antigo sem a linha excluída): usa o rowid
+            if linha["op"] == "D":
+                conn.execute(f'DELETE FROM "{tabela}" WHERE rowid = ?', (linha["id"],))
+                continue
+            cols = ", ".join(f'"{c}"' for c in dados)
+            marcas = ", ".join("?" for _ in dados)
+            conn.execute(
+                f'INSERT OR REPLACE INTO "{tabela}" ({cols}) VALUES ({marcas})',
+                tuple(dados.values()),
+            )
+            continue
+
+        if (tabela, valor) in pendentes:
+            # A alteração local será publicada depois desta e prevalece
+            local = pendentes[(tabela, valor)]
+            remoto = None if linha["op"] == "D" else dados
+            if db_merge.sem_id(local) != db_merge.sem_id(remoto):
+                conflitos.append({
+                    "tabela": tabela,
+                    "chave": dict(zip(chave, valor)),
+                    "local": local,
+                    "remoto": remoto,
+                })
+            continue
+        if linha["op"] == "D":
+            db_merge.remover_linha(conn, tabela, chave, valor)
+        else:
+            db_merge.gravar_linha(conn, tabela, chave, dados)
+    return conflitos
+
+
+def reaplicar_pendencias(origem: sqlite3.Connection, destino: sqlite3.Connection) -> int:
+    """Reexecuta em `destino` as alterações de `origem` ainda não publicadas.
+
+    Usado quando um snapshot baixado vai substituir a réplica: as escritas
+    confirmadas depois da última publicação passam para o arquivo novo e
+    continuam pendentes nele (a captura é instalada em `destino` antes).
+    Não faz commit. Retorna quantas linhas foram reexecutadas.
+    """
+    if not possui_pendencias(origem):
+        return 0
+    _, linhas = _coletar_pendentes(origem)
+    instalar_captura(destino)
+    _aplicar_linhas(destino, linhas, {})
+    return len(linhas)
+
+
+def _ler_changeset(caminho: Path) -> dict:
+    """Lê um changeset baixado; aceita JSON puro ou comprimido com gzip."""
+    dados = caminho.read_bytes()
+    if dados[:2] == b"\x1f\x8b":
+        dados = gzip.decompress(dados)
+    return json.loads(dados.decode("utf-8"))
+
+
+def listar_changesets_remotos(db_name: str, folder_id: str) -> List[dict]:
+    return gdrive.list_files_by_prefix(_prefixo(db_name), folder_id)
+
+
+def aplicar_changesets_remotos(conn: sqlite3.Connection, db_name: str, folder_id: str) -> int:
+    """Baixa e aplica, em ordem, os changesets ainda não aplicados. Retorna quantos foram aplicados."""
+    aplicados = {r[0] for r in conn.execute(f"SELECT nome FROM {APLICADOS_TABLE}").fetchall()}
+    novos = [f for f in listar_changesets_remotos(db_name, folder_id) if f["name"] not in aplicados]
+    for arquivo in novos:
+        caminho = Path(tempfile.gettempdir()) / arquivo["name"]
+        try:
+            if not gdrive.download_file(arquivo["id"], str(caminho)):
+                raise IOError(f"Falha ao baixar changeset {arquivo['name']}")
+            conteudo = _ler_changeset(caminho)
+        finally:
+            caminho.unlink(missing_ok=True)
+
+        # Os triggers também disparam durante a reexecução; as entradas geradas
+        # são removidas na mesma transação para não serem republicadas.
+        seq_antes = ultimo_seq(conn)
+        try:
+            conflitos = _aplicar_linhas(conn, conteudo["linhas"], _chaves_pendentes(conn, seq_antes))
+            db_merge.registrar_conflitos(conn, conflitos)
+            conn.execute(f"DELETE FROM {CHANGELOG_TABLE} WHERE seq > ?", (seq_antes,))
+            conn.execute(
+                f"INSERT OR IGNORE INTO {APLICADOS_TABLE} (nome, aplicado_em) VALUES (?, ?)",
+                (arquivo["name"], time.time()),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        logger.info(f"Changeset {arquivo['name']} aplicado ({len(conteudo['linhas'])} linha(s)).")
+    return len(novos)
+
+# -----------------------------------------------------------------------------
+#  Compactação --------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def changesets_nao_compactados(conn: sqlite3.Connection) -> int:
+    try:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {APLICADOS_TABLE} WHERE compactado = 0"
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def marcar_compactados(conn: sqlite3.Connection) -> List[str]:
+    """Marca todos os changesets aplicados como incorporados ao snapshot. Retorna seus nomes."""
+    nomes = [r[0] for r in conn.execute(
+        f"SELECT nome FROM {APLICADOS_TABLE} WHERE compactado = 0"
+    ).fetchall()]
+    conn.execute(f"UPDATE {APLICADOS_TABLE} SET compactado = 1 WHERE compactado = 0")
+    # Registros antigos só servem para ignorar changesets que ainda não foram removidos
+    conn.execute(
+        f"DELETE FROM {APLICADOS_TABLE} WHERE compactado = 1 AND aplicado_em < ?",
+        (time.time() - 7 * 24 * 3600,),
+    )
+    conn.commit()
+    return nomes
+
+
+def desmarcar_compactados(conn: sqlite3.Connection, nomes: List[str]) -> None:
+    """Desfaz marcar_compactados() quando o snapshot não chegou a ser publicado."""
+    conn.executemany(
+        f"UPDATE {APLICADOS_TABLE} SET compactado = 0 WHERE nome = ?",
+        [(n,) for n in nomes],
+    )
+    conn.commit()
+
+
+def incorporar_aplicados(conn: sqlite3.Connection, snapshot: Path) -> None:
+    """Registra como aplicados os changesets já contidos em `snapshot` (após uma mesclagem)."""
+    with contextlib.closing(sqlite3.connect(str(snapshot))) as origem:
+        try:
+            rows = origem.execute(
+                f"SELECT nome, aplicado_em, compactado FROM {APLICADOS_TABLE}"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {APLICADOS_TABLE} (nome, aplicado_em, compactado) VALUES (?, ?, ?)",
+        rows,
+    )
+
+
+def remover_changesets(nomes: List[str], db_name: str, folder_id: str) -> None:
+    """Remove do Drive os changesets já incorporados a um snapshot publicado."""
+    alvo = set(nomes)
+    for arquivo in listar_changesets_remotos(db_name, folder_id):
+        if arquivo["name"] in alvo:
+            gdrive.delete_file(arquivo["id"])
@@ -0,0 +1,114 @@
+# backend/Database/db_escritas.py
+# -----------------------------------------------------------------------------
+#  Rastreamento das escritas de cada transação
+#  • Triggers TEMP (visíveis só na conexão de escrita do pool) registram, a
+#    cada INSERT / UPDATE / DELETE, a tabela e a chave natural da linha
+#  • O registro faz parte da transação: rollback o descarta junto com as
+#    alterações; no commit ele é coletado e entregue aos ouvintes
+#  • Substitui a antiga flag global db_dirty: só transações que de fato
+#    alteraram alguma linha agendam publicação ou invalidam caches
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from typing import Callable, Dict, List, Set
+
+from Database import db_merge
+
+logger = logging.getLogger(__name__)
+
+ESCRITAS_TABLE = "_escritas_transacao"
+_PREFIXO_INTERNO = ("_sync_", "sqlite_")
+
+# {tabela: {chave natural (ou rowid), ...}}
+Escritas = Dict[str, Set[object]]
+
+_ouvintes: List[Callable[[Escritas], None]] = []
+
+
+def registrar_ouvinte(ouvinte: Callable[[Escritas], None]) -> None:
+    """Registra uma função chamada após cada commit que alterou alguma tabela."""
+    if ouvinte not in _ouvintes:
+        _ouvintes.append(ouvinte)
+
+
+def notificar(escritas: Escritas) -> None:
+    """Entrega as escritas confirmadas a todos os ouvintes."""
+    for ouvinte in list(_ouvintes):
+        try:
+            ouvinte(escritas)
+        except Exception as e:
+            logger.error(f"Erro ao notificar escritas confirmadas: {e}")
+
+
+def _expressao_chave(tabela: str, colunas: List[str], ref: str) -> str:
+    chave = db_merge.chave_natural(tabela, colunas)
+    if chave is None:
+        return f"{ref}.rowid"
+    if len(chave) == 1:
+        return f'{ref}."{chave[0]}"'
+    return "json_array(" + ", ".join(f'{ref}."{c}"' for c in chave) + ")"
+
+
+def instalar(conn: sqlite3.Connection) -> None:
+    """Cria os triggers TEMP de rastreamento na conexão, se o esquema mudou.
+
+    Barato quando nada mudou: uma consulta a PRAGMA schema_version.
+    """
+    versao = conn.execute("PRAGMA main.schema_version").fetchone()[0]
+    if getattr(conn, "_escritas_esquema", None) == versao:
+        return
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {ESCRITAS_TABLE} (tabela TEXT NOT NULL, chave)")
+    tabelas = [
+        r[0] for r in conn.execute("SELECT name FROM main.sqlite_master WHERE type='table'").fetchall()
+        if not r[0].startswith(_PREFIXO_INTERNO)
+    ]
+    existentes = {
+        r[0] for r in conn.execute("SELECT name FROM temp.sqlite_master WHERE type='trigger'").fetchall()
+    }
+    for tabela in tabelas:
+        colunas = [r[1] for r in conn.execute(f'PRAGMA main.table_info("{tabela}")').fetchall()]
+        novo = _expressao_chave(tabela, colunas, "NEW")
+        antigo = _expressao_chave(tabela, colunas, "OLD")
+        registro = f"INSERT INTO {ESCRITAS_TABLE} (tabela, chave) VALUES ('{tabela}'"
+        triggers = {
+            f"_escritas_{tabela}_ins": f"AFTER INSERT ON main.\"{tabela}\" BEGIN {registro}, {novo}); END",
+            f"_escritas_{tabela}_upd": (
+                f"AFTER UPDATE ON main.\"{tabela}\" BEGIN {registro}, {antigo}); {registro}, {novo}); END"
+            ),
+            f"_escritas_{tabela}_del": f"AFTER DELETE ON main.\"{tabela}\" BEGIN {registro}, {antigo}); END",
+        }
+        for nome, corpo in triggers.items():
+            # Recriados sempre que o esquema muda, pois as colunas da chave podem ter mudado
+            if nome in existentes:
+                conn.execute(f"DROP TRIGGER temp.{nome}")
+            conn.execute(f"CREATE TEMP TRIGGER {nome} {corpo}")
+    conn._escritas_esquema = conn.execute("PRAGMA main.schema_version").fetchone()[0]
+
+
+def marco(conn: sqlite3.Connection) -> int:
+    """Posição atual do registro de escritas da transação (ver contar_desde)."""
+    return conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {ESCRITAS_TABLE}").fetchone()[0]
+
+
+def contar_desde(conn: sqlite3.Connection, inicio: int) -> Dict[str, int]:
+    """{tabela: linhas} registradas depois de `inicio`, inclusive as de ações em cascata."""
+    return dict(conn.execute(
+        f"SELECT tabela, COUNT(*) FROM {ESCRITAS_TABLE} WHERE rowid > ? GROUP BY tabela", (inicio,)
+    ).fetchall())
+
+
+def coletar(conn: sqlite3.Connection) -> Escritas:
+    """Lê e limpa as escritas da transação aberta em `conn` (antes do commit)."""
+    if not conn.in_transaction or getattr(conn, "_escritas_esquema", None) is None:
+        return {}
+    rows = conn.execute(f"SELECT tabela, chave FROM {ESCRITAS_TABLE}").fetchall()
+    if not rows:
+        return {}
+    conn.execute(f"DELETE FROM {ESCRITAS_TABLE}")
+    escritas: Escritas = {}
+    for tabela, chave in rows:
+        escritas.setdefault(tabela, set()).add(chave)
+    return escritas
@@ -8,6 +8,11 @@ import sys
 from pathlib import Path
 import threading
 import contextlib
+import atexit
+import gzip
+import hashlib
+import json
+import shutil
 import logging
 import streamlit as st
 import time
@@ -15,6 +20,7 @@ import time
 # Adiciona o caminho do backend para importar corretamente o módulo do Google Drive
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 from Services import Service_googledrive as gdrive
+from Database import db_blocos, db_cache, db_changeset, db_escritas, db_historico, db_memoria, db_merge, db_migracoes, db_pool, db_sync, db_textos
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -24,28 +30,230 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 DB_NAME = "db_gestaodecontratos.db"
 DB_PATH = Path(tempfile.gettempdir()) / DB_NAME
-# _last_remote_ts: float = 0.0   # Removido - será usado st.session_state
 
-# Remover cache de conexão por thread
-# _thread_local = threading.local()  # Removido
+# Janela (em segundos) em que a réplica local é considerada atualizada sem consultar o Drive.
+# 0 desativa o lease e volta a verificar o Drive em toda conexão.
+DB_LEASE_SECONDS = float(os.getenv("DB_LEASE_SECONDS", "30"))
 
-# Declaração global da variável db_dirty
-db_dirty = False  # Flag global para indicar se o banco está "sujo"
+# Quantidade de changesets publicados que dispara a compactação em um snapshot completo
+DB_COMPACTAR_APOS = int(os.getenv("DB_COMPACTAR_APOS", "50"))
+
+# Janela (em segundos) em que escritas consecutivas são agrupadas numa única publicação
+DB_SYNC_JANELA_SECONDS = float(os.getenv("DB_SYNC_JANELA_SECONDS", "2"))
+
+# Intervalo máximo (em segundos) entre novas tentativas de publicação após falhas seguidas
+DB_SYNC_BACKOFF_MAX_SECONDS = float(os.getenv("DB_SYNC_BACKOFF_MAX_SECONDS", "300"))
+
+# Versão do Drive sobre a qual a réplica local foi construída (sobrevive a reinícios do processo)
+VERSAO_PATH = DB_PATH.with_name(f"{DB_NAME}.versao.json")
+
+# Cópia da última versão comum com o Drive, usada como base da mesclagem (three-way merge)
+BASE_PATH = DB_PATH.with_name(f"{DB_NAME}.base")
+
+# Fila persistente de publicações pendentes (fora do banco, que é substituído nos downloads)
+OUTBOX_PATH = DB_PATH.with_name(f"{DB_NAME}.outbox")
+
+# Banco histórico (serviços encerrados antigos, db_historico), com arquivo próprio no Drive
+HISTORICO_NAME = "db_gestaodecontratos_historico.db"
+HISTORICO_PATH = DB_PATH.with_name(HISTORICO_NAME)
+HISTORICO_VERSAO_PATH = DB_PATH.with_name(f"{HISTORICO_NAME}.versao.json")
+
+# Download em andamento: irmão da réplica, no mesmo sistema de arquivos, para a troca ser atômica
+DOWNLOAD_PATH = DB_PATH.with_name(f"{DB_NAME}.download")
+
+# Diretório dos arquivos intermediários de upload/download (mantêm o nome DB_NAME no Drive)
+STAGING_DIR = Path(tempfile.gettempdir()) / "db_gestaodecontratos_staging"
+
+# Bloco usado na leitura em streaming (hash/compressão) dos snapshots
+_CHUNK_BYTES = 1024 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+# Conexões de leitura mantidas abertas no pool entre reruns
+DB_POOL_LEITORES = int(os.getenv("DB_POOL_LEITORES", "4"))
+
+# Pragmas aplicados uma vez por conexão: WAL permite leituras durante escritas e
+# durante a cópia do snapshot enviado ao Drive; o restante ajusta cache e E/S
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA mmap_size=268435456",   # 256 MiB mapeados em memória
+    "PRAGMA cache_size=-16384",     # 16 MiB de cache de páginas
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Só as conexões do pool (usadas pelos models) aplicam as chaves estrangeiras e
+# seus ON DELETE CASCADE. As rotinas de sincronização reexecutam linhas de
+# outras réplicas, em qualquer ordem, numa conexão própria sem elas; as
+# exclusões em cascata chegam nos changesets como exclusões explícitas.
+PRAGMA_CHAVES_ESTRANGEIRAS = "PRAGMA foreign_keys=ON"
 
 def marca_sujo() -> None:
-    """Marca o banco como modificado (dirty)."""
-    global db_dirty
-    db_dirty = True
+    """Mantida por compatibilidade com os models; não faz mais nada.
 
-def _remote_modified_ts(file_id: str) -> float:
-    """Obtém o timestamp de modificação de um arquivo no Google Drive."""
-    st.session_state.setdefault("last_remote_ts", 0.0)
-    
-    meta = gdrive.get_service().files().get(
-        fileId=file_id, fields="modifiedTime"
-    ).execute()
-    ts_string = meta["modifiedTime"].split('.')[0] 
-    return time.mktime(time.strptime(ts_string, "%Y-%m-%dT%H:%M:%S"))
+    A publicação no Drive é agendada no commit de toda transação que alterou
+    alguma linha (ver db_escritas e _ao_confirmar_escritas), sem depender de
+    uma flag global compartilhada entre sessões.
+    """
+
+def _ao_confirmar_escritas(escritas: db_escritas.Escritas) -> None:
+    """Invalida o cache das tabelas alteradas, agenda a cópia em memória e a publicação no Drive."""
+    logger.debug(f"Escritas confirmadas: { {t: len(c) for t, c in escritas.items()} }")
+    db_cache.invalidar(escritas)
+    _memoria.agendar_atualizacao()
+    _sincronizador.agendar(_get_drive_folder_id())
+
+db_escritas.registrar_ouvinte(_ao_confirmar_escritas)
+
+# ─────────────── Estado da réplica local (nível de processo) ───────────────
+class _EstadoReplica:
+    """Estado da réplica local compartilhado por todas as sessões do processo.
+
+    Guarda o file_id do banco no Drive, a versão remota sobre a qual a réplica
+    foi construída (md5Checksum/headRevisionId do Drive) e o instante da última
+    verificação, que define o lease de atualização. `lock` serializa
+    verificações, downloads e uploads: só uma sessão fala com o Drive por vez e
+    as demais aguardam o resultado dela. O banco histórico usa uma instância
+    própria (nome, caminho e arquivo de versão dele).
+    """
+
+    def __init__(self, nome: str = DB_NAME, caminho: Path = DB_PATH, versao_path: Path = VERSAO_PATH):
+        self.nome = nome
+        self.caminho = caminho
+        self.versao_path = versao_path
+        self.folder_id: str | None = None
+        self.file_id: str | None = None
+        self.md5: str | None = None      # md5Checksum do snapshot no Drive
+        self.revisao: str | None = None  # headRevisionId do snapshot no Drive
+        self.etag: str | None = None     # etag do snapshot, precondição do upload condicional
+        self.hash_publicado: str | None = None  # SHA-256 do último snapshot (descomprimido) no Drive
+        self.verificado_em: float | None = None  # time.monotonic() da última verificação
+        self.lock = threading.RLock()
+        self.verificacoes = 0  # verificações concluídas contra o Drive
+        self.geracao = 0       # incrementa sempre que o arquivo local é substituído por um download
+
+    def registrar_versao(self, meta: dict) -> None:
+        """Guarda a versão remota (metadados do Drive) que a réplica local reflete."""
+        self.file_id = meta.get("id", self.file_id)
+        self.md5 = meta.get("md5Checksum")
+        self.revisao = meta.get("headRevisionId")
+        self.etag = meta.get("etag")
+        try:
+            self.versao_path.write_text(json.dumps({
+                "folder_id": self.folder_id,
+                "file_id": self.file_id,
+                "md5": self.md5,
+                "revisao": self.revisao,
+                "etag": self.etag,
+                "hash_publicado": self.hash_publicado,
+            }))
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar {self.versao_path.name}: {e}")
+
+    def restaurar_versao(self) -> None:
+        """Recupera a versão registrada por uma execução anterior do processo."""
+        if not self.caminho.exists() or not self.versao_path.exists():
+            return
+        try:
+            dados = json.loads(self.versao_path.read_text())
+        except (OSError, ValueError):
+            return
+        self.folder_id = dados.get("folder_id")
+        self.file_id = dados.get("file_id")
+        self.md5 = dados.get("md5")
+        self.revisao = dados.get("revisao")
+        self.etag = dados.get("etag")
+        self.hash_publicado = dados.get("hash_publicado")
+
+    def lease_valido(self, folder_id: str) -> bool:
+        """True se a réplica local pode ser usada sem consultar o Drive."""
+        if self.verificado_em is None or folder_id != self.folder_id:
+            return False
+        if not self.caminho.exists():
+            return False
+        return (time.monotonic() - self.verificado_em) < DB_LEASE_SECONDS
+
+    def renovar_lease(self) -> None:
+        self.verificado_em = time.monotonic()
+        self.verificacoes += 1
+
+    def invalidar(self) -> None:
+        """Força a próxima conexão a verificar o Drive."""
+        self.verificado_em = None
+
+    def obter_file_id(self, folder_id: str) -> str | None:
+        """Devolve o file_id do banco, consultando o Drive apenas quando não está em cache."""
+        if folder_id != self.folder_id:
+            self.folder_id = folder_id
+            self.file_id = None
+            self.md5 = None
+            self.revisao = None
+            self.etag = None
+            self.hash_publicado = None
+            self.verificado_em = None
+        if not self.file_id:
+            self.file_id = gdrive.get_file_id_by_name(self.nome, folder_id)
+        return self.file_id
+
+_replica = _EstadoReplica()
+_replica.restaurar_versao()
+
+def _conectar(caminho: Path = DB_PATH, **kwargs) -> sqlite3.Connection:
+    """Abre uma conexão SQLite com os pragmas padrão do projeto."""
+    conn = sqlite3.connect(str(caminho), **kwargs)
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
+    return conn
+
+# Cópia em memória da réplica, aberta pelas conexões de leitura do pool
+_memoria = db_memoria.ReplicaMemoria(
+    DB_PATH,
+    lambda: _conectar(DB_PATH, check_same_thread=False),
+    lambda: _replica.geracao,
+)
+
+def _abrir_conexao_pool(somente_leitura: bool) -> db_pool.ConexaoPool:
+    """Abre uma conexão para o pool, já com os pragmas e row_factory do projeto.
+
+    Leitores abrem a cópia em memória da réplica; se ela ainda não acompanha
+    o último commit, ou se a réplica não couber em memória, leem o arquivo
+    como o escritor.
+    """
+    if somente_leitura:
+        conn = _memoria.abrir_leitor(factory=db_pool.ConexaoPool)
+        if conn is not None:
+            conn.execute(PRAGMA_CHAVES_ESTRANGEIRAS)
+            conn.row_factory = sqlite3.Row
+            return conn
+    conn = _conectar(DB_PATH, check_same_thread=False, factory=db_pool.ConexaoPool)
+    conn.execute(PRAGMA_CHAVES_ESTRANGEIRAS)
+    conn.row_factory = sqlite3.Row
+    if somente_leitura:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+# Pool do processo. As rotinas de sincronização (download, changesets, snapshot)
+# usam conexões próprias de curta duração para não disputar o escritor com as
+# sessões enquanto seguram _replica.lock.
+_pool = db_pool.PoolConexoes(
+    _abrir_conexao_pool,
+    lambda: _replica.geracao,
+    max_leitores_ociosos=DB_POOL_LEITORES,
+    versao_leitores=lambda: _memoria.versao() if _memoria.ativa() else _replica.geracao,
+)
+
+# Cache das listagens: ignorado por quem está com a conexão de escrita (veria
+# dados não confirmados) e sempre precedido da verificação do lease da réplica
+db_cache.configurar(ignorar=_pool.possui_escritor, atualizar=lambda: baixar_banco_do_drive())
+
+def invalidar_lease() -> None:
+    """Descarta o lease atual; a próxima conexão verifica a versão no Drive."""
+    _replica.invalidar()
+
+def _versao_remota(file_id: str) -> dict:
+    """Obtém a versão atual (md5Checksum, headRevisionId e etag) de um arquivo no Google Drive."""
+    return gdrive.get_file_version(file_id)
 
 def _get_drive_folder_id():
     """Obtém o ID da pasta do Drive do session_state ou do secrets.toml"""
@@ -68,7 +276,7 @@ def autenticar_usuario(usuario: str, senha: str) -> tuple[bool, str, str]:
     conn = None
     try:
         caminho_banco = baixar_banco_do_drive()
-        conn = sqlite3.connect(str(caminho_banco))
+        conn = _conectar(caminho_banco)
         cursor = conn.cursor()
         cursor.execute(
             "SELECT tipo, nome FROM usuarios WHERE usuario = ? AND senha = ?",
@@ -89,51 +297,272 @@ def autenticar_usuario(usuario: str, senha: str) -> tuple[bool, str, str]:
 
 # ─────────────── Baixar banco do Google Drive ───────────────
 def baixar_banco_do_drive():
-    """Baixa o banco de dados do Google Drive"""
+    """Garante uma réplica local atualizada do banco e devolve o caminho.
+
+    Dentro do lease (DB_LEASE_SECONDS) a réplica local é usada sem nenhuma
+    chamada ao Drive. Fora dele, apenas uma sessão por vez verifica o Drive
+    (single-flight); as que chegam durante a verificação aguardam e reutilizam
+    o resultado em vez de iniciar seus próprios downloads.
+    """
     try:
         folder_id = _get_drive_folder_id()
-        logger.info(f"Usando pasta do Drive: {folder_id}")
-        
-        st.session_state.setdefault("last_remote_ts", 0.0)
-            
-        file_id = gdrive.get_file_id_by_name(DB_NAME, folder_id)
-        if not file_id:
-            logger.warning(f"Arquivo {DB_NAME} não encontrado no Drive. Tentando usar/criar banco local.")
-            if not DB_PATH.exists():
-                conn_temp = sqlite3.connect(str(DB_PATH))
-                inicializar_tabelas(conn_temp)
-                conn_temp.commit()
-                conn_temp.close()
-                logger.info(f"Novo banco de dados local criado: {DB_PATH}. Será enviado ao Drive na próxima operação de escrita.")
+        if _replica.lease_valido(folder_id):
             return DB_PATH
 
-        remote_ts = _remote_modified_ts(file_id)
-        
-        if DB_PATH.exists() and remote_ts <= st.session_state.get("last_remote_ts", 0.0):
-            logger.info("Versão local já está atualizada; download evitado.")
-            return DB_PATH
-            
-        caminho_local = DB_PATH
-        gdrive.download_file(file_id, caminho_local)
-        st.session_state["last_remote_ts"] = remote_ts
-        logger.info(f"Banco de dados baixado com sucesso: {caminho_local}")
-        return caminho_local
+        vistas = _replica.verificacoes
+        with _replica.lock:
+            # Outra sessão concluiu uma verificação enquanto aguardávamos o lock
+            if _replica.verificacoes != vistas and _replica.folder_id == folder_id and DB_PATH.exists():
+                return DB_PATH
+            if _replica.lease_valido(folder_id):
+                return DB_PATH
+            return _atualizar_replica(folder_id)
     except Exception as e:
         logger.error(f"Erro ao baixar banco do Drive: {str(e)}")
         raise
 
+
+def _atualizar_replica(folder_id: str) -> Path:
+    """Verifica a versão remota e baixa o banco se houver cópia mais nova. Requer `_replica.lock`."""
+    logger.info(f"Usando pasta do Drive: {folder_id}")
+    file_id = _replica.obter_file_id(folder_id)
+    meta = None
+    if file_id:
+        try:
+            meta = _versao_remota(file_id)
+        except gdrive.HttpError:
+            # file_id em cache pode ter sido removido/recriado no Drive
+            logger.warning(f"file_id em cache inválido para {DB_NAME}; buscando novamente.")
+            _replica.file_id = None
+            file_id = _replica.obter_file_id(folder_id)
+            if file_id:
+                meta = _versao_remota(file_id)
+
+    if not file_id:
+        logger.warning(f"Arquivo {DB_NAME} não encontrado no Drive. Tentando usar/criar banco local.")
+        if not DB_PATH.exists():
+            conn_temp = _conectar()
+            inicializar_tabelas(conn_temp)
+            conn_temp.commit()
+            conn_temp.close()
+            logger.info(f"Novo banco de dados local criado: {DB_PATH}. Será enviado ao Drive na próxima operação de escrita.")
+        _replica.renovar_lease()
+        return DB_PATH
+
+    if DB_PATH.exists() and meta.get("md5Checksum") and meta["md5Checksum"] == _replica.md5:
+        logger.info("Checksum do snapshot remoto igual ao da réplica local; download evitado.")
+        if meta.get("headRevisionId") != _replica.revisao:
+            # Mesmo conteúdo reenviado por outra instância: só a revisão avançou
+            _replica.registrar_versao(meta)
+    else:
+        _baixar_snapshot(file_id, meta, folder_id)
+
+    _aplicar_changesets(folder_id)
+    _replica.renovar_lease()
+    return DB_PATH
+
+
+def _baixar_snapshot(file_id: str, meta: dict, folder_id: str) -> None:
+    """Substitui a réplica local pelo snapshot do Drive. Requer `_replica.lock`."""
+    if DB_PATH.exists():
+        with contextlib.closing(_conectar()) as conn:
+            if db_changeset.possui_pendencias(conn):
+                # Alterações locais não publicadas se perderiam com a substituição do arquivo
+                db_changeset.publicar_changeset(conn, DB_NAME, folder_id)
+
+    staging = DOWNLOAD_PATH
+    try:
+        _baixar_verificado(file_id, staging, meta, folder_id)
+        hash_remoto = _hash_arquivo(staging)
+        with contextlib.closing(sqlite3.connect(str(staging))) as conn:
+            # Pendências gravadas no snapshot pertencem a quem o publicou
+            db_changeset.descartar_pendencias(conn)
+            conn.commit()
+        shutil.copyfile(staging, BASE_PATH)
+        # `_replica.lock` não impede commits pelo pool: com a conexão de escrita
+        # emprestada, o que foi confirmado durante o download é reexecutado no
+        # snapshot e nada mais é gravado até a troca do arquivo
+        escritor = _pool.escritor()
+        try:
+            with contextlib.closing(sqlite3.connect(str(staging))) as conn:
+                reaplicadas = db_changeset.reaplicar_pendencias(escritor, conn)
+                conn.commit()
+            if reaplicadas:
+                logger.info(f"{reaplicadas} alteração(ões) local(is) feita(s) durante o download reaplicada(s) ao snapshot.")
+            _restaurar_snapshot(staging)
+        finally:
+            escritor.close()
+    finally:
+        staging.unlink(missing_ok=True)
+    with contextlib.closing(_conectar()) as conn:
+        db_changeset.instalar_captura(conn)
+        conn.commit()
+    _replica.hash_publicado = hash_remoto
+    _replica.registrar_versao(meta)
+    _replica.geracao += 1
+    db_cache.invalidar_tudo()
+    logger.info(f"Banco de dados baixado com sucesso: {DB_PATH} (geração {_replica.geracao})")
+
+
+def _baixar_verificado(
+    file_id: str,
+    destino: Path,
+    meta: dict | None,
+    folder_id: str | None = None,
+    nome: str = DB_NAME,
+    locais: tuple[Path, ...] = (BASE_PATH, DB_PATH),
+) -> None:
+    """Baixa um snapshot do Drive para `destino` e só retorna se ele estiver íntegro.
+
+    Confere o md5Checksum do Drive (sobre o manifesto como armazenado), monta
+    o banco a partir dos blocos (cada um conferido pelo sha256) e roda
+    PRAGMA quick_check no resultado. Em caso de falha remove `destino` e
+    levanta IOError; a réplica não é tocada.
+    """
+    destino.unlink(missing_ok=True)
+    try:
+        if not gdrive.download_file(file_id, str(destino)):
+            raise IOError(f"Falha ao baixar {nome} do Drive.")
+        esperado = (meta or {}).get("md5Checksum")
+        if esperado:
+            md5 = hashlib.md5()
+            with open(destino, "rb") as f:
+                for bloco in iter(lambda: f.read(_CHUNK_BYTES), b""):
+                    md5.update(bloco)
+            if md5.hexdigest() != esperado:
+                raise IOError(
+                    f"Checksum do download de {nome} não confere com o Drive "
+                    f"({md5.hexdigest()} != {esperado})."
+                )
+        descomprimir_snapshot(destino, folder_id, nome, locais)
+        with contextlib.closing(sqlite3.connect(str(destino))) as conn:
+            resultado = [r[0] for r in conn.execute("PRAGMA quick_check").fetchall()]
+        if resultado != ["ok"]:
+            raise IOError(f"Snapshot de {nome} baixado está corrompido: {'; '.join(resultado[:3])}")
+    except sqlite3.DatabaseError as e:
+        destino.unlink(missing_ok=True)
+        raise IOError(f"Snapshot de {nome} baixado não é um banco válido: {e}") from e
+    except BaseException:
+        destino.unlink(missing_ok=True)
+        raise
+
+
+def _restaurar_snapshot(origem: Path, destino: Path = DB_PATH) -> None:
+    """Instala `origem` (já verificado) como réplica local (ou em `destino`).
+
+    Sem réplica, o arquivo é renomeado no lugar (atômico, mesmo diretório).
+    Com a réplica em uso, o arquivo principal não pode ser trocado por
+    rename: em modo WAL o -wal das conexões abertas passaria a valer para o
+    arquivo novo. Nesse caso a API de backup substitui o conteúdo numa única
+    transação; leitores em andamento mantêm o snapshot antigo até reabrirem.
+    """
+    if not destino.exists():
+        for sufixo in ("-wal", "-shm"):
+            destino.with_name(destino.name + sufixo).unlink(missing_ok=True)
+        origem.replace(destino)
+        return
+    with contextlib.closing(sqlite3.connect(str(origem))) as src, contextlib.closing(_conectar(destino)) as dst:
+        src.backup(dst)
+
+
+def _hash_arquivo(caminho: Path) -> str:
+    """SHA-256 do conteúdo de `caminho`, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(_CHUNK_BYTES), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def descomprimir_snapshot(
+    caminho: Path,
+    folder_id: str | None = None,
+    nome: str = DB_NAME,
+    locais: tuple[Path, ...] = (BASE_PATH, DB_PATH),
+) -> Path:
+    """Transforma no lugar o arquivo `nome` baixado do Drive no banco SQLite.
+
+    O arquivo atual é um manifesto de blocos (db_blocos): os blocos que não
+    estão nas cópias `locais` são baixados da pasta `folder_id`. Snapshots
+    antigos, com ou sem gzip, também são aceitos.
+    """
+    caminho = Path(caminho)
+    with open(caminho, "rb") as f:
+        comprimido = f.read(2) == _GZIP_MAGIC
+    if comprimido:
+        temporario = caminho.with_name(caminho.name + ".tmp")
+        with gzip.open(caminho, "rb") as src, open(temporario, "wb") as dst:
+            shutil.copyfileobj(src, dst, _CHUNK_BYTES)
+        temporario.replace(caminho)
+    if db_blocos.eh_manifesto(caminho):
+        db_blocos.montar(
+            db_blocos.ler_manifesto(caminho),
+            caminho,
+            nome,
+            folder_id or _replica.folder_id or _get_drive_folder_id(),
+            locais=locais,
+        )
+    return caminho
+
+
+def _criar_snapshot() -> tuple[Path, int]:
+    """Gera uma cópia consistente (ponto no tempo) da réplica para upload.
+
+    Usa a API de backup do SQLite, então leitores e escritores continuam
+    trabalhando durante a cópia e o upload. Retorna o arquivo (ainda sem
+    compressão) e o último `seq` do changelog contido nele.
+    """
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    destino = STAGING_DIR / f"{DB_NAME}.raw"
+    destino.unlink(missing_ok=True)
+    with contextlib.closing(_conectar()) as src, contextlib.closing(sqlite3.connect(str(destino))) as dst:
+        src.backup(dst)
+        ate_seq = db_changeset.ultimo_seq(dst)
+        # O snapshot publicado é autocontido: sem WAL e sem pendências
+        db_changeset.descartar_pendencias(dst)
+        dst.commit()
+        dst.execute("PRAGMA journal_mode=DELETE")
+    return destino, ate_seq
+
+
+def _aplicar_changesets(folder_id: str) -> None:
+    """Reexecuta na réplica os changesets publicados depois do snapshot. Requer `_replica.lock`."""
+    with contextlib.closing(_conectar()) as conn:
+        db_changeset.instalar_captura(conn)
+        conn.commit()
+        aplicados = db_changeset.aplicar_changesets_remotos(conn, DB_NAME, folder_id)
+    if aplicados:
+        db_cache.invalidar_tudo()
+        logger.info(f"{aplicados} changeset(s) remoto(s) aplicados à réplica local.")
+
 # ─────────────── Obter conexão com o banco ───────────────
 def obter_conexao() -> sqlite3.Connection:
-    """Abre e devolve uma conexão SQLite local em modo row_factory."""
-    caminho_banco = baixar_banco_do_drive()
-    conn = sqlite3.connect(str(caminho_banco), check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    """Empresta a conexão de escrita do processo (row_factory = sqlite3.Row).
+
+    Deve ser devolvida exatamente uma vez, com close() ou ao sair do with.
+    Chamadas aninhadas na mesma thread recebem a mesma conexão.
+    """
+    if not _pool.possui_escritor():
+        baixar_banco_do_drive()
+    conn = _pool.escritor()
+    try:
+        db_escritas.instalar(conn)
+    except sqlite3.Error:
+        conn.close()
+        raise
     return conn
 
+def obter_conexao_leitura() -> sqlite3.Connection:
+    """Empresta uma conexão somente leitura do pool (row_factory = sqlite3.Row)."""
+    if not _pool.possui_escritor():
+        baixar_banco_do_drive()
+    return _pool.leitor()
+
 # ─────────────── Fechar conexão ───────────────
 def fechar_conexao():
-    """Mantida por compatibilidade; conexões são fechadas no próprio with."""
-    pass
+    """Fecha as conexões ociosas do pool; as emprestadas voltam ao pool no close()/with."""
+    _pool.fechar_ociosas()
+    _memoria.descartar()
 
 # ─────────────── Contexto de conexão ───────────────
 class ConexaoContext:
@@ -145,240 +574,668 @@ class ConexaoContext:
         return self.conn
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        global db_dirty
         try:
-            if exc_type is None and db_dirty:
+            if exc_type is None:
+                # Sem escritas na transação, o commit não agenda publicação
                 try:
                     self.conn.commit()
-                    logger.info("Commit realizado pelo ConexaoContext.")
                 except sqlite3.Error as e_commit:
                     logger.error(f"Erro no commit dentro do context manager: {e_commit}")
-                    if exc_val is None:
-                        raise e_commit
+                    raise e_commit
+            else:
+                self.conn.rollback()
         finally:
-            db_dirty = False
-            logger.debug("Flag 'db_dirty' resetada para False ao sair do ConexaoContext.")
-        self.conn.close()  # Fecha a conexão ao sair do contexto
+            self.conn.close()  # Devolve a conexão ao pool ao sair do contexto
 
 # ─────────────── Função de contexto ───────────────
 def conexao():
     """Contexto para gerenciar a conexão com o banco de dados"""
     return ConexaoContext()
 
+# ─────────────── Unidade de trabalho ───────────────
+class TransacaoDesfeita(Exception):
+    """A unidade de trabalho foi desfeita; nenhuma das suas alterações foi gravada."""
+
+
+def _em_unidade_de_trabalho() -> bool:
+    """True se a thread atual está dentro de unit_of_work()."""
+    conn = _pool.escritor_atual()
+    return conn is not None and conn.unidade > 0
+
+
+@contextlib.contextmanager
+def unit_of_work():
+    """Agrupa várias operações dos models numa única transação e publicação.
+
+    Os models chamados dentro do bloco recebem a mesma conexão de escrita
+    (obter_conexao() é reentrante na thread) e seus commit() são adiados. Ao
+    fim do bloco há um único commit, que agenda uma única publicação no Drive. Se o
+    bloco levantar exceção, ou se alguma operação tiver feito rollback,
+    tudo é desfeito — no segundo caso levanta TransacaoDesfeita. Unidades
+    aninhadas participam da unidade externa.
+
+        with db.unit_of_work():
+            model_servico.criar_servico(...)
+            model_servico_funcionarios.atribuir_funcionario_a_servico(...)
+    """
+    conn = obter_conexao()
+    externa = conn.unidade == 0
+    if externa:
+        conn.unidade_desfeita = False
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+    conn.unidade += 1
+    try:
+        try:
+            yield conn
+        finally:
+            conn.unidade -= 1
+        if externa:
+            if conn.unidade_desfeita:
+                raise TransacaoDesfeita("Uma das operações falhou; a unidade de trabalho foi desfeita.")
+            conn.commit()
+    except BaseException:
+        if externa:
+            conn.rollback()
+            logger.warning("Unidade de trabalho desfeita; nenhuma alteração foi gravada.")
+        raise
+    finally:
+        if externa:
+            conn.unidade_desfeita = False
+        conn.close()  # Devolve a conexão de escrita ao pool
+
+class ExclusaoBloqueada(Exception):
+    """A exclusão removeria linhas dependentes não permitidas; nada foi removido."""
+
+    def __init__(self, removidas: dict[str, int]):
+        super().__init__(f"Exclusão desfeita; removeria também: {removidas}")
+        self.removidas = removidas
+
+
+def excluir_em_cascata(tabela: str, coluna: str, valor, bloquear: tuple[str, ...] = ()) -> dict[str, int]:
+    """Exclui a linha de `tabela` com `coluna` = `valor` e suas dependentes.
+
+    Um único DELETE numa única transação: as dependentes saem pelas chaves
+    estrangeiras (ON DELETE CASCADE) da conexão de escrita. Devolve
+    {tabela: linhas removidas}, incluindo as da cascata (vazio se a linha não
+    existe). Se a cascata alcançar alguma tabela de `bloquear`, tudo é
+    desfeito e ExclusaoBloqueada (com o que seria removido) é levantada.
+    """
+    with unit_of_work() as conn:
+        # Savepoint: dentro de uma unidade externa, só esta exclusão é desfeita
+        conn.execute("SAVEPOINT excluir_em_cascata")
+        inicio = db_escritas.marco(conn)
+        conn.execute(f'DELETE FROM "{tabela}" WHERE "{coluna}" = ?', (valor,))
+        removidas = db_escritas.contar_desde(conn, inicio)
+        if any(removidas.get(t) for t in bloquear):
+            conn.execute("ROLLBACK TO excluir_em_cascata")
+            conn.execute("RELEASE excluir_em_cascata")
+            raise ExclusaoBloqueada(removidas)
+        conn.execute("RELEASE excluir_em_cascata")
+    return removidas
+
 # ─────────────── Inicializar tabelas se necessário ───────────────
-def inicializar_tabelas(conn: sqlite3.Connection):
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            data_nascimento TEXT,
-            funcao TEXT,
-            usuario TEXT UNIQUE NOT NULL,
-            senha TEXT NOT NULL,
-            tipo TEXT CHECK(tipo IN ('admin', 'ope')) NOT NULL
-        );
-    """)
-
-    cursor.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = 'admin'")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("""
-            INSERT INTO usuarios (nome, usuario, senha, tipo)
-            VALUES (?, ?, ?, ?)
-        """, ("Administrador", "admin", "admin123", "admin"))
-        logger.info("Usuário admin padrão criado")
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS funcionarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            data_nascimento TEXT,
-            cpf TEXT UNIQUE NOT NULL,
-            cod_funcionario TEXT UNIQUE NOT NULL,
-            funcao TEXT
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS empresas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            cnpj TEXT UNIQUE NOT NULL,
-            cod_empresa TEXT UNIQUE NOT NULL,
-            pasta_empresa TEXT
-        );
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS contratos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            numero_contrato TEXT UNIQUE NOT NULL,
-            cod_empresa TEXT NOT NULL,
-            empresa_contratada TEXT,
-            titulo TEXT,
-            especificacoes TEXT,
-            pasta_contrato TEXT,
-            FOREIGN KEY (cod_empresa) REFERENCES empresas(cod_empresa) ON DELETE CASCADE 
-        );
-    """)
-    # Adicionado ON DELETE CASCADE para cod_empresa
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS unidades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cod_unidade TEXT UNIQUE NOT NULL,
-            numero_contrato TEXT NOT NULL,
-            nome_unidade TEXT,
-            estado TEXT,
-            cidade TEXT,
-            localizacao TEXT,
-            pasta_unidade TEXT,
-            FOREIGN KEY (numero_contrato) REFERENCES contratos(numero_contrato) ON DELETE CASCADE
-        );
-    """)
-    # Adicionado ON DELETE CASCADE para numero_contrato
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS servicos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cod_servico TEXT UNIQUE NOT NULL,
-            cod_unidade TEXT NOT NULL,
-            descricao TEXT,
-            data_prevista TEXT,
-            data_execucao TEXT,
-            status TEXT,
-            observacoes TEXT,
-            pasta_servico TEXT, -- ID da pasta do serviço no Drive
-            nome_arquivo_original TEXT, -- Nome original do arquivo de upload
-            id_arquivo_drive TEXT, -- ID do arquivo específico no Drive
-            FOREIGN KEY (cod_unidade) REFERENCES unidades(cod_unidade) ON DELETE CASCADE
-        );
-    """)
-    # Adicionado ON DELETE CASCADE para cod_unidade
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS servico_funcionarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            cod_servico TEXT NOT NULL,
-            cod_funcionario TEXT NOT NULL,
-            FOREIGN KEY (cod_servico) REFERENCES servicos(cod_servico) ON DELETE CASCADE,
-            FOREIGN KEY (cod_funcionario) REFERENCES funcionarios(cod_funcionario) ON DELETE CASCADE,
-            UNIQUE (cod_servico, cod_funcionario)
-        );
-    """)
-    # Adicionado ON DELETE CASCADE para cod_servico e cod_funcionario
+def inicializar_tabelas(conn: sqlite3.Connection) -> list[int]:
+    """Leva o esquema à versão atual e instala a captura de alterações.
+
+    Devolve as versões de migração aplicadas (vazia se o esquema já estava atualizado).
+    """
+    aplicadas = db_migracoes.aplicar_migracoes(conn)
+    db_changeset.instalar_captura(conn)
 
     conn.commit()
     logger.info("Tabelas inicializadas/verificadas.")
+    return aplicadas
 
 
 # ───────────────── Salvar Banco de Dados no Google Drive ─────────────────
-def salvar_banco_no_drive(caminho_banco: Path):
-    """Salva o banco de dados local no Google Drive se estiver marcado como 'dirty' e não houver conflitos."""
-    global db_dirty
-    st.session_state.setdefault("last_remote_ts", 0.0)
+# Uploads condicionais tentados antes de desistir (cada conflito dispara uma mesclagem)
+_TENTATIVAS_PUBLICACAO = 3
 
-    if not db_dirty:
-        logger.info("Banco de dados não está 'dirty', upload para o Drive evitado.")
-        return
+def _publicar_banco(folder_id: str) -> bool:
+    """Envia o snapshot completo ao Drive por compare-and-swap. Requer `_replica.lock`.
+
+    O upload só é aceito se o arquivo no Drive ainda estiver na versão que a
+    réplica conhece. Se outra instância publicou antes, a versão dela é
+    mesclada à réplica e o upload é refeito com o resultado.
+    """
+    file_id = _replica.obter_file_id(folder_id)
+    if file_id and not _replica.etag:
+        # Versão registrada sem etag (ex.: arquivo criado agora ou estado antigo)
+        meta_remota = _versao_remota(file_id)
+        if meta_remota.get("headRevisionId") == _replica.revisao:
+            _replica.registrar_versao(meta_remota)
+
+    db_textos.enviar_pendentes(DB_NAME, folder_id)
+    for tentativa in range(1, _TENTATIVAS_PUBLICACAO + 1):
+        try:
+            return _enviar_snapshot(file_id, folder_id)
+        except gdrive.RevisionConflictError:
+            logger.warning(
+                f"CONFLITO DETECTADO: {DB_NAME} mudou no Drive desde a revisão conhecida "
+                f"({_replica.revisao}). Mesclando as alterações (tentativa {tentativa})."
+            )
+            if not _mesclar_remoto(file_id, _versao_remota(file_id)):
+                # Próxima conexão deve buscar a versão remota
+                _replica.invalidar()
+                return False
+    logger.error(f"Publicação de {DB_NAME} abandonada após {_TENTATIVAS_PUBLICACAO} conflitos seguidos.")
+    _replica.invalidar()
+    return False
+
+
+def _enviar_snapshot(file_id: str | None, folder_id: str) -> bool:
+    """Gera e envia um snapshot; levanta gdrive.RevisionConflictError se o Drive mudou."""
+    if file_id and not _replica.etag:
+        raise gdrive.RevisionConflictError(file_id, _replica.etag)
 
+    snapshot, ate_seq = _criar_snapshot()
+    # O arquivo enviado mantém o nome DB_NAME no Drive
+    comprimido = STAGING_DIR / DB_NAME
     try:
-        folder_id = _get_drive_folder_id()
-        file_id = gdrive.get_file_id_by_name(DB_NAME, folder_id)
+        hash_snapshot = _hash_arquivo(snapshot)
+        if file_id and hash_snapshot == _replica.hash_publicado:
+            logger.info(f"Snapshot idêntico ao publicado no Drive; upload de {DB_NAME} evitado.")
+            _replica.renovar_lease()
+            with contextlib.closing(_conectar()) as conn:
+                db_changeset.descartar_pendencias(conn, ate_seq)
+                conn.commit()
+            return True
 
+        # Só os blocos que mudaram são enviados; o arquivo DB_NAME é o manifesto
+        manifesto = db_blocos.enviar_blocos(snapshot, DB_NAME, folder_id)
+        db_blocos.gravar_manifesto(manifesto, comprimido)
         if file_id:
-            remote_ts_before_upload = _remote_modified_ts(file_id)
-            if remote_ts_before_upload > st.session_state.get("last_remote_ts", 0.0):
-                logger.warning(
-                    f"CONFLITO DETECTADO: Versão do banco no Drive (ts: {remote_ts_before_upload}) "
-                    f"é mais nova que a última versão conhecida localmente (ts: {st.session_state.get('last_remote_ts', 0.0)}). "
-                    f"Upload abortado para evitar perda de dados."
-                )
-                if hasattr(st, 'error'):
-                    st.error(f"Conflito ao salvar: alterações remotas detectadas. Suas últimas alterações não foram salvas na nuvem para evitar sobrescrever dados. Por favor, recarregue a página e tente novamente.")
-                return
-
-            logger.info(f"Atualizando arquivo {DB_NAME} no Drive.")
-            gdrive.update_file(file_id, caminho_banco)
+            logger.info(f"Atualizando arquivo {DB_NAME} no Drive (revisão esperada {_replica.revisao}).")
+            meta = gdrive.update_file_if_match(file_id, comprimido, _replica.etag)
             logger.info(f"Arquivo {DB_NAME} atualizado no Drive.")
         else:
             logger.info(f"Enviando novo arquivo {DB_NAME} para o Drive.")
-            file_id = gdrive.upload_file(caminho_banco, folder_id)
-            if not file_id:
+            criado = gdrive.upload_file(comprimido, folder_id, return_metadata=True)
+            if not criado:
                 logger.error(f"Falha ao fazer upload do novo arquivo {DB_NAME} para o Drive.")
-                return
-            logger.info(f"Novo arquivo {DB_NAME} enviado ao Drive com ID: {file_id}.")
-
-        # Atualiza o timestamp da última versão remota conhecida
-        if file_id:
-            new_remote_ts = _remote_modified_ts(file_id)
-            st.session_state["last_remote_ts"] = new_remote_ts
-            logger.info(f"Timestamp remoto atualizado para: {new_remote_ts}")
-            # Reseta a flag dirty após salvar com sucesso
-            db_dirty = False
-        else:
-            st.session_state["last_remote_ts"] = time.time()
-            logger.warning("Não foi possível obter o file_id após o upload, usando time.time() para last_remote_ts.")
+                return False
+            logger.info(f"Novo arquivo {DB_NAME} enviado ao Drive com ID: {criado['id']}.")
+            # A criação não devolve o etag usado nos próximos uploads condicionais
+            meta = _versao_remota(criado["id"])
+        # O snapshot publicado passa a ser a base das próximas mesclagens
+        anteriores = db_blocos.hashes(BASE_PATH, manifesto["bloco_bytes"])
+        snapshot.replace(BASE_PATH)
+    finally:
+        snapshot.unlink(missing_ok=True)
+        comprimido.unlink(missing_ok=True)
 
-    except gdrive.googleapiclient.errors.HttpError as e:
-        logger.error(f"Erro de API do Google ao salvar banco no Drive: {str(e)}")
-        if hasattr(st, 'error'):
-            st.error(f"Erro de API ao salvar no Google Drive: {e}. Suas alterações podem não ter sido salvas na nuvem.")
+    # A versão publicada vem da própria resposta do upload; a réplica local
+    # é exatamente a versão publicada, então o lease é renovado.
+    _replica.hash_publicado = hash_snapshot
+    _replica.registrar_versao(meta)
+    _replica.renovar_lease()
+    logger.info(f"Versão remota atualizada: revisão {_replica.revisao} (md5 {_replica.md5})")
+    # As alterações pendentes até o momento do snapshot estão contidas nele
+    with contextlib.closing(_conectar()) as conn:
+        db_changeset.descartar_pendencias(conn, ate_seq)
+        conn.commit()
+    # Blocos da versão anterior ficam até a próxima publicação: outra
+    # instância pode estar baixando aquele manifesto agora
+    try:
+        db_blocos.coletar_lixo(manifesto["blocos"] + anteriores, DB_NAME, folder_id)
     except Exception as e:
-        logger.error(f"Erro inesperado ao salvar banco no Drive: {str(e)}")
-        if hasattr(st, 'error'):
-            st.error(f"Erro inesperado ao salvar no Google Drive: {e}. Suas alterações podem não ter sido salvas na nuvem.")
+        logger.warning(f"Falha ao remover blocos antigos do Drive: {e}")
+    return True
+
+
+def _mesclar_remoto(file_id: str, meta: dict) -> bool:
+    """Incorpora à réplica local a versão remota mais nova (three-way merge). Requer `_replica.lock`.
+
+    Alterações que não se sobrepõem são combinadas; conflitos na mesma linha
+    mantêm a versão local e ficam registrados (listar_conflitos()). Retorna
+    False se não há base para comparar ou a mesclagem falhou.
+    """
+    if not BASE_PATH.exists():
+        logger.warning("Sem cópia da versão base; mesclagem automática indisponível.")
+        return False
+
+    remoto = DB_PATH.with_name(f"{DB_NAME}.remoto")
+    try:
+        try:
+            _baixar_verificado(file_id, remoto, meta)
+        except IOError as e:
+            logger.error(f"Falha ao baixar {DB_NAME} para mesclagem: {e}")
+            return False
+        hash_remoto = _hash_arquivo(remoto)
+        with contextlib.closing(_conectar()) as conn:
+            # As entradas de changelog geradas pela mesclagem repetem a versão
+            # remota e são descartadas na mesma transação
+            seq_antes = db_changeset.ultimo_seq(conn)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conflitos = db_merge.mesclar_snapshot(conn, BASE_PATH, remoto)
+                db_changeset.incorporar_aplicados(conn, remoto)
+                conn.execute(
+                    f"DELETE FROM {db_changeset.CHANGELOG_TABLE} WHERE seq > ?", (seq_antes,)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Falha ao mesclar a versão remota de {DB_NAME}: {e}")
+                return False
+        remoto.replace(BASE_PATH)
+    finally:
+        remoto.unlink(missing_ok=True)
+
+    _replica.hash_publicado = hash_remoto
+    _replica.registrar_versao(meta)
+    db_cache.invalidar_tudo()
+    logger.info(
+        f"Versão remota (revisão {_replica.revisao}) mesclada à réplica local; "
+        f"{len(conflitos)} conflito(s)."
+    )
+    return True
+
+
+def listar_conflitos(apenas_pendentes: bool = True) -> list[tuple]:
+    """Conflitos de mesclagem registrados na réplica local (mais recentes primeiro)."""
+    with obter_conexao_leitura() as conn:
+        return db_merge.listar_conflitos(conn, apenas_pendentes)
+
+
+def marcar_conflito_resolvido(conflito_id: int) -> None:
+    """Marca um conflito de mesclagem como revisado."""
+    with obter_conexao() as conn:
+        db_merge.marcar_conflito_resolvido(conn, conflito_id)
+
+
+def _publicar_alteracoes(folder_id: str) -> None:
+    """Publica as alterações locais como changeset e compacta quando necessário. Requer `_replica.lock`."""
+    with contextlib.closing(_conectar()) as conn:
+        db_changeset.publicar_changeset(conn, DB_NAME, folder_id)
+        acumulados = db_changeset.changesets_nao_compactados(conn)
+    if acumulados >= DB_COMPACTAR_APOS:
+        compactar_changesets(folder_id)
+
+
+def compactar_changesets(folder_id: str | None = None) -> bool:
+    """Incorpora os changesets num snapshot completo e remove-os do Drive.
+
+    A réplica é atualizada antes (snapshot + changesets remotos), de modo que o
+    snapshot publicado contém todos os changesets que serão removidos.
+    """
+    folder_id = folder_id or _get_drive_folder_id()
+    with _replica.lock:
+        if not _replica.obter_file_id(folder_id):
+            return False
+        _atualizar_replica(folder_id)
+        with contextlib.closing(_conectar()) as conn:
+            nomes = db_changeset.marcar_compactados(conn)
+        if not nomes:
+            return True
+        if not _publicar_banco(folder_id):
+            with contextlib.closing(_conectar()) as conn:
+                db_changeset.desmarcar_compactados(conn, nomes)
+            return False
+        db_changeset.remover_changesets(nomes, DB_NAME, folder_id)
+        logger.info(f"Compactação concluída: {len(nomes)} changeset(s) incorporados ao snapshot.")
+        return True
+
+
+def _sincronizar(folder_id: str) -> None:
+    """Publica as alterações locais no Drive. Executado pela thread do sincronizador."""
+    # Textos longos antes das linhas que os referenciam
+    db_textos.enviar_pendentes(DB_NAME, folder_id)
+    with _replica.lock:
+        if _replica.obter_file_id(folder_id):
+            _publicar_alteracoes(folder_id)
+        elif not _publicar_banco(folder_id):
+            raise RuntimeError(f"Falha ao publicar {DB_NAME} no Drive.")
+
+
+_sincronizador = db_sync.SincronizadorDrive(
+    _sincronizar,
+    janela=DB_SYNC_JANELA_SECONDS,
+    espera_erro_maxima=DB_SYNC_BACKOFF_MAX_SECONDS,
+    caminho_outbox=OUTBOX_PATH,
+)
+
+
+def salvar_banco_no_drive(caminho_banco: Path = DB_PATH, aguardar: bool = False, timeout: float | None = 60.0) -> bool:
+    """Agenda a publicação das alterações locais no Google Drive.
+
+    Retorna imediatamente; o sincronizador agrupa as escritas da janela e envia
+    apenas as linhas alteradas (changeset). Com `aguardar=True`, publica na
+    hora e só retorna quando as alterações estiverem no Drive (ou o tempo
+    acabar). Com o snapshot já existente no Drive, o arquivo completo só é
+    enviado na primeira publicação e na compactação. `caminho_banco` é
+    mantido por compatibilidade; o envio sempre parte de um snapshot da réplica.
+    """
+    if _em_unidade_de_trabalho():
+        return True  # o commit da unidade agenda a publicação
+    _sincronizador.agendar(_get_drive_folder_id())
+    if not aguardar:
+        return True
+    if _sincronizador.flush(timeout):
+        return True
+    erro = _sincronizador.status()["ultimo_erro"]
+    logger.error(f"Alterações ainda não publicadas no Drive: {erro}")
+    if hasattr(st, 'error'):
+        st.error(f"Erro ao salvar no Google Drive: {erro}. Suas alterações estão salvas localmente e serão reenviadas.")
+    return False
+
+
+def flush(timeout: float | None = None) -> bool:
+    """Publica imediatamente as escritas pendentes e aguarda. True se tudo está no Drive."""
+    return _sincronizador.flush(timeout)
+
+
+def fila_sincronizacao() -> list[dict]:
+    """Publicações pendentes na fila persistente, com tentativas e último erro."""
+    return _sincronizador.fila()
+
+
+def status_sincronizacao() -> dict:
+    """Estado do sincronizador (pendências, última publicação, último erro) e
+    número de conflitos de mesclagem não revisados, para a interface."""
+    status = _sincronizador.status()
+    status["conflitos"] = 0
+    if DB_PATH.exists():
+        with _pool.leitor() as conn:
+            status["conflitos"] = len(db_merge.listar_conflitos(conn))
+    return status
+
+
+# Tenta publicar o que estiver pendente quando o processo encerra normalmente
+atexit.register(flush, 30.0)
 
 # Função para atualizar o esquema do banco de dados (se necessário)
+# Geração da réplica cujo esquema já foi verificado neste processo
+_esquema_geracao: int | None = None
+
 def atualizar_banco():
-    """Verifica e atualiza o esquema do banco de dados se necessário."""
-    # Esta função pode ser expandida para lidar com migrações de esquema mais complexas.
-    # Por enquanto, apenas garante que todas as tabelas sejam criadas.
-    try:
-        with conexao() as conn: # Usa o contexto de conexão
-            # A verificação/criação de tabelas já define 'dirty' se algo mudar
-            inicializar_tabelas(conn) 
-            # O commit e o reset de dirty são gerenciados pelo ConexaoContext e salvar_banco_no_drive
-        
-        # Se inicializar_tabelas marcou como dirty, tenta salvar.
-        if db_dirty:
-             # Se o contexto resetou, mas inicializar_tabelas FEZ algo, precisamos marcar de novo
-             # No entanto, inicializar_tabelas já faz commit.
-             # A questão é se o schema MUDOU e precisa de upload.
-             # A lógica atual: se `inicializar_tabelas` faz um commit, o context manager fará o commit.
-             # Se o context manager comitou, `dirty` estava True. `salvar_banco_no_drive` será chamado pelos models.
-             # Esta função `atualizar_banco` pode não precisar chamar `salvar_banco_no_drive` explicitamente
-             # se as chamadas de `inicializar_tabelas` já marcam `dirty` e os models chamam `salvar_banco_no_drive`.
-             # Contudo, para uma atualização de esquema explícita, pode ser bom forçar.
-             
-             # Se o objetivo é apenas garantir que o esquema está atualizado E salvo no Drive:
-             # 1. Abrir conexão (feito)
-             # 2. Rodar inicializar_tabelas (feito, comita internamente se criar algo)
-             # 3. Se inicializar_tabelas criou algo, o banco está tecnicamente 'dirty' para o Drive.
-             # A flag _thread_local.dirty será True dentro de inicializar_tabelas se algo for criado (devido ao commit).
-             # O ConexaoContext comitará e resetará dirty.
-             # Para forçar o salvamento APÓS uma atualização de esquema:
-             logger.info("Esquema do banco verificado/atualizado. Tentando salvar no Drive se houver alterações pendentes.")
-             # Re-marca como dirty aqui para garantir que salvar_banco_no_drive faça o upload
-             # Isso é necessário porque o ConexaoContext já resetou a flag.
-             # No entanto, isso pode levar a uploads desnecessários se o schema já estava atualizado.
-             # Uma flag de "schema_changed" seria melhor.
-             
-             # Melhoria: inicializar_tabelas poderia retornar um booleano se o esquema mudou.
-             # Por ora, vamos simplificar. A chamada abaixo tentará salvar se _thread_local.dirty for True.
-             # Se o contexto já limpou, e não houve outras escritas, não salvará.
-             # Se inicializar_tabelas realmente ALTEROU o esquema, ela DEVE marcar dirty.
-
-             pass # A lógica de salvar é melhor nos models após operações de escrita.
-                  # Ou, se esta função é chamada em um ponto que DEVE sincronizar:
-             # marca_sujo() # Se tem certeza que quer forçar um check/save
-             # salvar_banco_no_drive(DB_PATH)
+    """Aplica as migrações de esquema pendentes, uma vez por processo e por réplica.
 
+    Reruns comuns retornam sem consultar o Drive nem o banco. A verificação só
+    se repete quando a réplica local é substituída por um download, que pode
+    trazer um banco publicado por uma versão anterior da aplicação. Quando uma
+    migração é aplicada, o banco migrado é publicado como snapshot completo
+    (changesets transportam apenas linhas, não o esquema).
+    """
+    global _esquema_geracao
+    if _esquema_geracao == _replica.geracao and DB_PATH.exists():
+        return
+    try:
+        baixar_banco_do_drive()
+        with _replica.lock:
+            with contextlib.closing(_conectar()) as conn:
+                aplicadas = inicializar_tabelas(conn)
+            if aplicadas:
+                db_cache.invalidar_tudo()
+                logger.info(f"Esquema migrado para a versão {aplicadas[-1]}; publicando snapshot.")
+                if not _publicar_banco(_get_drive_folder_id()):
+                    # Versão remota mudou: a próxima chamada baixa a nova e migra de novo
+                    logger.warning("Publicação do banco migrado adiada por conflito de versão.")
+                    return
+            _esquema_geracao = _replica.geracao
         logger.info("Verificação/atualização do banco de dados concluída.")
     except Exception as e:
         logger.error(f"Erro ao atualizar banco de dados: {str(e)}")
-        # Considerar se deve levantar a exceção ou apenas logar.
+
+# ─────────────── Textos longos guardados à parte (db_textos) ───────────────
+def texto_completo(valor: str | None, ref: str | None) -> str | None:
+    """Texto integral de uma coluna de db_textos.COLUNAS.
+
+    Sem referência, o próprio `valor` já é o texto inteiro; com ela, o texto
+    vem do cache local ou do Drive. Levanta IOError se não puder ser obtido.
+    """
+    if not ref:
+        return valor
+    return db_textos.obter(ref, DB_NAME, _get_drive_folder_id())
+
+# ─────────────── Banco histórico (serviços encerrados) ───────────────
+_historico = _EstadoReplica(HISTORICO_NAME, HISTORICO_PATH, HISTORICO_VERSAO_PATH)
+_historico.restaurar_versao()
+
+
+def _criar_historico_local() -> None:
+    """Cria o banco histórico local vazio, com as tabelas no esquema atual da réplica."""
+    with contextlib.closing(_conectar()) as conn:
+        db_historico.anexar(conn, HISTORICO_PATH)
+        try:
+            db_historico.alinhar_esquema(conn)
+            conn.commit()
+        finally:
+            db_historico.desanexar(conn)
+
+
+def _atualizar_historico(folder_id: str) -> bool:
+    """Garante a cópia local do histórico na versão do Drive. Requer `_historico.lock`.
+
+    Respeita o mesmo lease da réplica. Retorna False se não existe histórico
+    (nem no Drive nem local).
+    """
+    if _historico.lease_valido(folder_id):
+        return True
+    file_id = _historico.obter_file_id(folder_id)
+    meta = None
+    if file_id:
+        try:
+            meta = _versao_remota(file_id)
+        except gdrive.HttpError:
+            # file_id em cache pode ter sido removido/recriado no Drive
+            logger.warning(f"file_id em cache inválido para {HISTORICO_NAME}; buscando novamente.")
+            _historico.file_id = None
+            file_id = _historico.obter_file_id(folder_id)
+            if file_id:
+                meta = _versao_remota(file_id)
+    if not file_id:
+        _historico.renovar_lease()
+        return HISTORICO_PATH.exists()
+
+    if not (HISTORICO_PATH.exists() and meta.get("md5Checksum") == _historico.md5):
+        staging = HISTORICO_PATH.with_name(f"{HISTORICO_NAME}.download")
+        try:
+            _baixar_verificado(
+                file_id, staging, meta, folder_id, nome=HISTORICO_NAME, locais=(HISTORICO_PATH,)
+            )
+            _restaurar_snapshot(staging, HISTORICO_PATH)
+        finally:
+            staging.unlink(missing_ok=True)
+        logger.info(f"Histórico baixado do Drive (revisão {meta.get('headRevisionId')}).")
+    _historico.registrar_versao(meta)
+    _historico.renovar_lease()
+    return True
+
+
+def _blocos_publicados(file_id: str, nome: str) -> list[str]:
+    """Blocos do manifesto que está hoje no Drive em `file_id` (vazia se não for um manifesto)."""
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    caminho = STAGING_DIR / f"{nome}.anterior"
+    try:
+        if not gdrive.download_file(file_id, str(caminho)):
+            raise IOError(f"Falha ao baixar o manifesto de {nome} do Drive.")
+        dados = caminho.read_bytes()
+        if dados.startswith(_GZIP_MAGIC):
+            caminho.write_bytes(gzip.decompress(dados))
+        if not db_blocos.eh_manifesto(caminho):
+            return []
+        return db_blocos.ler_manifesto(caminho)["blocos"]
+    finally:
+        caminho.unlink(missing_ok=True)
+
+
+def _publicar_historico(folder_id: str) -> bool:
+    """Envia o histórico local ao Drive (blocos + manifesto, compare-and-swap). Requer `_historico.lock`.
+
+    Se outra instância publicou antes, as linhas dela são incorporadas ao
+    histórico local e o envio é refeito.
+    """
+    STAGING_DIR.mkdir(parents=True, exist_ok=True)
+    snapshot = STAGING_DIR / f"{HISTORICO_NAME}.raw"
+    manifesto_path = STAGING_DIR / HISTORICO_NAME
+    for tentativa in range(1, _TENTATIVAS_PUBLICACAO + 1):
+        file_id = _historico.obter_file_id(folder_id)
+        snapshot.unlink(missing_ok=True)
+        try:
+            with contextlib.closing(_conectar(HISTORICO_PATH)) as src, \
+                    contextlib.closing(sqlite3.connect(str(snapshot))) as dst:
+                src.backup(dst)
+                dst.execute("PRAGMA journal_mode=DELETE")
+            manifesto = db_blocos.enviar_blocos(snapshot, HISTORICO_NAME, folder_id)
+            db_blocos.gravar_manifesto(manifesto, manifesto_path)
+            if file_id and not _historico.etag:
+                raise gdrive.RevisionConflictError(file_id, _historico.etag)
+            anteriores: list[str] = []
+            if file_id:
+                # Manifesto que este upload substitui (o compare-and-swap garante que é ele)
+                anteriores = _blocos_publicados(file_id, HISTORICO_NAME)
+                meta = gdrive.update_file_if_match(file_id, manifesto_path, _historico.etag)
+            else:
+                criado = gdrive.upload_file(manifesto_path, folder_id, return_metadata=True)
+                if not criado:
+                    logger.error(f"Falha ao enviar {HISTORICO_NAME} para o Drive.")
+                    return False
+                meta = _versao_remota(criado["id"])
+        except gdrive.RevisionConflictError:
+            logger.warning(
+                f"{HISTORICO_NAME} mudou no Drive; incorporando a versão remota (tentativa {tentativa})."
+            )
+            _incorporar_historico_remoto(file_id, folder_id)
+            continue
+        finally:
+            snapshot.unlink(missing_ok=True)
+            manifesto_path.unlink(missing_ok=True)
+
+        _historico.registrar_versao(meta)
+        _historico.renovar_lease()
+        # Blocos da versão anterior ficam até a próxima publicação: outra
+        # instância pode estar baixando aquele manifesto agora
+        try:
+            db_blocos.coletar_lixo(manifesto["blocos"] + anteriores, HISTORICO_NAME, folder_id)
+        except Exception as e:
+            logger.warning(f"Falha ao remover blocos antigos do histórico: {e}")
+        logger.info(f"Histórico publicado no Drive (revisão {_historico.revisao}).")
+        return True
+    logger.error(f"Publicação de {HISTORICO_NAME} abandonada após {_TENTATIVAS_PUBLICACAO} conflitos seguidos.")
+    _historico.invalidar()
+    return False
+
+
+def _incorporar_historico_remoto(file_id: str, folder_id: str) -> None:
+    """Une ao histórico local as linhas da versão atual no Drive. Requer `_historico.lock`."""
+    meta = _versao_remota(file_id)
+    remoto = HISTORICO_PATH.with_name(f"{HISTORICO_NAME}.remoto")
+    try:
+        _baixar_verificado(file_id, remoto, meta, folder_id, nome=HISTORICO_NAME, locais=(HISTORICO_PATH,))
+        with contextlib.closing(_conectar(HISTORICO_PATH)) as conn:
+            conn.execute("ATTACH DATABASE ? AS remoto", (str(remoto),))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                db_historico.incorporar(conn, "remoto")
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE remoto")
+    finally:
+        remoto.unlink(missing_ok=True)
+    _historico.registrar_versao(meta)
+
+
+def arquivar_servicos_encerrados(idade_dias: int | None = None) -> dict[str, int]:
+    """Move para o banco histórico os serviços encerrados há mais de `idade_dias`.
+
+    Padrão: DB_HISTORICO_IDADE_DIAS. Em três passos, para que uma falha no
+    meio nunca perca linhas: (1) copia serviços, vínculos e anexos para o
+    histórico local, (2) publica o histórico no Drive, (3) remove da réplica
+    os serviços cuja cópia no histórico está idêntica — a remoção segue para
+    o Drive como qualquer outra escrita. Não deve ser chamada dentro de
+    unit_of_work(). Devolve as linhas removidas da réplica por tabela.
+    """
+    idade = db_historico.DB_HISTORICO_IDADE_DIAS if idade_dias is None else idade_dias
+    folder_id = _get_drive_folder_id()
+    with obter_conexao_leitura() as conn:
+        codigos = db_historico.arquivaveis(conn, idade)
+    if not codigos:
+        logger.info("Nenhum serviço encerrado para arquivar.")
+        return {}
+
+    with _historico.lock:
+        if not _atualizar_historico(folder_id):
+            _criar_historico_local()
+
+    # O lock do histórico não é mantido junto com o escritor: quem está com o
+    # escritor pode estar esperando para ler o histórico
+    conn = obter_conexao()
+    try:
+        db_historico.anexar(conn, HISTORICO_PATH)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            db_historico.alinhar_esquema(conn)
+            copiadas = db_historico.copiar(conn, codigos)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            db_historico.desanexar(conn)
+    finally:
+        conn.close()
+    logger.info(f"Cópia para o histórico: {copiadas}")
+
+    with _historico.lock:
+        if not _publicar_historico(folder_id):
+            raise RuntimeError(f"Falha ao publicar {HISTORICO_NAME}; nenhum serviço foi removido da réplica.")
+
+    conn = obter_conexao()
+    try:
+        db_historico.anexar(conn, HISTORICO_PATH)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            removidas = db_historico.remover_arquivados(conn, codigos)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            db_historico.desanexar(conn)
+    finally:
+        conn.close()
+    logger.info(f"Serviços encerrados arquivados; removidos da réplica: {removidas}")
+    return removidas
+
+
+@contextlib.contextmanager
+def conexao_historico():
+    """Conexão de leitura com o banco histórico anexado como `historico`.
+
+    Entrega (conn, anexado); `anexado` é False quando não há histórico ou ele
+    não pôde ser anexado, e a consulta deve usar só a réplica. O histórico é
+    baixado/atualizado apenas aqui, quando uma consulta pede dados antigos.
+    """
+    disponivel = False
+    try:
+        with _historico.lock:
+            disponivel = _atualizar_historico(_get_drive_folder_id())
+    except Exception as e:
+        logger.warning(f"Histórico indisponível: {e}")
+        disponivel = HISTORICO_PATH.exists()
+
+    conn = obter_conexao_leitura()
+    anexado = False
+    try:
+        if disponivel:
+            try:
+                db_historico.anexar(conn, HISTORICO_PATH)
+                anexado = True
+            except sqlite3.OperationalError as e:
+                # ex.: a thread está com o escritor e uma transação aberta
+                logger.warning(f"Não foi possível anexar o histórico: {e}")
+        yield conn, anexado
+    finally:
+        try:
+            if anexado:
+                db_historico.desanexar(conn)
+        finally:
+            conn.close()
 
 # Função para popular o banco de dados com exemplos (para desenvolvimento)
 
@@ -391,7 +1248,7 @@ if __name__ == "__main__":
                 "db_path_readonly": "", 
                 "db_readonly_queried": False 
             }
-            self.session_state = {} # last_remote_ts será inicializado por setdefault
+            self.session_state = {}
 
         def __getattr__(self, name):
             # Para simular st.text_input, st.button, etc., retornando um mock simples
@@ -408,7 +1265,6 @@ if __name__ == "__main__":
             return self.session_state[name]
 
     st = MockStreamlit()
-    st.session_state.setdefault("last_remote_ts", 0.0) # Garante a inicialização
 
     logger.info("Executando em modo de teste...")
     
@@ -419,38 +1275,14 @@ if __name__ == "__main__":
         cursor = conn_test.cursor()
         cursor.execute("SELECT COUNT(*) FROM usuarios")
         logger.info(f"Contagem de usuários: {cursor.fetchone()[0]}")
-        # Simula uma escrita para testar a flag dirty
-        # marca_sujo() 
-        # logger.info(f"Após marca_sujo, _thread_local.dirty: {getattr(_thread_local, 'dirty', 'N/A')}")
-    logger.info(f"Após sair do contexto, _thread_local.dirty: {db_dirty}") # Deve ser False
+        # Só leitura: o commit ao sair do contexto não agenda publicação
+    logger.info(f"Após sair do contexto, pendências de sincronização: {status_sincronizacao()['escritas_pendentes']}") # Deve ser 0
 
     fechar_conexao() # Testa o fechamento explícito
-    logger.info(f"Após fechar_conexao, hasattr(_thread_local, 'conn'): {hasattr(_thread_local, 'conn')}") # Deve ser False
 
     logger.info("Reabrindo conexão para teste...")
     with conexao() as conn_test_2:
         logger.info(f"Segunda conexão obtida: {conn_test_2}")
-        logger.info(f"Na segunda conexão, _thread_local.dirty: {db_dirty}") # Deve ser False
-    logger.info(f"Após sair do segundo contexto, _thread_local.dirty: {db_dirty}") # Deve ser False
-
-
-    # Exemplo: Como usar obter_conexao e fechar_conexao sem o context manager
-    # logger.info("Testando obter_conexao e fechar_conexao manualmente...")
-    # conn_manual = obter_conexao()
-    # try:
-    #     logger.info(f"Conexão manual: {conn_manual}, dirty: {getattr(_thread_local, 'dirty', 'N/A')}")
-    #     # conn_manual.execute("INSERT INTO usuarios (nome, usuario, senha, tipo) VALUES ('Test', 'testuser', 'test', 'ope')")
-    #     # marca_sujo()
-    #     # logger.info(f"Após escrita manual, dirty: {getattr(_thread_local, 'dirty', 'N/A')}")
-    #     # conn_manual.commit() # Commit manual necessário se não usar o contexto e dirty=True
-    #     # logger.info("Commit manual realizado.")
-    # except Exception as e:
-    #     logger.error(f"Erro no teste manual: {e}")
-    #     # conn_manual.rollback() # Rollback em caso de erro
-    # finally:
-    #     # Se não usou contexto, e fez commit/rollback, resetar dirty manualmente se necessário
-    #     # setattr(_thread_local, "dirty", False) 
-    #     fechar_conexao()
-    # logger.info(f"Após fechar conexão manual, hasattr(_thread_local, 'conn'): {hasattr(_thread_local, 'conn')}")
-    
+    logger.info(f"Após sair do segundo contexto, pendências de sincronização: {status_sincronizacao()['escritas_pendentes']}") # Deve ser 0
+
     logger.info("Testes básicos concluídos.")
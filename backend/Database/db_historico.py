@@ -0,0 +1,181 @@
+# backend/Database/db_historico.py
+# -----------------------------------------------------------------------------
+#  Histórico (banco frio) dos serviços encerrados
+#  • Serviços 'Encerrado' mais antigos que DB_HISTORICO_IDADE_DIAS saem da
+#    réplica principal para um banco separado, junto com os vínculos
+#    (servico_funcionarios) e os metadados de anexos (arquivos_servico)
+#  • O histórico tem arquivo próprio no Drive e só é publicado quando o
+#    arquivamento move alguma linha (db_gestaodecontratos)
+#  • Consultas que pedem dados históricos anexam o banco como `historico`
+#    (ATTACH) sob demanda; as demais nunca o abrem
+#  • A cópia para o histórico é confirmada (e publicada) antes da remoção da
+#    réplica: se o processo parar no meio, o serviço fica nos dois bancos e
+#    as consultas dão preferência à linha da réplica
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Idade mínima (pela data de execução, ou de criação) de um serviço encerrado arquivado
+DB_HISTORICO_IDADE_DIAS = int(os.getenv("DB_HISTORICO_IDADE_DIAS", "365"))
+
+ALIAS = "historico"
+STATUS_ARQUIVAVEL = "Encerrado"
+
+# Tabelas arquivadas, todas ligadas ao serviço por cod_servico (servicos primeiro)
+TABELAS = ("servicos", "servico_funcionarios", "arquivos_servico")
+
+# Chaves únicas no histórico (CREATE TABLE ... AS não copia as restrições)
+_INDICES = (
+    ("idx_hist_servicos_cod", "servicos", ("cod_servico",), True),
+    ("idx_hist_servico_funcionarios", "servico_funcionarios", ("cod_servico", "cod_funcionario"), True),
+    ("idx_hist_arquivos_servico_id", "arquivos_servico", ("id",), True),
+    ("idx_hist_arquivos_servico_servico", "arquivos_servico", ("cod_servico", "data_upload"), False),
+)
+
+_CODIGOS_TABLE = "_historico_codigos"
+
+
+def colunas(conn: sqlite3.Connection, tabela: str, esquema: str = "main") -> List[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA {esquema}.table_info("{tabela}")').fetchall()]
+
+
+def anexar(conn: sqlite3.Connection, caminho) -> None:
+    """Anexa o banco histórico a `conn` como `historico` (fora de transação)."""
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (str(caminho),))
+
+
+def desanexar(conn: sqlite3.Connection) -> None:
+    if any(r[1] == ALIAS for r in conn.execute("PRAGMA database_list").fetchall()):
+        conn.execute(f"DETACH DATABASE {ALIAS}")
+
+
+def alinhar_esquema(conn: sqlite3.Connection) -> None:
+    """Cria no histórico as tabelas que faltam e acrescenta colunas novas da réplica."""
+    for tabela in TABELAS:
+        principais = colunas(conn, tabela)
+        if not principais:
+            continue
+        existentes = colunas(conn, tabela, ALIAS)
+        if not existentes:
+            conn.execute(f'CREATE TABLE {ALIAS}."{tabela}" AS SELECT * FROM main."{tabela}" WHERE 0')
+            continue
+        for coluna in principais:
+            if coluna not in existentes:
+                conn.execute(f'ALTER TABLE {ALIAS}."{tabela}" ADD COLUMN "{coluna}"')
+    for nome, tabela, cols, unico in _INDICES:
+        conn.execute(
+            f"CREATE {'UNIQUE ' if unico else ''}INDEX IF NOT EXISTS {ALIAS}.{nome} "
+            f"ON \"{tabela}\" ({', '.join(cols)})"
+        )
+
+
+def selecao(conn: sqlite3.Connection, tabela: str, nomes: Optional[Sequence[str]] = None) -> str:
+    """Colunas do histórico na ordem da réplica (ou de `nomes`), para um UNION ALL com `main.tabela`.
+
+    Colunas criadas na réplica depois do último arquivamento vêm como NULL.
+    """
+    existentes = set(colunas(conn, tabela, ALIAS))
+    return ", ".join(
+        f'h."{c}"' if c in existentes else f'NULL AS "{c}"' for c in (nomes or colunas(conn, tabela))
+    )
+
+
+def _data_limite(idade_dias: int) -> str:
+    return (datetime.date.today() - datetime.timedelta(days=idade_dias)).isoformat()
+
+
+def _preparar_codigos(conn: sqlite3.Connection, codigos: List[str]) -> None:
+    conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {_CODIGOS_TABLE} (cod_servico TEXT PRIMARY KEY)")
+    conn.execute(f"DELETE FROM temp.{_CODIGOS_TABLE}")
+    conn.executemany(
+        f"INSERT OR IGNORE INTO temp.{_CODIGOS_TABLE} (cod_servico) VALUES (?)", [(c,) for c in codigos]
+    )
+
+
+def arquivaveis(conn: sqlite3.Connection, idade_dias: int = DB_HISTORICO_IDADE_DIAS) -> List[str]:
+    """Códigos dos serviços encerrados há mais de `idade_dias` ainda na réplica."""
+    return [r[0] for r in conn.execute(
+        """
+        SELECT cod_servico FROM main.servicos
+        WHERE status = ? AND COALESCE(NULLIF(data_execucao, ''), data_criacao) < ?
+        """,
+        (STATUS_ARQUIVAVEL, _data_limite(idade_dias)),
+    ).fetchall()]
+
+
+def copiar(conn: sqlite3.Connection, codigos: List[str]) -> Dict[str, int]:
+    """Grava no histórico o estado atual dos serviços `codigos` e de suas linhas dependentes.
+
+    Deve rodar numa transação com o histórico anexado; só escreve no histórico.
+    """
+    _preparar_codigos(conn, codigos)
+    copiadas = {}
+    for tabela in TABELAS:
+        cols = ", ".join(f'"{c}"' for c in colunas(conn, tabela))
+        cursor = conn.execute(
+            f'INSERT OR REPLACE INTO {ALIAS}."{tabela}" ({cols}) '
+            f'SELECT {cols} FROM main."{tabela}" '
+            f"WHERE cod_servico IN (SELECT cod_servico FROM temp.{_CODIGOS_TABLE})"
+        )
+        copiadas[tabela] = cursor.rowcount
+    return copiadas
+
+
+def _identica(conn: sqlite3.Connection, tabela: str, ref: str) -> str:
+    """Condição: a linha `ref` da réplica tem cópia idêntica no histórico."""
+    iguais = " AND ".join(f'h."{c}" IS {ref}."{c}"' for c in colunas(conn, tabela))
+    return f'EXISTS (SELECT 1 FROM {ALIAS}."{tabela}" h WHERE {iguais})'
+
+
+def remover_arquivados(conn: sqlite3.Connection, codigos: List[str]) -> Dict[str, int]:
+    """Remove da réplica os serviços `codigos` cuja cópia no histórico está completa.
+
+    Um serviço só sai da réplica se ele e todas as suas linhas dependentes têm
+    cópia idêntica no histórico; os alterados desde a cópia ficam para o
+    próximo arquivamento. Deve rodar numa transação com o histórico anexado.
+    """
+    _preparar_codigos(conn, codigos)
+    condicoes = [f'NOT {_identica(conn, "servicos", "s")}']
+    for tabela in TABELAS[1:]:
+        condicoes.append(
+            f'EXISTS (SELECT 1 FROM main."{tabela}" m '
+            f"WHERE m.cod_servico = s.cod_servico AND NOT {_identica(conn, tabela, 'm')})"
+        )
+    conn.execute(
+        f"DELETE FROM temp.{_CODIGOS_TABLE} WHERE cod_servico IN ("
+        f"SELECT s.cod_servico FROM main.servicos s "
+        f"WHERE s.cod_servico IN (SELECT cod_servico FROM temp.{_CODIGOS_TABLE}) "
+        f"AND ({' OR '.join(condicoes)}))"
+    )
+    removidas = {}
+    for tabela in reversed(TABELAS):
+        cursor = conn.execute(
+            f'DELETE FROM main."{tabela}" '
+            f"WHERE cod_servico IN (SELECT cod_servico FROM temp.{_CODIGOS_TABLE})"
+        )
+        removidas[tabela] = cursor.rowcount
+    return removidas
+
+
+def incorporar(conn: sqlite3.Connection, esquema: str) -> None:
+    """Copia para `main` as linhas de outro histórico anexado como `esquema` que faltam nele.
+
+    Usado quando outra instância publicou o histórico ao mesmo tempo: as duas
+    versões são unidas (linhas arquivadas não mudam depois de arquivadas).
+    """
+    for tabela in TABELAS:
+        cols = [c for c in colunas(conn, tabela, esquema) if c in set(colunas(conn, tabela))]
+        if not cols:
+            continue
+        lista = ", ".join(f'"{c}"' for c in cols)
+        conn.execute(
+            f'INSERT OR IGNORE INTO main."{tabela}" ({lista}) SELECT {lista} FROM {esquema}."{tabela}"'
+        )
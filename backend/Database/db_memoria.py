@@ -0,0 +1,180 @@
+# backend/Database/db_memoria.py
+# -----------------------------------------------------------------------------
+#  Réplica em memória para as leituras
+#  • A réplica local é copiada (backup) para um banco em memória com cache
+#    compartilhado (file:...?mode=memory&cache=shared): uma única cópia por
+#    versão, usada por todas as conexões de leitura do processo
+#  • Cada conexão de leitura do pool abre esse banco pelo nome: consultas sem
+#    E/S de disco e sem risco de enxergar um arquivo pela metade durante um
+#    download, sem uma cópia por sessão
+#  • A cópia é refeita numa thread própria, DB_MEMORIA_ATRASO_SECONDS depois
+#    do commit (várias escritas seguidas geram uma única cópia) ou da troca do
+#    arquivo; enquanto ela está desatualizada — qualquer commit, de qualquer
+#    conexão (PRAGMA data_version) — as leituras vão ao arquivo
+#  • Bancos maiores que DB_MEMORIA_MAX_BYTES continuam lendo do arquivo
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import contextlib
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo da réplica mantida em memória (uma cópia por processo)
+DB_MEMORIA_MAX_BYTES = int(os.getenv("DB_MEMORIA_MAX_BYTES", str(64 * 1024 * 1024)))
+# Espera, após um commit, antes de refazer a cópia em memória
+DB_MEMORIA_ATRASO_SECONDS = float(os.getenv("DB_MEMORIA_ATRASO_SECONDS", "1"))
+
+_nomes = itertools.count(1)
+
+
+class ReplicaMemoria:
+    """Cópia em memória da réplica local, compartilhada pelos leitores e refeita quando o arquivo muda.
+
+    `conectar()` abre o arquivo da réplica (sentinela e origem da cópia) e
+    `geracao()` devolve a geração atual da réplica, que muda quando o
+    arquivo é substituído por um download.
+    """
+
+    def __init__(
+        self,
+        caminho: Path,
+        conectar: Callable[[], sqlite3.Connection],
+        geracao: Callable[[], int],
+        max_bytes: int = DB_MEMORIA_MAX_BYTES,
+        atraso: float = DB_MEMORIA_ATRASO_SECONDS,
+    ):
+        self._caminho = caminho
+        self._conectar = conectar
+        self._geracao = geracao
+        self.max_bytes = max_bytes
+        self.atraso = atraso
+
+        self._lock = threading.Lock()
+        self._sentinela: Optional[sqlite3.Connection] = None
+        self._sentinela_geracao: Optional[int] = None
+        # Conexão que mantém vivo o banco em memória da versão atual
+        self._imagem: Optional[sqlite3.Connection] = None
+        self._uri: Optional[str] = None
+        self._versao_imagem: Optional[tuple] = None
+        self._timer: Optional[threading.Timer] = None
+        self._excedeu = False
+
+    # ------------------------------------------------------------------ API
+    def versao(self) -> tuple:
+        """Versão dos leitores: (geração, data_version, cópia em memória em dia).
+
+        Muda a cada commit ou download e quando a cópia fica pronta, para que
+        leitores abertos sobre o arquivo sejam trocados por leitores da cópia.
+        """
+        with self._lock:
+            versao = self._versao()
+            return versao + (self._imagem is not None and self._versao_imagem == versao,)
+
+    def ativa(self) -> bool:
+        """True se as leituras estão usando a réplica em memória."""
+        return not self._excedeu
+
+    def abrir_leitor(self, factory=sqlite3.Connection) -> Optional[sqlite3.Connection]:
+        """Conexão somente leitura com a cópia em memória da réplica.
+
+        Devolve None quando a cópia não existe ou está atrás do arquivo (a
+        atualização fica agendada); o chamador então abre a conexão de
+        leitura sobre o arquivo.
+        """
+        with self._lock:
+            if self._imagem is None or self._versao_imagem != self._versao():
+                self._agendar()
+                return None
+            # Aberta sob o lock: a cópia não é trocada (e liberada) no meio da conexão
+            conn = sqlite3.connect(self._uri, uri=True, check_same_thread=False, factory=factory)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def agendar_atualizacao(self) -> None:
+        """Agenda a cópia da réplica (chamar após commit); chamadas próximas geram uma só."""
+        with self._lock:
+            self._agendar()
+
+    def descartar(self) -> None:
+        """Libera a cópia em memória e a conexão sentinela."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._liberar_imagem()
+            if self._sentinela is not None:
+                self._sentinela.close()
+                self._sentinela = None
+
+    # -------------------------------------------------------------- interno
+    def _versao(self) -> tuple:
+        """Chamar com self._lock adquirido."""
+        geracao = self._geracao()
+        if self._sentinela is None or self._sentinela_geracao != geracao:
+            if self._sentinela is not None:
+                self._sentinela.close()
+            self._sentinela = self._conectar()
+            self._sentinela_geracao = geracao
+        # data_version muda quando outra conexão confirma uma escrita no arquivo
+        return geracao, self._sentinela.execute("PRAGMA data_version").fetchone()[0]
+
+    def _agendar(self) -> None:
+        """Chamar com self._lock adquirido."""
+        if self._timer is None:
+            self._timer = threading.Timer(self.atraso, self._atualizar)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _liberar_imagem(self) -> None:
+        """Chamar com self._lock adquirido; leitores já abertos mantêm a cópia até fechar."""
+        if self._imagem is not None:
+            self._imagem.close()
+        self._imagem = None
+        self._uri = None
+        self._versao_imagem = None
+
+    def _atualizar(self) -> None:
+        """Refaz a cópia em memória, fora do caminho das leituras."""
+        with self._lock:
+            self._timer = None  # commits a partir daqui agendam outra cópia
+            versao = self._versao()
+            if self._imagem is not None and self._versao_imagem == versao:
+                return
+            tamanho = self._caminho.stat().st_size if self._caminho.exists() else 0
+            if tamanho > self.max_bytes:
+                if not self._excedeu:
+                    logger.info(
+                        f"Réplica com {tamanho} bytes excede DB_MEMORIA_MAX_BYTES; leituras seguem no arquivo."
+                    )
+                self._excedeu = True
+                self._liberar_imagem()
+                return
+            self._excedeu = False
+            uri = f"file:replica_memoria_{os.getpid()}_{next(_nomes)}?mode=memory&cache=shared"
+
+        # A cópia pode incluir commits posteriores a `versao`: nesse caso ela
+        # só parece atrasada e é refeita, nunca entrega dados antigos
+        imagem = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            with contextlib.closing(self._conectar()) as origem:
+                origem.backup(imagem)
+        except sqlite3.Error as e:
+            imagem.close()
+            logger.warning(f"Falha ao copiar a réplica para a memória; leituras seguem no arquivo: {e}")
+            return
+
+        with self._lock:
+            if self._geracao() != versao[0]:
+                imagem.close()  # Arquivo trocado durante a cópia: a próxima leitura agenda outra
+                return
+            self._liberar_imagem()
+            self._imagem, self._uri, self._versao_imagem = imagem, uri, versao
+        logger.debug(f"Réplica em memória atualizada ({tamanho} bytes, versão {versao}).")
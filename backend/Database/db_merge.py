@@ -0,0 +1,250 @@
+# backend/Database/db_merge.py
+# -----------------------------------------------------------------------------
+#  Mesclagem (three-way merge) de versões concorrentes do banco
+#  • As linhas são comparadas pela chave natural de cada tabela (cod_servico,
+#    numero_contrato, ...), nunca pelo id, que diverge entre réplicas
+#  • base → local e base → remoto são comparados linha a linha; alterações que
+#    não se sobrepõem são combinadas automaticamente
+#  • Só a mesma linha alterada de formas diferentes nos dois lados é conflito:
+#    vale a versão local (a última a ser publicada) e a remota fica registrada
+#    em _sync_conflitos para revisão
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONFLITOS_TABLE = "_sync_conflitos"
+_PREFIXO_INTERNO = ("_sync_", "sqlite_")
+
+# Chave natural (única) de cada tabela do esquema
+CHAVES_NATURAIS: Dict[str, Tuple[str, ...]] = {
+    "usuarios": ("usuario",),
+    "funcionarios": ("cod_funcionario",),
+    "empresas": ("cod_empresa",),
+    "contratos": ("numero_contrato",),
+    "unidades": ("cod_unidade",),
+    "servicos": ("cod_servico",),
+    "servico_funcionarios": ("cod_servico", "cod_funcionario"),
+    "arquivos_servico": ("drive_file_id",),
+}
+
+# Chaves estrangeiras inteiras (id da linha pai) usadas nos joins dos models.
+# São locais a cada réplica: triggers criados pela migração 5 (db_migracoes)
+# as recalculam a partir das chaves naturais, por isso nunca viajam em
+# changesets nem entram na mesclagem (os ids divergem entre réplicas).
+# tabela → ((coluna, chave natural na tabela, tabela pai, chave natural do pai), ...)
+CHAVES_INTEIRAS: Dict[str, Tuple[Tuple[str, str, str, str], ...]] = {
+    "contratos": (("id_empresa", "cod_empresa", "empresas", "cod_empresa"),),
+    "unidades": (("id_contrato", "numero_contrato", "contratos", "numero_contrato"),),
+    "servicos": (("id_unidade", "cod_unidade", "unidades", "cod_unidade"),),
+    "servico_funcionarios": (
+        ("id_servico", "cod_servico", "servicos", "cod_servico"),
+        ("id_funcionario", "cod_funcionario", "funcionarios", "cod_funcionario"),
+    ),
+}
+
+Linha = Dict[str, object]
+
+
+def colunas_locais(tabela: str) -> Tuple[str, ...]:
+    """Colunas de `tabela` que só valem na réplica local (ver CHAVES_INTEIRAS)."""
+    return tuple(c[0] for c in CHAVES_INTEIRAS.get(tabela, ()))
+
+
+def chave_natural(tabela: str, colunas: Sequence[str]) -> Optional[Tuple[str, ...]]:
+    """Colunas da chave natural de `tabela`, ou None se não houver (usa-se o rowid)."""
+    chave = CHAVES_NATURAIS.get(tabela)
+    if chave and set(chave).issubset(colunas):
+        return chave
+    return None
+
+
+def valor_chave(chave: Tuple[str, ...], dados: Optional[Linha]) -> Optional[tuple]:
+    """Valor da chave natural em `dados`; None se algum componente estiver ausente/nulo."""
+    if not dados:
+        return None
+    valor = tuple(dados.get(c) for c in chave)
+    return None if any(v is None for v in valor) else valor
+
+
+def localizar_rowid(conn: sqlite3.Connection, tabela: str, chave: Tuple[str, ...], valor: tuple) -> Optional[int]:
+    """rowid da linha com a chave natural `valor`, se existir."""
+    onde = " AND ".join(f'"{c}" = ?' for c in chave)
+    row = conn.execute(f'SELECT rowid FROM "{tabela}" WHERE {onde}', valor).fetchone()
+    return row[0] if row else None
+
+
+def gravar_linha(conn: sqlite3.Connection, tabela: str, chave: Tuple[str, ...], dados: Linha) -> None:
+    """Insere ou atualiza, pela chave natural, uma linha vinda de outra réplica.
+
+    O id de origem só é reaproveitado em inserções quando está livre localmente.
+    """
+    rowid = localizar_rowid(conn, tabela, chave, valor_chave(chave, dados))
+    campos = {k: v for k, v in dados.items() if k != "id"}
+    if rowid is not None:
+        atribuicoes = ", ".join(f'"{c}" = ?' for c in campos)
+        conn.execute(
+            f'UPDATE "{tabela}" SET {atribuicoes} WHERE rowid = ?',
+            (*campos.values(), rowid),
+        )
+        return
+    id_origem = dados.get("id")
+    if id_origem is not None and conn.execute(
+        f'SELECT 1 FROM "{tabela}" WHERE rowid = ?', (id_origem,)
+    ).fetchone() is None:
+        campos = {"id": id_origem, **campos}
+    cols = ", ".join(f'"{c}"' for c in campos)
+    marcas = ", ".join("?" for _ in campos)
+    conn.execute(f'INSERT INTO "{tabela}" ({cols}) VALUES ({marcas})', tuple(campos.values()))
+
+
+def remover_linha(conn: sqlite3.Connection, tabela: str, chave: Tuple[str, ...], valor: tuple) -> None:
+    onde = " AND ".join(f'"{c}" = ?' for c in chave)
+    conn.execute(f'DELETE FROM "{tabela}" WHERE {onde}', valor)
+
+# -----------------------------------------------------------------------------
+#  Conflitos ---------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def _garantir_tabela_conflitos(conn: sqlite3.Connection) -> None:
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CONFLITOS_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabela TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            local TEXT,
+            remoto TEXT,
+            detectado_em REAL NOT NULL,
+            resolvido INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def registrar_conflitos(conn: sqlite3.Connection, conflitos: List[dict]) -> None:
+    """Grava conflitos ({tabela, chave, local, remoto}) para revisão. Não faz commit."""
+    if not conflitos:
+        return
+    _garantir_tabela_conflitos(conn)
+    agora = time.time()
+    conn.executemany(
+        f"INSERT INTO {CONFLITOS_TABLE} (tabela, chave, local, remoto, detectado_em) VALUES (?, ?, ?, ?, ?)",
+        [
+            (
+                c["tabela"],
+                json.dumps(c["chave"], ensure_ascii=False),
+                json.dumps(c["local"], ensure_ascii=False) if c["local"] is not None else None,
+                json.dumps(c["remoto"], ensure_ascii=False) if c["remoto"] is not None else None,
+                agora,
+            )
+            for c in conflitos
+        ],
+    )
+    for c in conflitos:
+        logger.warning(f"Conflito em {c['tabela']} {c['chave']}: mantida a versão local.")
+
+
+def listar_conflitos(conn: sqlite3.Connection, apenas_pendentes: bool = True) -> List[tuple]:
+    """Conflitos registrados: (id, tabela, chave, local, remoto, detectado_em, resolvido)."""
+    try:
+        sql = f"SELECT id, tabela, chave, local, remoto, detectado_em, resolvido FROM {CONFLITOS_TABLE}"
+        if apenas_pendentes:
+            sql += " WHERE resolvido = 0"
+        return conn.execute(sql + " ORDER BY detectado_em DESC").fetchall()
+    except sqlite3.OperationalError:
+        return []  # nenhum conflito registrado ainda
+
+
+def marcar_conflito_resolvido(conn: sqlite3.Connection, conflito_id: int) -> None:
+    conn.execute(f"UPDATE {CONFLITOS_TABLE} SET resolvido = 1 WHERE id = ?", (conflito_id,))
+
+# -----------------------------------------------------------------------------
+#  Mesclagem de snapshots ---------------------------------------------------------
+# -----------------------------------------------------------------------------
+
+def _tabelas(conn: sqlite3.Connection) -> List[str]:
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    return [r[0] for r in rows if not r[0].startswith(_PREFIXO_INTERNO)]
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> List[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{tabela}")').fetchall()]
+
+
+def _carregar(conn: sqlite3.Connection, tabela: str, colunas: List[str], chave: Tuple[str, ...]) -> Dict[tuple, Linha]:
+    """Linhas de `tabela` indexadas pela chave natural (linhas com chave nula são ignoradas)."""
+    cols = ", ".join(f'"{c}"' for c in colunas)
+    linhas = {}
+    for row in conn.execute(f'SELECT {cols} FROM "{tabela}"'):
+        dados = dict(zip(colunas, row))
+        valor = valor_chave(chave, dados)
+        if valor is not None:
+            linhas[valor] = dados
+    return linhas
+
+
+def sem_id(dados: Optional[Linha]) -> Optional[Linha]:
+    """Linha sem o id, que não é comparável entre réplicas."""
+    return None if dados is None else {k: v for k, v in dados.items() if k != "id"}
+
+
+def mesclar_snapshot(conn: sqlite3.Connection, base: Path, remoto: Path) -> List[dict]:
+    """Incorpora à réplica local (`conn`) as alterações base → remoto.
+
+    Linhas alteradas só no remoto são aplicadas; alterações só locais são
+    mantidas; linhas alteradas nos dois lados com resultados diferentes são
+    conflitos (vale a versão local) e são registradas em _sync_conflitos.
+    Deve ser chamada dentro de uma transação, que o chamador confirma.
+    Retorna a lista de conflitos.
+    """
+    conflitos: List[dict] = []
+    with contextlib.closing(sqlite3.connect(str(base))) as cb, \
+            contextlib.closing(sqlite3.connect(str(remoto))) as cr:
+        tabelas_remotas = set(_tabelas(cr))
+        tabelas_base = set(_tabelas(cb))
+        for tabela in _tabelas(conn):
+            if tabela not in tabelas_remotas:
+                continue
+            # Só as colunas presentes nas três versões entram na comparação
+            comuns = set(_colunas(cr, tabela))
+            if tabela in tabelas_base:
+                comuns &= set(_colunas(cb, tabela))
+            locais = colunas_locais(tabela)
+            colunas = [c for c in _colunas(conn, tabela) if c in comuns and c not in locais]
+            chave = chave_natural(tabela, colunas)
+            if chave is None:
+                logger.warning(f"Tabela {tabela} sem chave natural; mesclagem ignorada.")
+                continue
+            linhas_remotas = _carregar(cr, tabela, colunas, chave)
+            linhas_base = _carregar(cb, tabela, colunas, chave) if tabela in tabelas_base else {}
+            linhas_locais = _carregar(conn, tabela, colunas, chave)
+
+            for valor in linhas_base.keys() | linhas_remotas.keys() | linhas_locais.keys():
+                b = sem_id(linhas_base.get(valor))
+                l = sem_id(linhas_locais.get(valor))
+                r = sem_id(linhas_remotas.get(valor))
+                if l == r or r == b:
+                    continue  # iguais, ou só o lado local mudou
+                if l == b:
+                    # Só o remoto mudou: aplica na réplica local
+                    if r is None:
+                        remover_linha(conn, tabela, chave, valor)
+                    else:
+                        gravar_linha(conn, tabela, chave, linhas_remotas[valor])
+                    continue
+                conflitos.append({
+                    "tabela": tabela,
+                    "chave": dict(zip(chave, valor)),
+                    "local": l,
+                    "remoto": r,
+                })
+    registrar_conflitos(conn, conflitos)
+    return conflitos
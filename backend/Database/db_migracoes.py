@@ -0,0 +1,289 @@
+# backend/Database/db_migracoes.py
+# -----------------------------------------------------------------------------
+#  Migrações versionadas do esquema do banco
+#  • A versão do esquema fica em PRAGMA user_version (cabeçalho do arquivo,
+#    portanto viaja junto com o snapshot publicado no Drive)
+#  • Cada migração roda uma única vez, em ordem, na mesma transação que grava
+#    a nova versão
+#  • MIGRACOES só cresce: uma migração já publicada nunca deve ser alterada
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from typing import Callable, List, Tuple
+
+from Database import db_merge, db_textos
+
+logger = logging.getLogger(__name__)
+
+
+def versao_esquema(conn: sqlite3.Connection) -> int:
+    """Versão do esquema gravada no arquivo (0 = banco anterior às migrações)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _colunas(conn: sqlite3.Connection, tabela: str) -> set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+# ─────────────── 1: esquema inicial ───────────────
+def _m001_esquema_inicial(conn: sqlite3.Connection) -> None:
+    """Tabelas originais; idempotente para bancos criados antes das migrações."""
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            data_nascimento TEXT,
+            funcao TEXT,
+            usuario TEXT UNIQUE NOT NULL,
+            senha TEXT NOT NULL,
+            tipo TEXT CHECK(tipo IN ('admin', 'ope')) NOT NULL
+        );
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM usuarios WHERE tipo = 'admin'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("""
+            INSERT INTO usuarios (nome, usuario, senha, tipo)
+            VALUES (?, ?, ?, ?)
+        """, ("Administrador", "admin", "admin123", "admin"))
+        logger.info("Usuário admin padrão criado")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS funcionarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            data_nascimento TEXT,
+            cpf TEXT UNIQUE NOT NULL,
+            cod_funcionario TEXT UNIQUE NOT NULL,
+            funcao TEXT
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS empresas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            cnpj TEXT UNIQUE NOT NULL,
+            cod_empresa TEXT UNIQUE NOT NULL,
+            pasta_empresa TEXT
+        );
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS contratos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_contrato TEXT UNIQUE NOT NULL,
+            cod_empresa TEXT NOT NULL,
+            empresa_contratada TEXT,
+            titulo TEXT,
+            especificacoes TEXT,
+            pasta_contrato TEXT,
+            FOREIGN KEY (cod_empresa) REFERENCES empresas(cod_empresa) ON DELETE CASCADE 
+        );
+    """)
+    # Adicionado ON DELETE CASCADE para cod_empresa
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS unidades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_unidade TEXT UNIQUE NOT NULL,
+            numero_contrato TEXT NOT NULL,
+            nome_unidade TEXT,
+            estado TEXT,
+            cidade TEXT,
+            localizacao TEXT,
+            pasta_unidade TEXT,
+            FOREIGN KEY (numero_contrato) REFERENCES contratos(numero_contrato) ON DELETE CASCADE
+        );
+    """)
+    # Adicionado ON DELETE CASCADE para numero_contrato
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS servicos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_servico TEXT UNIQUE NOT NULL,
+            cod_unidade TEXT NOT NULL,
+            descricao TEXT,
+            data_prevista TEXT,
+            data_execucao TEXT,
+            status TEXT,
+            observacoes TEXT,
+            pasta_servico TEXT, -- ID da pasta do serviço no Drive
+            nome_arquivo_original TEXT, -- Nome original do arquivo de upload
+            id_arquivo_drive TEXT, -- ID do arquivo específico no Drive
+            FOREIGN KEY (cod_unidade) REFERENCES unidades(cod_unidade) ON DELETE CASCADE
+        );
+    """)
+    # Adicionado ON DELETE CASCADE para cod_unidade
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS servico_funcionarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_servico TEXT NOT NULL,
+            cod_funcionario TEXT NOT NULL,
+            FOREIGN KEY (cod_servico) REFERENCES servicos(cod_servico) ON DELETE CASCADE,
+            FOREIGN KEY (cod_funcionario) REFERENCES funcionarios(cod_funcionario) ON DELETE CASCADE,
+            UNIQUE (cod_servico, cod_funcionario)
+        );
+    """)
+    # Adicionado ON DELETE CASCADE para cod_servico e cod_funcionario
+
+
+# ─────────────── 2: colunas e tabela usadas por model_servico ───────────────
+def _m002_servicos_e_arquivos(conn: sqlite3.Connection) -> None:
+    """Adiciona servicos.tipo_servico/data_criacao e cria arquivos_servico."""
+    colunas = _colunas(conn, "servicos")
+    if "tipo_servico" not in colunas:
+        conn.execute("ALTER TABLE servicos ADD COLUMN tipo_servico TEXT")
+    if "data_criacao" not in colunas:
+        conn.execute("ALTER TABLE servicos ADD COLUMN data_criacao TEXT")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS arquivos_servico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cod_servico TEXT NOT NULL,
+            nome_arquivo TEXT NOT NULL,
+            tipo_arquivo TEXT,
+            drive_file_id TEXT, -- ID do arquivo no Drive
+            data_upload TEXT,
+            descricao TEXT,
+            FOREIGN KEY (cod_servico) REFERENCES servicos(cod_servico) ON DELETE CASCADE
+        );
+    """)
+
+
+# ─────────────── 3: índices secundários ───────────────
+# (nome, tabela, colunas) de cada caminho de acesso usado em joins e filtros.
+# As chaves UNIQUE já têm índice próprio (ex.: servico_funcionarios(cod_servico, ...)).
+INDICES = (
+    ("idx_servicos_cod_unidade", "servicos", ("cod_unidade",)),
+    ("idx_servicos_status_data", "servicos", ("status", "data_criacao")),
+    ("idx_servicos_data_criacao", "servicos", ("data_criacao",)),
+    ("idx_servico_funcionarios_funcionario", "servico_funcionarios", ("cod_funcionario", "cod_servico")),
+    ("idx_unidades_numero_contrato", "unidades", ("numero_contrato", "nome_unidade")),
+    ("idx_contratos_cod_empresa", "contratos", ("cod_empresa",)),
+    ("idx_arquivos_servico_servico_data", "arquivos_servico", ("cod_servico", "data_upload")),
+)
+
+def _m003_indices(conn: sqlite3.Connection) -> None:
+    """Cria os índices de INDICES e atualiza as estatísticas do planejador."""
+    for nome, tabela, colunas in INDICES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(colunas)})")
+    conn.execute("PRAGMA optimize")
+
+
+# ─────────────── 4: textos longos fora da linha ───────────────
+def _m004_textos_separados(conn: sqlite3.Connection) -> None:
+    """Cria as colunas <coluna>_ref de db_textos e move para lá os textos longos já gravados."""
+    for tabela, coluna in db_textos.COLUNAS:
+        ref = db_textos.coluna_ref(coluna)
+        if ref not in _colunas(conn, tabela):
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {ref} TEXT")
+        longos = conn.execute(
+            f"SELECT rowid, {coluna} FROM {tabela} WHERE {ref} IS NULL AND length({coluna}) > ?",
+            (db_textos.DB_TEXTO_LIMITE,),
+        ).fetchall()
+        for rowid, texto in longos:
+            valor, hash_texto = db_textos.separar(texto)
+            conn.execute(f"UPDATE {tabela} SET {coluna} = ?, {ref} = ? WHERE rowid = ?", (valor, hash_texto, rowid))
+
+
+# ─────────────── 5: chaves estrangeiras inteiras ───────────────
+def _m005_chaves_inteiras(conn: sqlite3.Connection) -> None:
+    """Cria as colunas de db_merge.CHAVES_INTEIRAS, com índice e triggers que as mantêm.
+
+    As chaves de texto continuam sendo as chaves de busca e de sincronização;
+    a coluna inteira recebe o id do pai sempre que a linha ou o pai é gravado,
+    e volta a NULL quando o pai é removido.
+    """
+    for tabela, chaves in db_merge.CHAVES_INTEIRAS.items():
+        # Preenchimento inicial sem passar pela captura de alterações: o trigger
+        # de UPDATE é recriado por db_changeset.instalar_captura logo em seguida
+        conn.execute(f"DROP TRIGGER IF EXISTS _sync_{tabela}_upd")
+        for coluna, natural, pai, natural_pai in chaves:
+            if coluna not in _colunas(conn, tabela):
+                conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} INTEGER")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{coluna} ON {tabela} ({coluna})")
+            conn.execute(
+                f"UPDATE {tabela} SET {coluna} = "
+                f"(SELECT p.id FROM {pai} p WHERE p.{natural_pai} = {tabela}.{natural})"
+            )
+
+            base = f"_fk_{tabela}_{coluna}"
+            pai_da_linha = f"(SELECT id FROM {pai} WHERE {natural_pai} = NEW.{natural})"
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {base}_ins AFTER INSERT ON {tabela} BEGIN "
+                f"UPDATE {tabela} SET {coluna} = {pai_da_linha} WHERE rowid = NEW.rowid; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {base}_upd AFTER UPDATE OF {natural} ON {tabela} BEGIN "
+                f"UPDATE {tabela} SET {coluna} = {pai_da_linha} WHERE rowid = NEW.rowid; END"
+            )
+            # Lado do pai: filhos gravados antes dele (replay de changesets,
+            # mesclagem) e troca ou remoção da chave natural
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {base}_pai_ins AFTER INSERT ON {pai} BEGIN "
+                f"UPDATE {tabela} SET {coluna} = NEW.id WHERE {natural} = NEW.{natural_pai}; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {base}_pai_upd AFTER UPDATE OF {natural_pai} ON {pai} "
+                f"WHEN OLD.{natural_pai} IS NOT NEW.{natural_pai} BEGIN "
+                f"UPDATE {tabela} SET {coluna} = NULL WHERE {coluna} = OLD.id; "
+                f"UPDATE {tabela} SET {coluna} = NEW.id WHERE {natural} = NEW.{natural_pai}; END"
+            )
+            conn.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {base}_pai_del AFTER DELETE ON {pai} BEGIN "
+                f"UPDATE {tabela} SET {coluna} = NULL WHERE {coluna} = OLD.id; END"
+            )
+    conn.execute("PRAGMA optimize")
+
+
+# ─────────────── Registro e execução ───────────────
+MIGRACOES: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "esquema inicial", _m001_esquema_inicial),
+    (2, "servicos.tipo_servico/data_criacao e arquivos_servico", _m002_servicos_e_arquivos),
+    (3, "índices secundários", _m003_indices),
+    (4, "textos longos fora da linha (db_textos)", _m004_textos_separados),
+    (5, "chaves estrangeiras inteiras (db_merge.CHAVES_INTEIRAS)", _m005_chaves_inteiras),
+]
+
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+
+def aplicar_migracoes(conn: sqlite3.Connection) -> list[int]:
+    """Aplica, em ordem, as migrações posteriores à versão gravada no arquivo.
+
+    Cada migração é atômica: em caso de erro ela é desfeita, a versão fica na
+    última migração concluída e a exceção é propagada. Devolve as versões aplicadas.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    atual = versao_esquema(conn)
+    if atual > VERSAO_ESQUEMA:
+        logger.warning(
+            f"Esquema do banco (versão {atual}) é mais novo que o desta aplicação ({VERSAO_ESQUEMA})."
+        )
+        return []
+
+    aplicadas = []
+    for versao, descricao, migracao in MIGRACOES:
+        if versao <= atual:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {versao}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Falha na migração {versao} ({descricao}); esquema mantido na versão {atual}.")
+            raise
+        atual = versao
+        aplicadas.append(versao)
+        logger.info(f"Migração {versao} aplicada: {descricao}")
+    return aplicadas
@@ -0,0 +1,224 @@
+# backend/Database/db_pool.py
+# -----------------------------------------------------------------------------
+#  Pool de conexões SQLite do processo
+#  • Conexões de leitura ficam abertas entre reruns e são reaproveitadas
+#  • Uma única conexão de escrita por processo, emprestada a uma thread por vez
+#  • close() e a saída do with devolvem a conexão ao pool em vez de fechá-la
+#  • Conexões abertas antes da troca da réplica local são reabertas no empréstimo
+#  • Dentro de uma unidade de trabalho, commit() é adiado para o fim da unidade
+#  • O commit da conexão de escrita entrega as escritas da transação
+#    (db_escritas) aos ouvintes registrados
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+from Database import db_escritas
+
+logger = logging.getLogger(__name__)
+
+
+class ConexaoPool(sqlite3.Connection):
+    """sqlite3.Connection que volta ao pool ao ser fechada.
+
+    Usada como `factory` de sqlite3.connect(). Cada empréstimo deve ser
+    devolvido exatamente uma vez, por close() ou pela saída do `with`, que
+    antes faz commit/rollback como uma conexão sqlite3 comum.
+    """
+
+    pool: Optional["PoolConexoes"] = None
+    geracao: int = 0
+    somente_leitura: bool = False
+    unidade: int = 0                 # profundidade das unidades de trabalho abertas
+    unidade_desfeita: bool = False   # alguma operação da unidade fez rollback
+
+    def commit(self) -> None:
+        if self.unidade:
+            return  # confirmado uma única vez, ao fim da unidade de trabalho
+        escritas = {} if self.somente_leitura else db_escritas.coletar(self)
+        super().commit()
+        if escritas:
+            db_escritas.notificar(escritas)
+
+    def rollback(self) -> None:
+        if self.unidade:
+            self.unidade_desfeita = True
+        super().rollback()
+
+    def close(self) -> None:
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.devolver(self)
+
+    def fechar(self) -> None:
+        """Fecha de fato a conexão SQLite."""
+        self.pool = None
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # O __exit__ de sqlite3.Connection chama o commit em C, ignorando a
+        # sobrescrita acima; por isso commit/rollback são chamados aqui
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class PoolConexoes:
+    """Empresta conexões de leitura e a conexão de escrita do processo.
+
+    `abrir(somente_leitura)` cria uma ConexaoPool já configurada e
+    `geracao()` devolve a geração atual da réplica; conexões de uma geração
+    anterior são descartadas e reabertas no próximo empréstimo. Leitores
+    podem usar uma versão própria (`versao_leitores()`, ex.: a da réplica em
+    memória), que muda com mais frequência que a do escritor.
+    """
+
+    def __init__(
+        self,
+        abrir: Callable[[bool], ConexaoPool],
+        geracao: Callable[[], int],
+        max_leitores_ociosos: int = 4,
+        espera_escritor: float = 30.0,
+        versao_leitores: Optional[Callable[[], object]] = None,
+    ):
+        self._abrir = abrir
+        self._geracao = geracao
+        self._versao_leitores = versao_leitores or geracao
+        self.max_leitores_ociosos = max_leitores_ociosos
+        self.espera_escritor = espera_escritor
+
+        self._cond = threading.Condition()
+        self._leitores: List[ConexaoPool] = []
+        self._escritor: Optional[ConexaoPool] = None
+        self._dono: Optional[threading.Thread] = None
+        self._profundidade = 0
+
+    # ------------------------------------------------------------------ API
+    def possui_escritor(self) -> bool:
+        """True se a thread atual está com a conexão de escrita emprestada."""
+        with self._cond:
+            return self._dono is threading.current_thread()
+
+    def escritor_atual(self) -> Optional[ConexaoPool]:
+        """Conexão de escrita emprestada à thread atual, sem novo empréstimo."""
+        with self._cond:
+            return self._escritor if self._dono is threading.current_thread() else None
+
+    def escritor(self) -> ConexaoPool:
+        """Empresta a conexão de escrita, aguardando se outra thread a estiver usando.
+
+        Empréstimos aninhados na mesma thread devolvem a mesma conexão.
+        """
+        atual = threading.current_thread()
+        limite = time.monotonic() + self.espera_escritor
+        with self._cond:
+            while self._dono is not None and self._dono is not atual:
+                if not self._dono.is_alive():
+                    logger.warning(
+                        f"Conexão de escrita abandonada pela thread {self._dono.name}; recuperando."
+                    )
+                    self._liberar_escritor()
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise sqlite3.OperationalError(
+                        "Tempo esgotado aguardando a conexão de escrita do banco."
+                    )
+                self._cond.wait(min(restante, 1.0))
+
+            if self._dono is None:
+                if self._escritor is not None and self._escritor.geracao != self._geracao():
+                    self._escritor.fechar()
+                    self._escritor = None
+                if self._escritor is None:
+                    self._escritor = self._nova(somente_leitura=False)
+                self._dono = atual
+            self._profundidade += 1
+            return self._escritor
+
+    def leitor(self) -> ConexaoPool:
+        """Empresta uma conexão somente leitura.
+
+        Se a thread atual está com a conexão de escrita, devolve ela mesma para
+        que a leitura enxergue as alterações ainda não confirmadas.
+        """
+        if self.possui_escritor():
+            return self.escritor()
+        geracao = self._versao_leitores()
+        with self._cond:
+            while self._leitores:
+                conn = self._leitores.pop()
+                if conn.geracao == geracao:
+                    return conn
+                conn.fechar()
+        return self._nova(somente_leitura=True, geracao=geracao)
+
+    def devolver(self, conn: ConexaoPool) -> None:
+        """Recebe de volta uma conexão emprestada por escritor() ou leitor()."""
+        if not conn.somente_leitura:
+            with self._cond:
+                if conn is not self._escritor or self._dono is not threading.current_thread():
+                    logger.warning("Devolução da conexão de escrita por quem não a emprestou; ignorada.")
+                    return
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    self._liberar_escritor()
+            return
+
+        if conn.in_transaction:
+            conn.rollback()
+        versao = self._versao_leitores()
+        with self._cond:
+            if (
+                conn.geracao == versao
+                and len(self._leitores) < self.max_leitores_ociosos
+                and conn not in self._leitores
+            ):
+                self._leitores.append(conn)
+                return
+        conn.fechar()
+
+    def fechar_ociosas(self) -> None:
+        """Fecha as conexões que não estão emprestadas."""
+        with self._cond:
+            leitores, self._leitores = self._leitores, []
+            if self._dono is None and self._escritor is not None:
+                leitores.append(self._escritor)
+                self._escritor = None
+        for conn in leitores:
+            conn.fechar()
+
+    # -------------------------------------------------------------- interno
+    def _nova(self, somente_leitura: bool, geracao=None) -> ConexaoPool:
+        # A versão é lida antes de abrir: se mudar no meio, a conexão já nasce obsoleta
+        if geracao is None:
+            geracao = self._geracao()
+        conn = self._abrir(somente_leitura)
+        conn.pool = self
+        conn.geracao = geracao
+        conn.somente_leitura = somente_leitura
+        return conn
+
+    def _liberar_escritor(self) -> None:
+        """Devolve a conexão de escrita ao pool (chamar com self._cond adquirido)."""
+        conn = self._escritor
+        if conn is not None:
+            conn.unidade = 0
+            conn.unidade_desfeita = False
+        if conn is not None and conn.in_transaction:
+            logger.warning("Conexão de escrita devolvida com transação aberta; alterações desfeitas.")
+            conn.rollback()
+        self._dono = None
+        self._profundidade = 0
+        self._cond.notify_all()
@@ -0,0 +1,86 @@
+# backend/Database/db_sequencias.py
+# -----------------------------------------------------------------------------
+#  Sequências para códigos gerados pela aplicação (OS_AAAAMMDD_NNN, nomes de anexos)
+#  • Cada sequência é uma linha de _sync_sequencias com o último valor
+#    reservado; reservar() incrementa e devolve a faixa num único UPSERT
+#    ... RETURNING, na transação de escrita do chamador
+#  • Uma sessão pode reservar um bloco de valores de uma vez e consumi-lo sem
+#    voltar ao banco (DB_SEQUENCIA_BLOCO); o padrão é 1, porque blocos
+#    maiores alargam a janela em que outra réplica grava o mesmo código
+#  • A tabela é local à réplica (prefixo _sync_: fora da captura e da
+#    mesclagem); por isso a reserva nunca fica abaixo de `minimo`, o maior
+#    código já gravado (inclusive vindo de outra réplica) + 1. Não garante
+#    código livre: quem grava trata a colisão (UNIQUE) reservando outro
+#  • Sequências que não serão mais usadas saem com descartar() /
+#    descartar_anteriores()
+#  • O maior valor reservado por este processo também fica em memória: uma
+#    reserva desfeita (rollback) ou um snapshot baixado por cima não fazem a
+#    sequência entregar de novo valores que já estão com alguma sessão
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Dict
+
+SEQUENCIAS_TABLE = "_sync_sequencias"
+
+# Valores reservados de uma vez por sessão nas sequências com bloco
+DB_SEQUENCIA_BLOCO = int(os.getenv("DB_SEQUENCIA_BLOCO", "1"))
+
+_lock = threading.Lock()
+_reservados: Dict[str, int] = {}
+
+
+def _garantir_tabela(conn: sqlite3.Connection) -> None:
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SEQUENCIAS_TABLE} (
+            nome TEXT PRIMARY KEY,
+            ultimo INTEGER NOT NULL
+        )
+    """)
+
+
+def reservar(conn: sqlite3.Connection, nome: str, quantidade: int = 1, minimo: int = 1) -> range:
+    """Reserva `quantidade` valores consecutivos da sequência `nome` e devolve a faixa.
+
+    `conn` deve ser a conexão de escrita; o chamador confirma a transação.
+    A faixa começa no maior entre `minimo` e o valor seguinte ao último reservado.
+    """
+    quantidade = max(1, quantidade)
+    _garantir_tabela(conn)
+    with _lock:
+        inicio = max(minimo, _reservados.get(nome, 0) + 1)
+        ultimo = conn.execute(
+            f"""
+            INSERT INTO {SEQUENCIAS_TABLE} (nome, ultimo) VALUES (?, ?)
+            ON CONFLICT(nome) DO UPDATE SET ultimo = max(ultimo + ?, excluded.ultimo)
+            RETURNING ultimo
+            """,
+            (nome, inicio + quantidade - 1, quantidade),
+        ).fetchone()[0]
+        _reservados[nome] = max(_reservados.get(nome, 0), ultimo)
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def descartar(conn: sqlite3.Connection, nome: str) -> None:
+    """Remove a sequência `nome` (o dono dos códigos deixou de existir)."""
+    _garantir_tabela(conn)
+    with _lock:
+        conn.execute(f"DELETE FROM {SEQUENCIAS_TABLE} WHERE nome = ?", (nome,))
+        _reservados.pop(nome, None)
+
+
+def descartar_anteriores(conn: sqlite3.Connection, nome: str) -> None:
+    """Remove as sequências do grupo de `nome` (o trecho até ':') ordenadas antes dela.
+
+    Ex.: "servico:OS_20250102_" descarta as sequências dos dias anteriores.
+    """
+    grupo = nome[: nome.index(":") + 1]
+    _garantir_tabela(conn)
+    with _lock:
+        conn.execute(f"DELETE FROM {SEQUENCIAS_TABLE} WHERE nome >= ? AND nome < ?", (grupo, nome))
+        for antigo in [n for n in _reservados if grupo <= n < nome]:
+            del _reservados[antigo]
@@ -0,0 +1,257 @@
+# backend/Database/db_sync.py
+# -----------------------------------------------------------------------------
+#  Sincronização em segundo plano (write-behind) com o Google Drive
+#  • agendar() apenas registra que há escrita a publicar e retorna na hora
+#  • As publicações pendentes ficam numa fila em disco (outbox), com número de
+#    tentativas e último erro, e sobrevivem ao reinício do processo
+#  • Uma thread por processo agrupa todas as escritas feitas dentro da janela
+#    (debounce) em uma única publicação e repete as que falham com backoff
+#  • flush() publica imediatamente; aguardar() espera uma escrita ficar durável
+#  • status() e fila() expõem o estado para a interface
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Outbox:
+    """Fila persistente de publicações pendentes, uma linha por pasta do Drive.
+
+    Não é thread-safe: o SincronizadorDrive só a acessa com o seu lock.
+    """
+
+    def __init__(self, caminho: Optional[Path]):
+        if caminho is not None:
+            Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(caminho) if caminho is not None else ":memory:", check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                folder_id TEXT PRIMARY KEY,
+                escritas INTEGER NOT NULL,
+                criado_em REAL NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                ultimo_erro TEXT,
+                ultima_tentativa REAL
+            )
+        """)
+        self._conn.commit()
+
+    def registrar(self, folder_id: str) -> None:
+        self._conn.execute("""
+            INSERT INTO outbox (folder_id, escritas, criado_em) VALUES (?, 1, ?)
+            ON CONFLICT(folder_id) DO UPDATE SET escritas = escritas + 1
+        """, (folder_id, time.time()))
+        self._conn.commit()
+
+    def pendentes(self) -> List[tuple]:
+        """(folder_id, escritas) de cada publicação pendente, da mais antiga para a mais nova."""
+        return self._conn.execute(
+            "SELECT folder_id, escritas FROM outbox ORDER BY criado_em"
+        ).fetchall()
+
+    def concluir(self, folder_id: str, escritas: int) -> None:
+        """Remove as escritas publicadas; as agendadas durante a publicação continuam na fila."""
+        self._conn.execute(
+            "DELETE FROM outbox WHERE folder_id = ? AND escritas <= ?", (folder_id, escritas)
+        )
+        self._conn.execute("""
+            UPDATE outbox SET escritas = escritas - ?, criado_em = ?, tentativas = 0, ultimo_erro = NULL
+            WHERE folder_id = ?
+        """, (escritas, time.time(), folder_id))
+        self._conn.commit()
+
+    def falhar(self, folder_id: str, erro: str) -> int:
+        """Registra uma tentativa malsucedida e devolve o total de tentativas."""
+        self._conn.execute("""
+            UPDATE outbox SET tentativas = tentativas + 1, ultimo_erro = ?, ultima_tentativa = ?
+            WHERE folder_id = ?
+        """, (erro, time.time(), folder_id))
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT tentativas FROM outbox WHERE folder_id = ?", (folder_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def itens(self) -> List[dict]:
+        colunas = ("folder_id", "escritas", "criado_em", "tentativas", "ultimo_erro", "ultima_tentativa")
+        rows = self._conn.execute(f"SELECT {', '.join(colunas)} FROM outbox ORDER BY criado_em").fetchall()
+        return [dict(zip(colunas, row)) for row in rows]
+
+
+class SincronizadorDrive:
+    """Agrupa escritas e as publica no Drive em uma thread de segundo plano.
+
+    `publicar(folder_id)` é chamado pela thread e deve levantar exceção em
+    caso de falha; a publicação é então repetida com backoff exponencial, de
+    `espera_erro` até `espera_erro_maxima` segundos. Cada chamada a agendar()
+    devolve um ticket; a escrita correspondente está durável quando
+    `concluido >= ticket`. Com `caminho_outbox`, a fila é gravada em disco e
+    retomada quando o processo reinicia.
+    """
+
+    def __init__(
+        self,
+        publicar: Callable[[str], None],
+        janela: float = 2.0,
+        espera_maxima: float = 10.0,
+        espera_erro: float = 15.0,
+        espera_erro_maxima: float = 300.0,
+        caminho_outbox: Optional[Path] = None,
+    ):
+        self._publicar = publicar
+        self.janela = janela
+        self.espera_maxima = espera_maxima
+        self.espera_erro = espera_erro
+        self.espera_erro_maxima = espera_erro_maxima
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._outbox = _Outbox(caminho_outbox)
+        self._solicitado = 0          # ticket da última escrita agendada
+        self._concluido = 0           # maior ticket já publicado
+        self._prazo: Optional[float] = None       # quando a próxima publicação deve ocorrer
+        self._primeira_pendente: Optional[float] = None
+        self._em_andamento = False
+        self._ultimo_sucesso: Optional[float] = None
+        self._ultimo_erro: Optional[str] = None
+
+        # Publicações que ficaram pendentes numa execução anterior do processo
+        with self._cond:
+            if self._outbox.pendentes():
+                logger.info("Publicações pendentes encontradas na fila; retomando sincronização.")
+                self._solicitado = 1
+                self._primeira_pendente = time.monotonic()
+                self._prazo = time.monotonic()
+                self._garantir_thread()
+
+    # ------------------------------------------------------------------ API
+    def agendar(self, folder_id: str) -> int:
+        """Registra uma escrita a publicar e devolve o ticket correspondente."""
+        with self._cond:
+            agora = time.monotonic()
+            self._outbox.registrar(folder_id)
+            self._solicitado += 1
+            if self._primeira_pendente is None:
+                self._primeira_pendente = agora
+            # Debounce: cada escrita adia a publicação, até o limite de espera_maxima.
+            # Em backoff após erro, a nova escrita não antecipa a próxima tentativa.
+            if self._ultimo_erro is None or self._prazo is None:
+                limite = self._primeira_pendente + self.espera_maxima
+                self._prazo = min(agora + self.janela, limite)
+            self._garantir_thread()
+            self._cond.notify_all()
+            return self._solicitado
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Publica imediatamente tudo o que está pendente e aguarda. True se durável."""
+        with self._cond:
+            ticket = self._solicitado
+            if self._concluido >= ticket:
+                return True
+            self._prazo = time.monotonic()
+            self._garantir_thread()
+            self._cond.notify_all()
+        return self.aguardar(ticket, timeout)
+
+    def aguardar(self, ticket: int, timeout: Optional[float] = None) -> bool:
+        """Espera até a escrita `ticket` estar publicada. False se o tempo acabar."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._concluido < ticket:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+            return True
+
+    def status(self) -> dict:
+        """Estado atual da sincronização, para exibição na interface."""
+        with self._cond:
+            itens = self._outbox.itens()
+            return {
+                "pendente": bool(itens),
+                "escritas_pendentes": sum(i["escritas"] for i in itens),
+                "fila": len(itens),
+                "tentativas": max((i["tentativas"] for i in itens), default=0),
+                "em_andamento": self._em_andamento,
+                "pendente_desde": min((i["criado_em"] for i in itens), default=None),
+                "proxima_tentativa": (
+                    time.time() + max(0.0, self._prazo - time.monotonic())
+                    if itens and self._prazo is not None else None
+                ),
+                "ultimo_sucesso": self._ultimo_sucesso,
+                "ultimo_erro": self._ultimo_erro,
+            }
+
+    def fila(self) -> List[dict]:
+        """Itens da fila persistente (pasta, escritas, criação, tentativas, último erro)."""
+        with self._cond:
+            return self._outbox.itens()
+
+    # --------------------------------------------------------------- thread
+    def _garantir_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._executar, name="sincronizador-drive", daemon=True
+            )
+            self._thread.start()
+
+    def _espera_apos_erro(self, tentativas: int) -> float:
+        return min(self.espera_erro * 2 ** max(tentativas - 1, 0), self.espera_erro_maxima)
+
+    def _executar(self) -> None:
+        while True:
+            with self._cond:
+                while not self._outbox.pendentes():
+                    self._concluido = max(self._concluido, self._solicitado)
+                    self._primeira_pendente = None
+                    self._prazo = None
+                    self._cond.notify_all()
+                    self._cond.wait()
+                while self._prazo is not None and self._prazo > time.monotonic():
+                    self._cond.wait(self._prazo - time.monotonic())
+                alvo = self._solicitado
+                pendentes = self._outbox.pendentes()
+                self._em_andamento = True
+
+            erro = None
+            tentativas = 0
+            for folder_id, escritas in pendentes:
+                try:
+                    self._publicar(folder_id)
+                except Exception as e:
+                    logger.error(f"Falha na sincronização com o Drive: {e}")
+                    with self._cond:
+                        tentativas = max(tentativas, self._outbox.falhar(folder_id, str(e)))
+                    erro = str(e)
+                    continue
+                with self._cond:
+                    self._outbox.concluir(folder_id, escritas)
+
+            with self._cond:
+                self._em_andamento = False
+                if erro is not None:
+                    self._ultimo_erro = erro
+                    espera = self._espera_apos_erro(tentativas)
+                    logger.info(f"Nova tentativa de sincronização em {espera:.0f}s (tentativa {tentativas}).")
+                    self._prazo = time.monotonic() + espera
+                else:
+                    self._concluido = max(self._concluido, alvo)
+                    self._ultimo_sucesso = time.time()
+                    self._ultimo_erro = None
+                    if self._concluido >= self._solicitado:
+                        self._primeira_pendente = None
+                        self._prazo = None
+                self._cond.notify_all()
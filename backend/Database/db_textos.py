@@ -0,0 +1,163 @@
+# backend/Database/db_textos.py
+# -----------------------------------------------------------------------------
+#  Textos longos fora da réplica (servicos.observacoes, contratos.especificacoes)
+#  • Textos com mais de DB_TEXTO_LIMITE caracteres são guardados à parte,
+#    endereçados pelo sha256, como <DB_NAME>.txt.<sha256>.gz no Drive
+#  • A linha do banco fica só com um resumo na própria coluna e a referência
+#    (coluna <coluna>_ref): listagens e changesets carregam linhas compactas
+#  • O texto entra num cache local no momento da escrita e é enviado ao Drive
+#    na publicação seguinte, antes do changeset que o referencia
+#  • O texto completo só é lido (do cache local ou do Drive) quando uma tela
+#    de detalhe/edição o pede
+# -----------------------------------------------------------------------------
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from Services import Service_googledrive as gdrive
+
+logger = logging.getLogger(__name__)
+
+# Textos acima deste tamanho (em caracteres) saem da linha do banco
+DB_TEXTO_LIMITE = int(os.getenv("DB_TEXTO_LIMITE", "1000"))
+
+# Tamanho do resumo mantido na coluna original
+RESUMO_CARACTERES = 200
+_RETICENCIAS = "…"
+
+# (tabela, coluna) guardadas à parte; a referência fica em <coluna>_ref
+COLUNAS = (("servicos", "observacoes"), ("contratos", "especificacoes"))
+
+# Cache local dos textos e marcadores dos que ainda não foram enviados ao Drive
+TEXTOS_DIR = Path(tempfile.gettempdir()) / "db_gestaodecontratos_textos"
+_PENDENTES_DIR = TEXTOS_DIR / "pendentes"
+
+
+def coluna_ref(coluna: str) -> str:
+    return f"{coluna}_ref"
+
+
+def _prefixo(db_name: str) -> str:
+    return f"{db_name}.txt."
+
+
+def nome_texto(db_name: str, ref: str) -> str:
+    return f"{_prefixo(db_name)}{ref}.gz"
+
+
+def _local(ref: str) -> Path:
+    return TEXTOS_DIR / f"{ref}.gz"
+
+
+def _hash(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def resumo(texto: str) -> str:
+    return texto[:RESUMO_CARACTERES].rstrip() + _RETICENCIAS
+
+
+def separar(texto: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """(valor da coluna, referência) para gravar `texto` no banco.
+
+    Textos curtos ficam inteiros na coluna, sem referência. Os longos são
+    gravados no cache local, marcados para envio, e a coluna recebe o resumo.
+    """
+    if texto is None or len(texto) <= DB_TEXTO_LIMITE:
+        return texto, None
+    ref = _hash(texto)
+    if not _local(ref).exists():
+        TEXTOS_DIR.mkdir(parents=True, exist_ok=True)
+        temporario = _local(ref).with_suffix(".tmp")
+        temporario.write_bytes(gzip.compress(texto.encode("utf-8"), compresslevel=6))
+        temporario.replace(_local(ref))
+    _PENDENTES_DIR.mkdir(parents=True, exist_ok=True)
+    (_PENDENTES_DIR / ref).touch()
+    return resumo(texto), ref
+
+
+def preservar(novo: Optional[str], valor_atual: Optional[str], ref_atual: Optional[str]) -> bool:
+    """True se `novo` é só o resumo já gravado de um texto guardado à parte.
+
+    Acontece quando a tela de edição não conseguiu ler o texto completo e o
+    usuário não mexeu no campo: a referência atual deve ser mantida.
+    """
+    return bool(ref_atual) and novo == valor_atual
+
+
+def _ler_local(ref: str) -> Optional[str]:
+    try:
+        texto = gzip.decompress(_local(ref).read_bytes()).decode("utf-8")
+    except (OSError, EOFError, UnicodeDecodeError):
+        return None
+    return texto if _hash(texto) == ref else None
+
+
+def obter(ref: str, db_name: str, folder_id: str) -> str:
+    """Texto completo da referência `ref` (cache local ou Drive).
+
+    Levanta IOError se o texto não puder ser obtido ou não conferir com o hash.
+    """
+    texto = _ler_local(ref)
+    if texto is not None:
+        return texto
+    file_id = gdrive.get_file_id_by_name(nome_texto(db_name, ref), folder_id)
+    if not file_id:
+        raise IOError(f"Texto {ref[:12]} não encontrado no Drive.")
+    TEXTOS_DIR.mkdir(parents=True, exist_ok=True)
+    temporario = _local(ref).with_suffix(".download")
+    try:
+        if not gdrive.download_file(file_id, str(temporario)):
+            raise IOError(f"Falha ao baixar o texto {ref[:12]} do Drive.")
+        temporario.replace(_local(ref))
+    finally:
+        temporario.unlink(missing_ok=True)
+    texto = _ler_local(ref)
+    if texto is None:
+        _local(ref).unlink(missing_ok=True)
+        raise IOError(f"Texto {ref[:12]} baixado não confere com o hash.")
+    return texto
+
+
+def enviar_pendentes(db_name: str, folder_id: str) -> int:
+    """Envia ao Drive os textos gravados localmente que ainda não estão lá.
+
+    Chamado antes de publicar changesets/snapshots, que podem referenciá-los.
+    Levanta IOError se algum envio falhar (a publicação é tentada de novo).
+    Retorna quantos textos foram enviados.
+    """
+    pendentes = sorted(p.name for p in _PENDENTES_DIR.glob("*")) if _PENDENTES_DIR.exists() else []
+    if not pendentes:
+        return 0
+    prefixo = _prefixo(db_name)
+    remotos: Dict[str, dict] = {
+        a["name"][len(prefixo):].split(".", 1)[0]: a
+        for a in gdrive.list_files_by_prefix(prefixo, folder_id)
+    }
+    enviados = 0
+    for ref in pendentes:
+        if ref not in remotos:
+            if not _local(ref).exists():
+                logger.warning(f"Texto {ref[:12]} pendente sem cópia local; ignorado.")
+            else:
+                temporario = Path(tempfile.gettempdir()) / nome_texto(db_name, ref)
+                try:
+                    temporario.write_bytes(_local(ref).read_bytes())
+                    if not gdrive.upload_file(str(temporario), folder_id):
+                        raise IOError(f"Falha ao enviar o texto {ref[:12]} ao Drive.")
+                finally:
+                    temporario.unlink(missing_ok=True)
+                enviados += 1
+        (_PENDENTES_DIR / ref).unlink(missing_ok=True)
+    if enviados:
+        logger.info(f"{enviados} texto(s) longo(s) enviados ao Drive.")
+    return enviados
@@ -15,7 +15,7 @@ from pathlib import Path
 from tempfile import gettempdir
 from typing import List, Optional, Sequence, Tuple
 
-from Database import db_gestaodecontratos as db
+from Database import db_cache, db_gestaodecontratos as db
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +62,12 @@ def criar_funcionario(
         return False
 
 
+@db_cache.em_cache("funcionarios")
+def _consultar_funcionarios(sql: str, params: tuple) -> List[Tuple]:
+    with db.obter_conexao_leitura() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
 def listar_funcionarios(
     nome_like: str | None = None,
     funcao_like: str | None = None,
@@ -89,8 +95,7 @@ def listar_funcionarios(
             params.append(offset)
 
     try:
-        with db.obter_conexao() as conn:
-            return conn.execute(sql, params).fetchall()
+        return _consultar_funcionarios(sql, tuple(params))
     except Exception as e:
         logger.error("Erro ao listar funcionários: %s", e)
         return []
@@ -98,7 +103,7 @@ def listar_funcionarios(
 
 def buscar_funcionario_por_id(funcionario_id: int) -> Optional[Tuple]:
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             return conn.execute(
                 "SELECT * FROM funcionarios WHERE id=?", (funcionario_id,)
             ).fetchone()
@@ -109,7 +114,7 @@ def buscar_funcionario_por_id(funcionario_id: int) -> Optional[Tuple]:
 
 def buscar_funcionario_por_codigo(cod_funcionario: str) -> Optional[Tuple]:
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             return conn.execute(
                 "SELECT * FROM funcionarios WHERE cod_funcionario=?",
                 (cod_funcionario,),
@@ -164,28 +169,26 @@ def atualizar_funcionario(
         return False
 
 
-def deletar_funcionario(cod_funcionario: str) -> bool:
-    try:
-        # Checa dependências em serviços
-        with db.obter_conexao() as conn:
-            if conn.execute(
-                "SELECT 1 FROM servico_funcionarios WHERE cod_funcionario=?",
-                (cod_funcionario,),
-            ).fetchone():
-                logger.warning(
-                    "Não é possível excluir funcionário %s – possui serviços vinculados.",
-                    cod_funcionario,
-                )
-                return False
+def deletar_funcionario(cod_funcionario: str) -> Optional[dict]:
+    """Exclui um funcionário sem serviços vinculados.
 
-            cur = conn.cursor()
-            cur.execute(
-                "DELETE FROM funcionarios WHERE cod_funcionario=?", (cod_funcionario,)
-            )
-            if cur.rowcount > 0:
-                db.marca_sujo()
-                logger.info("Funcionário %s deletado.", cod_funcionario)
-            return True
+    Devolve {tabela: linhas removidas} ou None se ele possui serviços
+    vinculados ou em caso de erro.
+    """
+    try:
+        # A cascata alcançaria os vínculos com serviços: a exclusão é desfeita
+        removidas = db.excluir_em_cascata(
+            "funcionarios", "cod_funcionario", cod_funcionario, bloquear=("servico_funcionarios",)
+        )
+        if removidas:
+            logger.info("Funcionário %s deletado.", cod_funcionario)
+        return removidas
+    except db.ExclusaoBloqueada:
+        logger.warning(
+            "Não é possível excluir funcionário %s – possui serviços vinculados.",
+            cod_funcionario,
+        )
+        return None
     except Exception as e:
         logger.error("Erro ao deletar funcionário: %s", e)
-        return False
+        return None
@@ -1,7 +1,7 @@
 # backend/Models/model_servico.py
 
 import sqlite3
-from typing import List, Optional, Tuple
+from typing import Callable, List, Optional, Tuple
 from pathlib import Path
 import sys
 import os
@@ -11,7 +11,7 @@ from tempfile import gettempdir
 import streamlit as st
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
-from Database import db_gestaodecontratos as db
+from Database import db_historico, db_sequencias, db_textos, db_gestaodecontratos as db
 from Services import Service_googledrive as gdrive
 from dotenv import load_dotenv
 from Models.model_unidade import obter_pasta_contrato
@@ -25,23 +25,61 @@ logger = logging.getLogger(__name__)
 
 # ──────────────── Funções Auxiliares ────────────────
 
+# Blocos de valores reservados pela sessão, por sequência ({nome: [valores]})
+_BLOCOS_SESSAO = "_blocos_sequencia"
+
+def _proximo_da_sequencia(nome: str, minimo: Callable[[sqlite3.Connection], int], bloco: int = 1) -> int:
+    """Próximo valor da sequência `nome`, tirado do bloco reservado para esta sessão.
+
+    Quando o bloco acaba, reserva outro de `bloco` valores (db_sequencias);
+    `minimo(conn)` é o menor valor aceitável pelo que já está gravado no banco.
+    """
+    blocos = st.session_state.setdefault(_BLOCOS_SESSAO, {})
+    faixa = blocos.get(nome)
+    if not faixa:
+        with db.obter_conexao() as conn:
+            faixa = list(db_sequencias.reservar(conn, nome, bloco, minimo(conn)))
+    if len(faixa) > 1:
+        blocos[nome] = faixa[1:]
+    else:
+        blocos.pop(nome, None)  # Bloco consumido: a sessão não acumula uma entrada por sequência
+    return faixa[0]
+
+
+def _sequencia_arquivos(cod_servico: str) -> str:
+    """Nome da sequência dos anexos do serviço (uma por serviço, descartada com ele)."""
+    return f"arquivo:{cod_servico}"
+
+
+# Códigos novos tentados quando o reservado já foi gravado por outra réplica
+TENTATIVAS_CODIGO = 3
+
+
+class CodigoServicoEmUso(db.TransacaoDesfeita):
+    """O código reservado já está gravado (chegou de outra réplica depois da reserva)."""
+
+
 def gerar_codigo_servico() -> Optional[str]:
+    """Reserva o próximo código OS_AAAAMMDD_NNN do dia.
+
+    Cada chamada consome um código: só deve ser chamada quando o cadastro é enviado.
+    """
     try:
-        with db.obter_conexao() as conn:
-            cursor = conn.cursor()
-            data_atual = datetime.now().strftime("%Y%m%d")
-            cursor.execute("""
-                SELECT cod_servico FROM servicos 
-                WHERE cod_servico LIKE ? 
-                ORDER BY cod_servico DESC LIMIT 1
-            """, (f"OS_{data_atual}_%",))
-            ultimo_codigo = cursor.fetchone()
-            if ultimo_codigo:
-                ultimo_numero = int(ultimo_codigo[0].split('_')[-1])
-                novo_numero = ultimo_numero + 1
-            else:
-                novo_numero = 1
-            return f"OS_{data_atual}_{novo_numero:03d}"
+        prefixo = f"OS_{datetime.now().strftime('%Y%m%d')}_"
+        sequencia = f"servico:{prefixo}"
+
+        def maior_gravado(conn: sqlite3.Connection) -> int:
+            # A sequência do dia substitui as dos dias anteriores
+            db_sequencias.descartar_anteriores(conn, sequencia)
+            # Faixa do índice único de cod_servico ('`' é o caractere seguinte a '_')
+            row = conn.execute("""
+                SELECT MAX(CAST(substr(cod_servico, ?) AS INTEGER)) FROM servicos
+                WHERE cod_servico >= ? AND cod_servico < ?
+            """, (len(prefixo) + 1, prefixo, prefixo[:-1] + "`")).fetchone()
+            return (row[0] or 0) + 1
+
+        numero = _proximo_da_sequencia(sequencia, maior_gravado, db_sequencias.DB_SEQUENCIA_BLOCO)
+        return f"{prefixo}{numero:03d}"
     except Exception as e:
         logger.error(f"Erro ao gerar código do serviço: {e}")
         return None
@@ -78,7 +116,7 @@ def obter_pasta_unidade(cod_unidade: str, nome_unidade: str, numero_contrato: st
 def obter_info_unidade(cod_servico: str) -> Optional[Tuple[str, str, str]]:
     """Obtém informações da unidade (nome, contrato e empresa) a partir do código do serviço"""
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
             
             # Primeiro busca o código da unidade associada ao serviço
@@ -95,8 +133,8 @@ def obter_info_unidade(cod_servico: str) -> Optional[Tuple[str, str, str]]:
             cursor.execute("""
                 SELECT u.nome_unidade, c.numero_contrato, e.nome
                 FROM unidades u
-                JOIN contratos c ON u.numero_contrato = c.numero_contrato
-                JOIN empresas e ON c.cod_empresa = e.cod_empresa
+                JOIN contratos c ON c.id = u.id_contrato
+                JOIN empresas e ON e.id = c.id_empresa
                 WHERE u.cod_unidade = ?
             """, (cod_unidade,))
             
@@ -116,17 +154,21 @@ def obter_info_unidade(cod_servico: str) -> Optional[Tuple[str, str, str]]:
         return None
 
 
-def criar_servico(cod_servico: str, cod_unidade: str, tipo_servico: str, data_criacao: str, data_execucao: str, status: str, observacoes: str) -> bool:
+def preparar_pasta_servico(cod_servico: str, cod_unidade: str, tipo_servico: str) -> Optional[str]:
+    """Cria (ou obtém) no Drive a pasta do serviço dentro da pasta da unidade e devolve o ID.
+
+    Só faz chamadas ao Drive e escritas curtas: deve ser chamada antes de abrir a
+    unidade de trabalho do cadastro, para a conexão de escrita não ficar presa à rede.
+    """
     try:
-        logger.info(f"Iniciando criação do serviço {cod_servico}")
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT u.nome_unidade, u.pasta_unidade, c.numero_contrato, e.nome \n                            FROM unidades u \n                            JOIN contratos c ON u.numero_contrato = c.numero_contrato \n                            JOIN empresas e ON c.cod_empresa = e.cod_empresa \n                            WHERE u.cod_unidade = ?", (cod_unidade,))
+            cursor.execute("SELECT u.nome_unidade, u.pasta_unidade, c.numero_contrato, e.nome \n                            FROM unidades u \n                            JOIN contratos c ON c.id = u.id_contrato \n                            JOIN empresas e ON e.id = c.id_empresa \n                            WHERE u.cod_unidade = ?", (cod_unidade,))
             info_unidade = cursor.fetchone()
 
         if not info_unidade:
             logger.error(f"❌ Unidade não encontrada: {cod_unidade}")
-            return False
+            return None
         
         nome_unidade, pasta_unidade_id, numero_contrato, nome_empresa = info_unidade
         nome_pasta_servico = f"{cod_servico}_{tipo_servico.replace(' ', '_')}"
@@ -136,11 +178,11 @@ def criar_servico(cod_servico: str, cod_unidade: str, tipo_servico: str, data_cr
             pasta_contrato_id = obter_pasta_contrato(numero_contrato, nome_empresa)
             if not pasta_contrato_id:
                 logger.error(f"Pasta do contrato {numero_contrato} para empresa {nome_empresa} não encontrada.")
-                return False
+                return None
             pasta_unidade_id = gdrive.ensure_folder(f"{nome_unidade}_{cod_unidade}", pasta_contrato_id)
             if not pasta_unidade_id:
                 logger.error(f"Não foi possível criar a pasta para a unidade {nome_unidade} no Drive.")
-                return False
+                return None
             with db.obter_conexao() as conn_update: # Nova conexão para este update específico
                 cursor_update = conn_update.cursor()
                 cursor_update.execute("UPDATE unidades SET pasta_unidade = ? WHERE cod_unidade = ?", (pasta_unidade_id, cod_unidade))
@@ -150,26 +192,49 @@ def criar_servico(cod_servico: str, cod_unidade: str, tipo_servico: str, data_cr
         pasta_servico_id = gdrive.ensure_folder(nome_pasta_servico, pasta_unidade_id)
         if not pasta_servico_id:
             logger.error(f"Erro ao criar pasta do serviço {nome_pasta_servico} no Drive.")
-            return False
+            return None
         logger.info(f"Pasta do serviço {nome_pasta_servico} criada com ID: {pasta_servico_id}")
+        return pasta_servico_id
+    except Exception as e:
+        logger.error(f"Erro ao preparar pasta do serviço {cod_servico}: {e}")
+        return None
 
+
+def criar_servico(cod_servico: str, cod_unidade: str, tipo_servico: str, data_criacao: str, data_execucao: str, status: str, observacoes: str, pasta_servico_id: Optional[str] = None) -> bool:
+    """Grava o serviço; `pasta_servico_id` vem de preparar_pasta_servico() (criada aqui se omitido).
+
+    Levanta CodigoServicoEmUso se `cod_servico` já estiver gravado: o chamador
+    reserva outro código (gerar_codigo_servico) e tenta de novo.
+    """
+    try:
+        logger.info(f"Iniciando criação do serviço {cod_servico}")
+        if not pasta_servico_id:
+            pasta_servico_id = preparar_pasta_servico(cod_servico, cod_unidade, tipo_servico)
+            if not pasta_servico_id:
+                return False
+
+        # Observações longas ficam fora da linha (db_textos); a linha guarda o resumo
+        observacoes, observacoes_ref = db_textos.separar(observacoes)
         with db.obter_conexao() as conn: # Conexão principal para inserir o serviço
             cursor = conn.cursor()
-            cursor.execute("SELECT cod_servico FROM servicos WHERE cod_servico = ?", (cod_servico,))
-            if cursor.fetchone():
-                logger.warning(f"Tentativa de criar serviço com código duplicado: {cod_servico}")
-                return False
-            
-            cursor.execute("""
-                INSERT INTO servicos (
-                    cod_servico, cod_unidade, tipo_servico, data_criacao, 
-                    data_execucao, status, observacoes, pasta_servico
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                cod_servico, cod_unidade, tipo_servico, data_criacao,
-                data_execucao, status, observacoes, pasta_servico_id
-            ))
+            try:
+                cursor.execute("""
+                    INSERT INTO servicos (
+                        cod_servico, cod_unidade, tipo_servico, data_criacao, 
+                        data_execucao, status, observacoes, observacoes_ref, pasta_servico
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    cod_servico, cod_unidade, tipo_servico, data_criacao,
+                    data_execucao, status, observacoes, observacoes_ref, pasta_servico_id
+                ))
+            except sqlite3.IntegrityError:
+                cursor.execute("SELECT 1 FROM servicos WHERE cod_servico = ?", (cod_servico,))
+                if cursor.fetchone():
+                    logger.warning(f"Código de serviço já gravado por outra réplica: {cod_servico}")
+                    raise CodigoServicoEmUso(f"O código {cod_servico} já está em uso.")
+                raise
             db.marca_sujo()
+            conn.commit()  # O changeset publicado lê apenas alterações já confirmadas
             logger.info(f"Serviço {cod_servico} inserido no banco de dados.")
 
             # Salva o estado do banco de dados no Drive
@@ -182,55 +247,130 @@ def criar_servico(cod_servico: str, cod_unidade: str, tipo_servico: str, data_cr
                 logger.error(f"Erro ao salvar banco no Drive após criar serviço {cod_servico}: {e_save}")
                 return True # Retorna True pois a operação no banco local foi bem-sucedida
 
+    except CodigoServicoEmUso:
+        raise
     except Exception as e_main:
         logger.error(f"Erro geral ao criar serviço {cod_servico}: {e_main}")
         return False
 
 
+def descartar_pasta_servico(pasta_servico_id: str) -> None:
+    """Remove do Drive a pasta criada para um código que acabou não sendo usado.
+
+    A pasta fica se algum serviço gravado a usa (ensure_folder devolveu a pasta
+    do serviço que já tinha o código).
+    """
+    try:
+        with db.obter_conexao_leitura() as conn:
+            if conn.execute("SELECT 1 FROM servicos WHERE pasta_servico = ?", (pasta_servico_id,)).fetchone():
+                return
+        gdrive.delete_file(pasta_servico_id)
+    except Exception as e:
+        logger.warning(f"Pasta {pasta_servico_id} não removida do Drive: {e}")
+
+
+# Colunas de listar_servicos, na ordem lida pelas telas de serviços
+COLUNAS_LISTAGEM = (
+    "cod_servico", "cod_unidade", "tipo_servico", "data_criacao", "data_execucao", "status", "observacoes",
+)
+
+
 def listar_servicos(
     status: list[str] | None = None,
     data_ini: str | None = None,   # 'YYYY-MM-DD'
     data_fim: str | None = None,
+    incluir_historico: bool = False,
 ) -> list[tuple]:
     """
     Retorna serviços filtrados.
     status : lista ou None (ignora)
     data_ini / data_fim : comparação com data_criacao
+    incluir_historico : inclui os serviços encerrados já arquivados (banco histórico)
+    Cada linha traz as colunas de COLUNAS_LISTAGEM, nessa ordem.
     """
-    sql = "SELECT * FROM servicos WHERE 1=1"
+    colunas = ", ".join(COLUNAS_LISTAGEM)
+    filtro = ""
     params = []
     if status:
-        sql += f" AND status IN ({','.join(['?']*len(status))})"
+        filtro += f" AND status IN ({','.join(['?']*len(status))})"
         params.extend(status)
     if data_ini:
-        sql += " AND data_criacao >= ?"
+        filtro += " AND data_criacao >= ?"
         params.append(data_ini)
     if data_fim:
-        sql += " AND data_criacao <= ?"
+        filtro += " AND data_criacao <= ?"
         params.append(data_fim)
-    sql += " ORDER BY data_criacao DESC"
-    with db.obter_conexao() as conn:
+
+    if not incluir_historico:
+        with db.obter_conexao_leitura() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {colunas} FROM servicos WHERE 1=1{filtro} ORDER BY data_criacao DESC", params)
+            return cursor.fetchall()
+
+    with db.conexao_historico() as (conn, anexado):
+        sql = f"SELECT {colunas} FROM main.servicos WHERE 1=1{filtro}"
+        if anexado:
+            # Serviço presente nos dois bancos (arquivamento interrompido): vale a réplica
+            sql += (
+                f" UNION ALL SELECT {db_historico.selecao(conn, 'servicos', COLUNAS_LISTAGEM)} FROM historico.servicos h"
+                f" WHERE h.cod_servico NOT IN (SELECT cod_servico FROM main.servicos){filtro}"
+            )
+            params = params * 2
         cursor = conn.cursor()
-        cursor.execute(sql, params)
+        cursor.execute(f"{sql} ORDER BY data_criacao DESC", params)
         return cursor.fetchall()
 
 
-def buscar_servico_por_codigo(cod_servico: str) -> Optional[Tuple]:
-    """Busca um serviço pelo código"""
+def buscar_servico_por_codigo(cod_servico: str, incluir_historico: bool = False) -> Optional[Tuple]:
+    """Busca um serviço pelo código (no histórico também, se `incluir_historico`)"""
+    sql = """
+        SELECT s.*, u.nome_unidade, c.numero_contrato, e.nome as nome_empresa
+        FROM {origem} s
+        INNER JOIN unidades u ON {unidade}
+        INNER JOIN contratos c ON c.id = u.id_contrato
+        INNER JOIN empresas e ON e.id = c.id_empresa
+        WHERE s.cod_servico = ?
+    """
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT s.*, u.nome_unidade, c.numero_contrato, e.nome as nome_empresa
-                FROM servicos s
-                INNER JOIN unidades u ON s.cod_unidade = u.cod_unidade
-                INNER JOIN contratos c ON u.numero_contrato = c.numero_contrato
-                INNER JOIN empresas e ON c.cod_empresa = e.cod_empresa
-                WHERE s.cod_servico = ?
-            """, (cod_servico,))
+            cursor.execute(sql.format(origem="main.servicos", unidade="u.id = s.id_unidade"), (cod_servico,))
+            servico = cursor.fetchone()
+        if servico or not incluir_historico:
+            return servico
+        with db.conexao_historico() as (conn, anexado):
+            if not anexado:
+                return None
+            origem = f"(SELECT {db_historico.selecao(conn, 'servicos')} FROM historico.servicos h)"
+            # id_unidade arquivado é o da réplica que arquivou: junta pela chave natural
+            cursor = conn.cursor()
+            cursor.execute(sql.format(origem=origem, unidade="u.cod_unidade = s.cod_unidade"), (cod_servico,))
             return cursor.fetchone()
     except sqlite3.Error as e:
-        print(f"❌ Erro ao buscar serviço: {e}")
+        logger.error(f"Erro ao buscar serviço {cod_servico}: {e}")
+        return None
+
+
+def obter_observacoes_servico(cod_servico: str, incluir_historico: bool = False) -> Optional[str]:
+    """Observações completas do serviço (telas de detalhe/edição).
+
+    As listagens trazem só o resumo das observações longas; o texto inteiro
+    é buscado aqui, do cache local ou do Drive. None se não puder ser obtido.
+    """
+    sql = "SELECT observacoes, observacoes_ref FROM {origem} WHERE cod_servico = ?"
+    try:
+        with db.obter_conexao_leitura() as conn:
+            row = conn.execute(sql.format(origem="main.servicos"), (cod_servico,)).fetchone()
+        if not row and incluir_historico:
+            with db.conexao_historico() as (conn, anexado):
+                if anexado:
+                    origem = f"(SELECT {db_historico.selecao(conn, 'servicos')} FROM historico.servicos h)"
+                    row = conn.execute(sql.format(origem=origem), (cod_servico,)).fetchone()
+        if not row:
+            return None
+        return db.texto_completo(row[0], row[1])
+    except (sqlite3.Error, IOError) as e:
+        logger.error(f"Erro ao obter observações do serviço {cod_servico}: {e}")
         return None
 
 
@@ -238,11 +378,19 @@ def atualizar_servico(cod_servico_original: str, novo_tipo_servico: str, nova_da
     try:
         with db.obter_conexao() as conn:
             cursor = conn.cursor()
+            atual = cursor.execute(
+                "SELECT observacoes, observacoes_ref FROM servicos WHERE cod_servico = ?",
+                (cod_servico_original,),
+            ).fetchone()
+            if atual and db_textos.preservar(novas_observacoes, atual[0], atual[1]):
+                observacoes, observacoes_ref = atual[0], atual[1]
+            else:
+                observacoes, observacoes_ref = db_textos.separar(novas_observacoes)
             cursor.execute("""
                 UPDATE servicos 
-                SET tipo_servico = ?, data_execucao = ?, status = ?, observacoes = ?
+                SET tipo_servico = ?, data_execucao = ?, status = ?, observacoes = ?, observacoes_ref = ?
                 WHERE cod_servico = ?
-            """, (novo_tipo_servico, nova_data_execucao, novo_status, novas_observacoes, cod_servico_original))
+            """, (novo_tipo_servico, nova_data_execucao, novo_status, observacoes, observacoes_ref, cod_servico_original))
             db.marca_sujo()
         
         caminho_banco_local = Path(gettempdir()) / db.DB_NAME
@@ -258,30 +406,21 @@ def atualizar_servico(cod_servico_original: str, novo_tipo_servico: str, nova_da
         logger.error(f"Erro ao atualizar serviço {cod_servico_original}: {e_main}")
         return False
 
-def deletar_servico(cod_servico: str) -> bool:
-    try:
-        with db.obter_conexao() as conn: # Primeira conexão para deletar de servico_funcionarios
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM servico_funcionarios WHERE cod_servico = ?", (cod_servico,))
-            db.marca_sujo() # Marca sujo após o primeiro delete
+def deletar_servico(cod_servico: str) -> Optional[dict]:
+    """Exclui o serviço; vínculos e registros de arquivos saem em cascata.
 
-        with db.obter_conexao() as conn: # Segunda conexão para deletar de servicos
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM servicos WHERE cod_servico = ?", (cod_servico,))
-            db.marca_sujo() # Marca sujo após o segundo delete
-        
-        caminho_banco_local = Path(gettempdir()) / db.DB_NAME
-        try:
-            db.salvar_banco_no_drive(caminho_banco_local)
-            logger.info(f"Serviço {cod_servico} deletado e banco salvo no Drive.")
-            return True
-        except Exception as e_save:
-            logger.error(f"Erro ao salvar banco no Drive após deletar serviço {cod_servico}: {e_save}")
-            return True # Operação local bem-sucedida
+    Devolve {tabela: linhas removidas} ou None em caso de erro.
+    """
+    try:
+        with db.unit_of_work() as conn:
+            removidas = db.excluir_em_cascata("servicos", "cod_servico", cod_servico)
+            db_sequencias.descartar(conn, _sequencia_arquivos(cod_servico))
+        logger.info(f"Serviço {cod_servico} deletado {removidas}; publicação no Drive agendada.")
+        return removidas
 
     except Exception as e_main:
         logger.error(f"Erro ao deletar serviço {cod_servico}: {e_main}")
-        return False
+        return None
 
 # ──────────────── Funções de Arquivos ────────────────
 
@@ -292,7 +431,11 @@ def upload_arquivo_servico(cod_servico: str, arquivo_upload: st.runtime.uploaded
     
     try:
         logger.info(f"Iniciando upload do arquivo: {nome_arquivo_original} para o serviço: {cod_servico}")
-        with db.obter_conexao() as conn:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        extensao = nome_arquivo_original.split('.')[-1].lower() if '.' in nome_arquivo_original else ''
+
+        # O upload ao Drive acontece fora de qualquer conexão para não segurar o banco
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT pasta_servico FROM servicos WHERE cod_servico = ?", (cod_servico,))
             row = cursor.fetchone()
@@ -300,35 +443,25 @@ def upload_arquivo_servico(cod_servico: str, arquivo_upload: st.runtime.uploaded
                 logger.error(f"Pasta do serviço {cod_servico} não encontrada no banco.")
                 return False
             pasta_servico_id = row[0]
-        
+
         pasta_arquivos_nome = "Arquivos"
         pasta_arquivos_id = gdrive.ensure_folder(pasta_arquivos_nome, pasta_servico_id)
         if not pasta_arquivos_id:
             logger.error(f"Erro ao criar/garantir a pasta \"{pasta_arquivos_nome}\" no Drive para o serviço {cod_servico}.")
             return False
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        extensao = nome_arquivo_original.split('.')[-1].lower() if '.' in nome_arquivo_original else ''
-        
-        with db.obter_conexao() as conn_seq:
-            cursor_seq = conn_seq.cursor()
-            cursor_seq.execute("""
-                SELECT nome_arquivo FROM arquivos_servico 
-                WHERE cod_servico = ? AND nome_arquivo LIKE ?
-                ORDER BY nome_arquivo DESC LIMIT 1
-            """, (cod_servico, f"{cod_servico}_{timestamp.split('_')[0]}%"))
-            ultimo_arquivo_seq = cursor_seq.fetchone()
-        
-        novo_numero_seq = 1
-        if ultimo_arquivo_seq and ultimo_arquivo_seq[0]:
-            try:
-                partes_nome = ultimo_arquivo_seq[0].split('_')
-                if len(partes_nome) > 2:
-                    num_str = partes_nome[-1].split('.')[0]
-                    if num_str.isdigit():
-                        novo_numero_seq = int(num_str) + 1
-            except ValueError:
-                pass # Mantém novo_numero_seq = 1 se o parsing falhar
+        def maior_gravado(conn: sqlite3.Connection) -> int:
+            # Anexos do serviço (índice cod_servico, data_upload)
+            maior = 0
+            for (nome,) in conn.execute(
+                "SELECT nome_arquivo FROM arquivos_servico WHERE cod_servico = ?", (cod_servico,)
+            ):
+                num_str = nome.split('_')[-1].split('.')[0] if nome and nome.count('_') > 1 else ""
+                if num_str.isdigit():
+                    maior = max(maior, int(num_str))
+            return maior + 1
+
+        novo_numero_seq = _proximo_da_sequencia(_sequencia_arquivos(cod_servico), maior_gravado)
 
         novo_nome_arquivo = f"{cod_servico}_{timestamp}_{novo_numero_seq:03d}{f'.{extensao}' if extensao else ''}"
         
@@ -345,7 +478,7 @@ def upload_arquivo_servico(cod_servico: str, arquivo_upload: st.runtime.uploaded
             if temp_path.exists():
                 temp_path.unlink() # Garante que o arquivo temporário seja removido
 
-        with db.obter_conexao() as conn_insert:
+        with db.unit_of_work() as conn_insert:
             cursor_insert = conn_insert.cursor()
             cursor_insert.execute("""
                 INSERT INTO arquivos_servico (
@@ -357,16 +490,8 @@ def upload_arquivo_servico(cod_servico: str, arquivo_upload: st.runtime.uploaded
                 descricao
             ))
             db.marca_sujo()
-            logger.info(f"Registro do arquivo {novo_nome_arquivo} salvo no banco.")
-
-        caminho_banco_local = Path(gettempdir()) / db.DB_NAME
-        try:
-            db.salvar_banco_no_drive(caminho_banco_local)
-            logger.info(f"Upload do arquivo {novo_nome_arquivo} e atualização do banco concluídos.")
-            return True
-        except Exception as e_save:
-            logger.error(f"Erro ao salvar banco no Drive após upload do arquivo: {e_save}")
-            return True # Operação local no banco bem-sucedida
+        logger.info(f"Registro do arquivo {novo_nome_arquivo} salvo no banco; publicação no Drive agendada.")
+        return True
 
     except Exception as e_main:
         logger.error(f"Erro geral no upload do arquivo para o serviço {cod_servico}: {e_main}")
@@ -404,14 +529,6 @@ def deletar_arquivo_servico(arquivo_id: int) -> bool:
             else:
                 logger.info(f"Nenhum registro de arquivo com ID {arquivo_id} encontrado para deletar do banco (pode já ter sido removido).")
 
-        caminho_banco_local = Path(gettempdir()) / db.DB_NAME
-        if getattr(db._thread_local, "dirty", False): # Salva apenas se algo foi realmente modificado
-            try:
-                db.salvar_banco_no_drive(caminho_banco_local)
-                logger.info(f"Banco de dados salvo no Drive após deleção do arquivo {arquivo_id}.")
-            except Exception as e_save:
-                logger.error(f"Erro ao salvar banco no Drive após deletar arquivo {arquivo_id}: {e_save}")
-                return True # Operação local no banco (deleção) pode ter sido bem-sucedida
         return True
             
     except Exception as e_main:
@@ -425,19 +542,10 @@ def atualizar_descricao_arquivo(arquivo_id: int, nova_descricao: str) -> bool:
             cursor.execute("UPDATE arquivos_servico SET descricao = ? WHERE id = ?", (nova_descricao, arquivo_id))
             if cursor.rowcount > 0:
                  db.marca_sujo()
-        
-        if getattr(db._thread_local, "dirty", False):
-            caminho_banco_local = Path(gettempdir()) / db.DB_NAME
-            try:
-                db.salvar_banco_no_drive(caminho_banco_local)
-                logger.info(f"Descrição do arquivo {arquivo_id} atualizada e banco salvo.")
-                return True
-            except Exception as e_save:
-                logger.error(f"Erro ao salvar banco no Drive após atualizar descrição: {e_save}")
-                return True # Operação local bem-sucedida
-        else:
-            logger.info(f"Descrição do arquivo {arquivo_id} não precisou de atualização ou não foi encontrada.")
-            return True # Considera sucesso se não houve erro e nenhuma alteração era necessária/possível
+                 logger.info(f"Descrição do arquivo {arquivo_id} atualizada.")
+            else:
+                logger.info(f"Descrição do arquivo {arquivo_id} não precisou de atualização ou não foi encontrada.")
+        return True # Considera sucesso se não houve erro e nenhuma alteração era necessária/possível
             
     except Exception as e_main:
         logger.error(f"Erro ao atualizar descrição do arquivo {arquivo_id}: {e_main}")
@@ -481,33 +589,56 @@ def transferir_arquivo_servico(arquivo_id: int, nova_pasta_id: str) -> bool:
         logger.error(f"❌ Erro ao transferir arquivo (ID: {arquivo_id}): {e}")
         return False
 
-def listar_arquivos_servico(cod_servico: str) -> List[Tuple]:
+def listar_arquivos_servico(cod_servico: str, incluir_historico: bool = False) -> List[Tuple]:
+    sql = """
+        SELECT id, nome_arquivo, tipo_arquivo, data_upload, descricao, drive_file_id
+        FROM {esquema}.arquivos_servico
+        WHERE cod_servico = ?
+        ORDER BY data_upload DESC
+    """
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, nome_arquivo, tipo_arquivo, data_upload, descricao, drive_file_id
-                FROM arquivos_servico
-                WHERE cod_servico = ?
-                ORDER BY data_upload DESC
-            """, (cod_servico,))
+            cursor.execute(sql.format(esquema="main"), (cod_servico,))
+            arquivos = cursor.fetchall()
+        if arquivos or not incluir_historico:
+            return arquivos
+        # Sem anexos na réplica: o serviço pode ter sido arquivado
+        with db.conexao_historico() as (conn, anexado):
+            if not anexado:
+                return []
+            cursor = conn.cursor()
+            cursor.execute(sql.format(esquema="historico"), (cod_servico,))
             return cursor.fetchall()
     except sqlite3.Error as e:
         logger.error(f"Erro ao listar arquivos do serviço {cod_servico}: {e}")
         return []
 
 
-def listar_funcionarios_servico(cod_servico: str) -> List[Tuple]:
+def listar_funcionarios_servico(cod_servico: str, incluir_historico: bool = False) -> List[Tuple]:
+    sql = """
+        SELECT f.cod_funcionario, f.nome, f.funcao
+        FROM {esquema}.servico_funcionarios sf
+        JOIN main.funcionarios f ON {funcionario}
+        WHERE sf.cod_servico = ?
+    """
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
-            # Exemplo de JOIN para obter nomes dos funcionários
-            cursor.execute("""
-                SELECT f.cod_funcionario, f.nome, f.funcao
-                FROM servico_funcionarios sf
-                JOIN funcionarios f ON sf.cod_funcionario = f.cod_funcionario
-                WHERE sf.cod_servico = ?
-            """, (cod_servico,))
+            cursor.execute(sql.format(esquema="main", funcionario="f.id = sf.id_funcionario"), (cod_servico,))
+            funcionarios = cursor.fetchall()
+        if funcionarios or not incluir_historico:
+            return funcionarios
+        # Sem vínculos na réplica: o serviço pode ter sido arquivado
+        with db.conexao_historico() as (conn, anexado):
+            if not anexado:
+                return []
+            cursor = conn.cursor()
+            # Vínculos arquivados podem trazer ids de outra réplica: junta pela chave natural
+            cursor.execute(
+                sql.format(esquema="historico", funcionario="f.cod_funcionario = sf.cod_funcionario"),
+                (cod_servico,),
+            )
             return cursor.fetchall()
     except Exception as e:
         logger.error(f"Erro ao listar funcionários do serviço {cod_servico}: {e}")
@@ -516,7 +647,7 @@ def listar_funcionarios_servico(cod_servico: str) -> List[Tuple]:
 def download_arquivo_servico(arquivo_id: int) -> Optional[Tuple[bytes, str, str]]:
     temp_file_path = None
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT nome_arquivo, drive_file_id, tipo_arquivo FROM arquivos_servico WHERE id = ?", (arquivo_id,))
             row = cursor.fetchone()
@@ -553,7 +684,7 @@ def download_arquivo_servico(arquivo_id: int) -> Optional[Tuple[bytes, str, str]
 def obter_info_arquivo(arquivo_id: int) -> Optional[Tuple]:
     """Obtém informações de um arquivo do serviço"""
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, nome_arquivo, tipo_arquivo, data_upload, descricao, drive_file_id
@@ -562,5 +693,5 @@ def obter_info_arquivo(arquivo_id: int) -> Optional[Tuple]:
             """, (arquivo_id,))
             return cursor.fetchone()
     except sqlite3.Error as e:
-        print(f"❌ Erro ao buscar informações do arquivo: {e}")
+        logger.error(f"Erro ao buscar informações do arquivo {arquivo_id}: {e}")
         return None
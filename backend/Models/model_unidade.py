@@ -4,7 +4,7 @@
 #  • Sem sys.path hacks; imports diretos
 #  • listar_unidades(numero_contrato=None) com filtro opcional
 #  • Nenhum upload Drive direto; usa db.marca_sujo()
-#  • remove _thread_local; flag sujo é global
+#  • Publicação no Drive agendada pelo commit de cada escrita (db_escritas)
 #  • Funções auxiliares enxutas, com cache de file_id no session_state
 # -----------------------------------------------------------------------------
 
@@ -18,7 +18,7 @@ from typing import List, Optional, Tuple
 import streamlit as st
 from dotenv import load_dotenv
 
-from Database import db_gestaodecontratos as db
+from Database import db_cache, db_gestaodecontratos as db
 from Services import Service_googledrive as gdrive
 
 load_dotenv()
@@ -43,7 +43,7 @@ def obter_pasta_contrato(numero_contrato: str, nome_empresa: str) -> Optional[st
     """Retorna folder_id do contrato tentando vários formatos de nome."""
     # busca empresa contratada
     empresa_contratada = None
-    with db.obter_conexao() as conn:
+    with db.obter_conexao_leitura() as conn:
         row = conn.execute(
             "SELECT empresa_contratada FROM contratos WHERE numero_contrato=?",
             (numero_contrato,),
@@ -80,11 +80,11 @@ def obter_pasta_contrato(numero_contrato: str, nome_empresa: str) -> Optional[st
 
 
 def obter_nome_empresa_por_contrato(numero_contrato: str) -> Optional[str]:
-    with db.obter_conexao() as conn:
+    with db.obter_conexao_leitura() as conn:
         row = conn.execute(
             """
             SELECT e.nome FROM contratos c
-            JOIN empresas e ON c.cod_empresa = e.cod_empresa
+            JOIN empresas e ON e.id = c.id_empresa
             WHERE c.numero_contrato = ?
             """,
             (numero_contrato,),
@@ -107,7 +107,7 @@ def criar_unidade(
         return False
 
     # pasta do contrato deve existir
-    with db.obter_conexao() as conn:
+    with db.obter_conexao_leitura() as conn:
         row = conn.execute(
             "SELECT pasta_contrato FROM contratos WHERE numero_contrato=?",
             (numero_contrato,),
@@ -155,6 +155,7 @@ def criar_unidade(
         return False
 
 
+@db_cache.em_cache("unidades")
 def listar_unidades(numero_contrato: str | None = None) -> List[Tuple]:
     sql = (
         "SELECT cod_unidade, numero_contrato, nome_unidade, estado, cidade, localizacao "
@@ -166,12 +167,12 @@ def listar_unidades(numero_contrato: str | None = None) -> List[Tuple]:
         params.append(numero_contrato)
     sql += " ORDER BY nome_unidade"
 
-    with db.obter_conexao() as conn:
+    with db.obter_conexao_leitura() as conn:
         return conn.execute(sql, params).fetchall()
 
 
 def buscar_unidade_por_codigo(cod_unidade: str) -> Optional[Tuple]:
-    with db.obter_conexao() as conn:
+    with db.obter_conexao_leitura() as conn:
         return conn.execute(
             "SELECT * FROM unidades WHERE cod_unidade=?", (cod_unidade,)
         ).fetchone()
@@ -199,9 +200,15 @@ def atualizar_unidade(
     return True
 
 
-def deletar_unidade(cod_unidade: str) -> bool:
-    with db.obter_conexao() as conn:
-        cur = conn.execute("DELETE FROM unidades WHERE cod_unidade=?", (cod_unidade,))
-        if cur.rowcount:
-            db.marca_sujo()
-    return True
+def deletar_unidade(cod_unidade: str) -> Optional[dict]:
+    """Exclui a unidade; serviços e seus vínculos saem em cascata.
+
+    Devolve {tabela: linhas removidas} ou None em caso de erro.
+    """
+    try:
+        removidas = db.excluir_em_cascata("unidades", "cod_unidade", cod_unidade)
+    except Exception as e:
+        logger.error("Erro ao deletar unidade %s: %s", cod_unidade, e)
+        return None
+    logger.info("Unidade %s deletada: %s", cod_unidade, removidas)
+    return removidas
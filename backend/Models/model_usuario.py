@@ -21,7 +21,7 @@ from Database.db_gestaodecontratos import (
     obter_conexao,
     salvar_banco_no_drive,
 )
-from Database import db_gestaodecontratos as db
+from Database import db_cache, db_gestaodecontratos as db
 
 logger = logging.getLogger(__name__)
 
@@ -73,6 +73,13 @@ def criar_usuario(
         return False
 
 
+@db_cache.em_cache("usuarios")
+def _consultar_usuarios(sql: str, params: tuple) -> List[Tuple]:
+    with db.obter_conexao_leitura() as conn:
+        cur = conn.cursor()
+        return cur.execute(sql, params).fetchall()
+
+
 def listar_usuarios(
     nome_like: str | None = None,
     tipos: Sequence[str] | None = None,
@@ -100,9 +107,7 @@ def listar_usuarios(
             params.append(offset)
 
     try:
-        with db.obter_conexao() as conn:
-            cur = conn.cursor()
-            return cur.execute(sql, params).fetchall()
+        return _consultar_usuarios(sql, tuple(params))
     except Exception as e:
         logger.error("Erro ao listar usuários: %s", e)
         return []
@@ -110,7 +115,7 @@ def listar_usuarios(
 
 def buscar_usuario_por_id(usuario_id: int) -> Optional[Tuple]:
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cur = conn.cursor()
             return cur.execute("SELECT * FROM usuarios WHERE id = ?", (usuario_id,)).fetchone()
     except Exception as e:
@@ -165,7 +170,7 @@ def deletar_usuario(usuario_id: int) -> bool:
 
 def autenticar_usuario(usuario: str, senha: str) -> Optional[Tuple]:
     try:
-        with db.obter_conexao() as conn:
+        with db.obter_conexao_leitura() as conn:
             cur = conn.cursor()
             return cur.execute(
                 "SELECT id, nome, tipo FROM usuarios WHERE usuario=? AND senha=?",
@@ -53,6 +53,11 @@ RETRY_DELAY  = 2  # segundos
 # Arquivo local de credenciais (fallback) --------------------------------------
 CREDENTIALS_FILE = Path(__file__).parent / "gestao-de-contratos-459115-56094189aaf9.json"
 
+# Campos que identificam a versão de um arquivo (conteúdo e revisão)
+VERSION_FIELDS = "id, md5Checksum, headRevisionId, modifiedTime"
+# Mesmos campos na API v2, que também devolve o etag usado como precondição
+VERSION_FIELDS_V2 = "id, etag, md5Checksum, headRevisionId, modifiedDate"
+
 # Cache de serviço por thread
 _thread_local = threading.local()
 
@@ -128,10 +133,10 @@ def _load_credentials() -> Credentials:
     )
 
 
-def _build_service():
+def _build_service(version: str = "v3"):
     """Cria (singleton) o cliente Drive."""
     creds = _load_credentials()
-    service = build("drive", "v3", credentials=creds, cache_discovery=False)
+    service = build("drive", version, credentials=creds, cache_discovery=False)
     service._http.timeout = 120  # segundos (era ≈60)
     return service
 
@@ -143,6 +148,13 @@ def get_service():
     return _thread_local.service
 
 
+def _get_service_v2():
+    """Cliente Drive v2: só a v2 expõe etag e aceita a precondição If-Match."""
+    if not hasattr(_thread_local, "service_v2"):
+        _thread_local.service_v2 = _build_service("v2")
+    return _thread_local.service_v2
+
+
 def _folder_query(name: str, parent_id: Optional[str]) -> str:
     """Monta query para busca de pastas por nome (e opcionalmente pai)."""
     q = f"mimeType='application/vnd.google-apps.folder' and name='{name}'"
@@ -198,8 +210,11 @@ def ensure_folder(name: str, parent_id: Optional[str] = None) -> str:
 
 
 @_retry_on_error
-def upload_file(local_path: str, parent_id: str) -> str:
-    """Faz upload de um arquivo para a pasta especificada e devolve o fileId."""
+def upload_file(local_path: str, parent_id: str, *, return_metadata: bool = False):
+    """Faz upload de um arquivo para a pasta especificada e devolve o fileId.
+
+    Com `return_metadata=True` devolve o dicionário com VERSION_FIELDS do arquivo criado.
+    """
     try:
         service = get_service()
         local_path = pathlib.Path(local_path)
@@ -210,10 +225,10 @@ def upload_file(local_path: str, parent_id: str) -> str:
         for i in range(5):
             try:
                 file = service.files().create(
-                    body=metadata, media_body=media, fields="id, modifiedTime"
+                    body=metadata, media_body=media, fields=VERSION_FIELDS
                 ).execute()
                 logger.info(f"Arquivo enviado com sucesso: {local_path.name}")
-                return file["id"]
+                return file if return_metadata else file["id"]
             except Exception as e:
                 wait = min(2 ** i, 8) + random.random()
                 logger.warning(f"Tentativa {i+1} falhou: {e} – aguardando {wait:.1f}s")
@@ -238,7 +253,7 @@ def list_files(parent_id: str, mime_filter: Optional[str] = None) -> List[dict]:
             try:
                 resp = service.files().list(
                     q=q,
-                    fields="files(id, modifiedTime)",
+                    fields="files(id, name, modifiedTime)",
                     pageSize=1000
                 ).execute()
                 files = resp.get("files", [])
@@ -260,6 +275,49 @@ def list_files_in_folder(folder_id: str) -> List[dict]:
     return list_files(folder_id)
 
 
+@_retry_on_error
+def list_files_by_prefix(prefix: str, parent_id: str) -> List[dict]:
+    """Lista arquivos de uma pasta cujo nome começa com `prefix`, ordenados por nome."""
+    try:
+        service = get_service()
+        q = f"name contains '{prefix}' and '{parent_id}' in parents and trashed = false"
+        files: List[dict] = []
+        page_token = None
+        while True:
+            resp = service.files().list(
+                q=q,
+                fields="nextPageToken, files(id, name, modifiedTime)",
+                orderBy="name",
+                pageSize=1000,
+                pageToken=page_token,
+            ).execute()
+            # `contains` casa prefixos de palavras; filtra o prefixo exato
+            files.extend(f for f in resp.get("files", []) if f["name"].startswith(prefix))
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return files
+    except Exception as e:
+        logger.error(f"Erro ao listar arquivos por prefixo: {e}")
+        raise
+
+
+def delete_file(file_id: str) -> bool:
+    """Remove um arquivo do Drive. Retorna False se não foi possível removê-lo."""
+    try:
+        get_service().files().delete(fileId=file_id).execute()
+        logger.info(f"Arquivo removido: {file_id}")
+        return True
+    except HttpError as e:
+        if e.resp.status == 404:
+            logger.info(f"Arquivo já não existe no Drive: {file_id}")
+        else:
+            logger.error(f"Erro ao remover arquivo {file_id}: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Erro ao remover arquivo {file_id}: {e}")
+        return False
+
+
 def download_file(file_id: str, dest_path: str) -> bool:
     """Baixa um arquivo do Drive para `dest_path`."""
     try:
@@ -311,8 +369,8 @@ def download_file(file_id: str, dest_path: str) -> bool:
 
 
 @_retry_on_error
-def update_file(file_id: str, new_local_path: str):
-    """Substitui o conteúdo de um arquivo mantendo o mesmo ID."""
+def update_file(file_id: str, new_local_path: str) -> dict:
+    """Substitui o conteúdo de um arquivo mantendo o mesmo ID e devolve a nova versão (VERSION_FIELDS)."""
     try:
         service = get_service()
         new_local_path = pathlib.Path(new_local_path)
@@ -321,11 +379,11 @@ def update_file(file_id: str, new_local_path: str):
         media = MediaFileUpload(new_local_path, mimetype=mime_type, resumable=True)
         for i in range(5):
             try:
-                service.files().update(
-                    fileId=file_id, media_body=media, fields="id, modifiedTime"
+                file = service.files().update(
+                    fileId=file_id, media_body=media, fields=VERSION_FIELDS
                 ).execute()
                 logger.info(f"Arquivo atualizado com sucesso: {file_id}")
-                break
+                return file
             except Exception as e:
                 wait = min(2 ** i, 8) + random.random()
                 logger.warning(f"Tentativa {i+1} falhou: {e} – aguardando {wait:.1f}s")
@@ -337,6 +395,57 @@ def update_file(file_id: str, new_local_path: str):
         raise
 
 
+# ─────────────────── Publicação condicional (compare-and-swap) ─────────────────
+class RevisionConflictError(Exception):
+    """O arquivo no Drive mudou desde a versão esperada pelo upload condicional."""
+
+    def __init__(self, file_id: str, expected_etag: str):
+        super().__init__(f"Arquivo {file_id} mudou no Drive (etag esperado {expected_etag}).")
+        self.file_id = file_id
+        self.expected_etag = expected_etag
+
+
+@_retry_on_error
+def get_file_version(file_id: str) -> dict:
+    """Versão atual de um arquivo: id, etag, md5Checksum e headRevisionId."""
+    return _get_service_v2().files().get(fileId=file_id, fields=VERSION_FIELDS_V2).execute()
+
+
+def update_file_if_match(file_id: str, new_local_path: str, expected_etag: str) -> dict:
+    """Substitui o conteúdo somente se o arquivo ainda estiver na versão `expected_etag`.
+
+    O Drive avalia a precondição (If-Match) e a troca do conteúdo na mesma
+    requisição, então duas sessões nunca sobrescrevem uma à outra. Devolve a
+    nova versão (VERSION_FIELDS_V2) já na resposta do upload e levanta
+    RevisionConflictError se o arquivo mudou (HTTP 412).
+    """
+    new_local_path = pathlib.Path(new_local_path)
+    mime_type, _ = mimetypes.guess_type(new_local_path.name)
+    logger.info(f"Atualizando arquivo {file_id} com precondição de versão")
+    for i in range(MAX_RETRIES):
+        media = MediaFileUpload(new_local_path, mimetype=mime_type, resumable=True)
+        request = _get_service_v2().files().update(
+            fileId=file_id, media_body=media, fields=VERSION_FIELDS_V2
+        )
+        request.headers["If-Match"] = expected_etag
+        try:
+            file = request.execute()
+            logger.info(f"Arquivo atualizado com sucesso: {file_id}")
+            return file
+        except HttpError as e:
+            if e.resp.status == 412:
+                raise RevisionConflictError(file_id, expected_etag) from e
+            transitorio = e.resp.status == 429 or e.resp.status >= 500
+            if i == MAX_RETRIES - 1 or not transitorio:
+                raise
+            logger.warning(f"Tentativa {i+1} falhou: {e}")
+        except (ConnectionError, TimeoutError, ssl.SSLError) as e:
+            if i == MAX_RETRIES - 1:
+                raise
+            logger.warning(f"Tentativa {i+1} falhou: {e}")
+        time.sleep(RETRY_DELAY)
+
+
 @_retry_on_error
 def get_file_id_by_name(name: str, parent_id: Optional[str] = None) -> Optional[str]:
     """Busca um arquivo (ou pasta) pelo nome dentro de um diretório pai opcional."""
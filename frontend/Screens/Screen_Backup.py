@@ -15,7 +15,7 @@ import logging
 # Importa models
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 from Models import model_empresa, model_contrato, model_unidade, model_servico, model_usuario
-from Database import db_gestaodecontratos as db
+from Database import db_historico, db_gestaodecontratos as db
 from Services import Service_googledrive as gdrive
 
 logger = logging.getLogger(__name__)
@@ -38,7 +38,7 @@ def obter_banco_temp():
         # Procura o arquivo do banco de dados
         banco_file = None
         for arquivo in arquivos:
-            if arquivo['name'].endswith('.db'):
+            if arquivo['name'] == db.DB_NAME:
                 banco_file = arquivo
                 break
 
@@ -53,7 +53,8 @@ def obter_banco_temp():
         if gdrive.download_file(banco_file['id'], str(temp_file)):
             # Verifica se o arquivo foi baixado corretamente
             if temp_file.exists() and temp_file.stat().st_size > 0:
-                return temp_file
+                # O arquivo no Drive é o manifesto dos blocos do snapshot
+                return db.descomprimir_snapshot(temp_file, banco_id)
             else:
                 st.error("❌ Erro: Arquivo baixado está vazio ou não existe")
                 return None
@@ -188,6 +189,84 @@ def criar_backup_banco():
                 pass
         return None
 
+def _formatar_idade(desde):
+    """Tempo decorrido desde o timestamp `desde`, em texto curto"""
+    if not desde:
+        return "-"
+    segundos = int(max(0, datetime.datetime.now().timestamp() - desde))
+    if segundos < 60:
+        return f"{segundos}s"
+    if segundos < 3600:
+        return f"{segundos // 60}min"
+    return f"{segundos // 3600}h {segundos % 3600 // 60}min"
+
+def exibir_fila_sincronizacao():
+    """Exibe a fila de publicações pendentes no Google Drive"""
+    st.markdown("### ☁️ Fila de Sincronização")
+    st.markdown("Alterações salvas localmente que ainda aguardam envio ao Google Drive.")
+
+    status = db.status_sincronizacao()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Escritas pendentes", status["escritas_pendentes"])
+    col2.metric("Pendente há", _formatar_idade(status["pendente_desde"]))
+    col3.metric("Tentativas", status["tentativas"])
+
+    if status["ultimo_erro"]:
+        st.warning(f"Último erro: {status['ultimo_erro']}")
+    if status["proxima_tentativa"]:
+        proxima = datetime.datetime.fromtimestamp(status["proxima_tentativa"]).strftime("%H:%M:%S")
+        st.caption(f"Próxima tentativa às {proxima}")
+
+    fila = db.fila_sincronizacao()
+    if fila:
+        st.dataframe(
+            [
+                {
+                    "Pasta": item["folder_id"],
+                    "Escritas": item["escritas"],
+                    "Pendente há": _formatar_idade(item["criado_em"]),
+                    "Tentativas": item["tentativas"],
+                    "Último erro": item["ultimo_erro"] or "",
+                }
+                for item in fila
+            ],
+            use_container_width=True,
+        )
+    else:
+        st.success("✅ Nenhuma alteração pendente.")
+
+    if st.button("🔄 Sincronizar Agora", use_container_width=True, disabled=not fila):
+        with st.spinner("Enviando alterações ao Google Drive..."):
+            if db.flush(timeout=60.0):
+                st.success("✅ Alterações enviadas ao Google Drive.")
+            else:
+                st.error("❌ Não foi possível enviar todas as alterações. Elas continuam na fila.")
+
+def exibir_arquivamento():
+    """Exibe a ação de mover serviços encerrados antigos para o banco histórico"""
+    st.markdown("### 🗄️ Arquivar Serviços Encerrados")
+    st.markdown(
+        "Move serviços encerrados antigos (com funcionários e anexos) para o banco histórico, "
+        "mantendo o banco principal pequeno. Eles continuam disponíveis nas consultas que incluem o histórico."
+    )
+    idade_dias = st.number_input(
+        "Encerrados há mais de (dias)",
+        min_value=0,
+        value=db_historico.DB_HISTORICO_IDADE_DIAS,
+        step=30,
+    )
+    if st.button("🗄️ Arquivar Agora", use_container_width=True):
+        with st.spinner("Arquivando serviços encerrados..."):
+            try:
+                removidas = db.arquivar_servicos_encerrados(int(idade_dias))
+            except Exception as e:
+                st.error(f"❌ Erro ao arquivar serviços: {e}")
+                return
+        if removidas.get("servicos"):
+            st.success(f"✅ {removidas['servicos']} serviço(s) movido(s) para o histórico.")
+        else:
+            st.info("Nenhum serviço encerrado para arquivar.")
+
 def exibir_tela_backup():
     """Exibe a tela de backup de dados"""
     if not verificar_permissao_admin():
@@ -208,6 +287,12 @@ def exibir_tela_backup():
     # Data atual para nome dos arquivos
     data_atual = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
+    # Fila de sincronização com o Drive
+    exibir_fila_sincronizacao()
+
+    # Arquivamento dos serviços encerrados
+    exibir_arquivamento()
+
     # Backup do banco de dados
     st.markdown("### 📦 Backup do Banco de Dados")
     st.markdown("Faça o download de uma cópia completa do banco de dados do Google Drive.")
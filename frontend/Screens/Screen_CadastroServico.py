@@ -10,6 +10,7 @@ from frontend.Utils.auth import verificar_permissao_admin
 # Importa models e serviço do Google Drive
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 from Models import model_servico, model_unidade, model_funcionario, model_servico_funcionarios
+from Database import db_gestaodecontratos as db
 
 def exibir_tela_cadastro_servico():
     """Exibe a tela de cadastro de serviços"""
@@ -41,9 +42,8 @@ def exibir_tela_cadastro_servico():
         unidade_selecionada = st.selectbox("Unidade Vinculada", unidade_options)
         unidade_obj = unidades[unidade_options.index(unidade_selecionada)]
 
-        # Gera o código do serviço automaticamente
-        cod_servico = model_servico.gerar_codigo_servico()
-        st.info(f"📝 Código do Serviço: {cod_servico}")
+        # O código é reservado só no envio: o formulário é reexecutado a cada interação
+        st.info("📝 O código do serviço (OS_AAAAMMDD_NNN) será gerado ao cadastrar.")
 
         tipo_servico = st.selectbox("Tipo de Serviço", [
             "Pitometria", "Instalação de Macromedidor", "Escavação Manual",
@@ -65,29 +65,47 @@ def exibir_tela_cadastro_servico():
         enviado = st.form_submit_button("Cadastrar Serviço")
 
         if enviado:
-            # Primeiro cria o serviço
-            sucesso = model_servico.criar_servico(
-                cod_servico=cod_servico,
-                cod_unidade=unidade_obj[0],
-                tipo_servico=tipo_servico,
-                data_criacao=str(data_criacao),
-                data_execucao=str(data_execucao) if data_execucao else None,
-                status=status,
-                observacoes=observacoes
-            )
-
-            if sucesso:
-                # Se o serviço foi criado com sucesso, associa os funcionários
-                sucesso_funcionarios = True
-                for func in funcionarios_selecionados:
-                    cod_funcionario = funcionarios[funcionario_options.index(func)][4]
-                    if not model_servico_funcionarios.atribuir_funcionario_a_servico(cod_servico, cod_funcionario):
-                        sucesso_funcionarios = False
-                        st.error(f"Erro ao associar funcionário: {func}")
-
-                if sucesso_funcionarios:
-                    st.success("Serviço cadastrado e funcionários associados com sucesso!")
+            for _ in range(model_servico.TENTATIVAS_CODIGO):
+                cod_servico = model_servico.gerar_codigo_servico()
+                if not cod_servico:
+                    st.error("Erro ao gerar o código do serviço. Nenhuma alteração foi gravada.")
+                    break
+
+                # A pasta no Drive é criada antes da transação: a conexão de escrita
+                # não fica presa enquanto o Drive responde
+                pasta_servico_id = model_servico.preparar_pasta_servico(cod_servico, unidade_obj[0], tipo_servico)
+                if not pasta_servico_id:
+                    st.error("Erro ao criar a pasta do serviço no Drive.")
+                    break
+
+                # Serviço e vínculos com funcionários são gravados numa única transação:
+                # se qualquer etapa falhar, nada é gravado nem publicado no Drive
+                try:
+                    with db.unit_of_work():
+                        if not model_servico.criar_servico(
+                            cod_servico=cod_servico,
+                            cod_unidade=unidade_obj[0],
+                            tipo_servico=tipo_servico,
+                            data_criacao=str(data_criacao),
+                            data_execucao=str(data_execucao) if data_execucao else None,
+                            status=status,
+                            observacoes=observacoes,
+                            pasta_servico_id=pasta_servico_id
+                        ):
+                            raise db.TransacaoDesfeita("Erro ao cadastrar serviço.")
+
+                        for func in funcionarios_selecionados:
+                            cod_funcionario = funcionarios[funcionario_options.index(func)][4]
+                            if not model_servico_funcionarios.atribuir_funcionario_a_servico(cod_servico, cod_funcionario):
+                                raise db.TransacaoDesfeita(f"Erro ao associar funcionário: {func}.")
+                except model_servico.CodigoServicoEmUso:
+                    # O código chegou de outra réplica depois da reserva: tenta com o próximo
+                    model_servico.descartar_pasta_servico(pasta_servico_id)
+                    continue
+                except db.TransacaoDesfeita as e:
+                    st.error(f"{e} Nenhuma alteração foi gravada.")
                 else:
-                    st.warning("Serviço cadastrado, mas houve erro ao associar alguns funcionários.")
+                    st.success(f"Serviço {cod_servico} cadastrado e funcionários associados com sucesso!")
+                break
             else:
-                st.error("Erro ao cadastrar serviço.")
+                st.error("Não foi possível reservar um código livre para o serviço. Nenhuma alteração foi gravada.")
@@ -40,9 +40,15 @@ def exibir_tela_listar_contratos():
 
                 with col2:
                     if st.button("🗑 Excluir", key=f"del_{c[0]}"):
-                        model_contrato.deletar_contrato(c[0])
-                        st.success("Contrato excluído com sucesso! A pasta no Drive permanece intacta.")
-                        st.rerun()
+                        removidas = model_contrato.deletar_contrato(c[0])
+                        if removidas is None:
+                            st.error("Erro ao excluir contrato.")
+                        else:
+                            st.success(
+                                "Contrato excluído com sucesso! A pasta no Drive permanece intacta. "
+                                f"Registros removidos: {removidas}"
+                            )
+                            st.rerun()
 
     # Formulário de edição
     if st.session_state.get("editando_contrato"):
@@ -53,7 +59,12 @@ def exibir_tela_listar_contratos():
 
         with st.form("form_edita_contrato"):
             titulo = st.text_input("Título", value=c[3])
-            especificacoes = st.text_area("Especificações", value=c[4])
+            # A listagem traz só o resumo das especificações longas
+            especificacoes_completas = model_contrato.obter_especificacoes_contrato(c[0])
+            especificacoes = st.text_area(
+                "Especificações",
+                value=especificacoes_completas if especificacoes_completas is not None else c[4],
+            )
 
             enviado = st.form_submit_button("Salvar alterações")
 
@@ -39,7 +39,7 @@ def exibir_tela_listar_empresas():
 
                 with col2:
                     if st.button("❌ Excluir", key=f"excluir_{emp[0]}"):
-                        if model_empresa.deletar_empresa(emp[0]):
+                        if model_empresa.deletar_empresa(emp[0]) is not None:
                             st.success("✅ Empresa excluída com sucesso!")
                             st.rerun()
                         else:
@@ -70,8 +70,8 @@ def exibir_tela_listar_funcionarios() -> None:
                     st.rerun()
             with col2:
                 if st.button("🗑 Excluir", key=f"del_{cod}"):
-                    ok = model_funcionario.deletar_funcionario(cod)
-                    if ok:
+                    removidas = model_funcionario.deletar_funcionario(cod)
+                    if removidas is not None:
                         st.success("Funcionário excluído com sucesso!")
                     else:
                         st.warning("Não foi possível excluir (pode estar vinculado a serviços).")
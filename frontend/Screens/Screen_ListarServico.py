@@ -45,8 +45,13 @@ def exibir_tela_listar_servicos():
             value=None
         )
 
+    incluir_historico = st.checkbox(
+        "Incluir serviços encerrados arquivados",
+        help="Consulta também o banco histórico (serviços encerrados antigos)."
+    )
+
     # Busca serviços
-    servicos = model_servico.listar_servicos()
+    servicos = model_servico.listar_servicos(incluir_historico=incluir_historico)
 
     # Aplica filtros
     if filtro_status != "Todos":
@@ -166,7 +171,7 @@ def exibir_tela_listar_servicos():
                         key=f"filtro_data_{s[0]}"
                     )
 
-                arquivos = model_servico.listar_arquivos_servico(s[0])
+                arquivos = model_servico.listar_arquivos_servico(s[0], incluir_historico=incluir_historico)
                 
                 # Aplica filtros nos arquivos
                 if filtro_tipo != "Todos":
@@ -213,9 +218,12 @@ def exibir_tela_listar_servicos():
                         st.rerun()
                 with col2:
                     if st.button("🗑 Excluir", key=f"del_{s[0]}"):
-                        model_servico.deletar_servico(s[0])
-                        st.success("Serviço excluído com sucesso!")
-                        st.rerun()
+                        removidas = model_servico.deletar_servico(s[0])
+                        if removidas is None:
+                            st.error("Erro ao excluir serviço.")
+                        else:
+                            st.success(f"Serviço excluído com sucesso! Registros removidos: {removidas}")
+                            st.rerun()
 
     # Edição de serviço
     if st.session_state.get("editando_servico"):
@@ -227,7 +235,9 @@ def exibir_tela_listar_servicos():
             tipo = st.text_input("Tipo de Serviço", value=s[2])
             data_exec = st.date_input("Data de Execução", value=s[4] or None)
             status = st.selectbox("Status", ["Ativo", "Em andamento", "Pausada", "Encerrado"], index=["Ativo", "Em andamento", "Pausada", "Encerrado"].index(s[5]))
-            obs = st.text_area("Observações", value=s[6] or "")
+            # A listagem traz só o resumo das observações longas
+            obs_completas = model_servico.obter_observacoes_servico(s[0])
+            obs = st.text_area("Observações", value=obs_completas if obs_completas is not None else (s[6] or ""))
 
             enviado = st.form_submit_button("Salvar")
 
@@ -85,10 +85,15 @@ def exibir_tela_listar_unidades() -> None:
                     st.rerun()
             with col2:
                 if st.button("🗑 Excluir", key=f"del_{cod}"):
-                    ok = model_unidade.deletar_unidade(cod)
-                    if ok:
-                        st.success("Unidade excluída com sucesso! A pasta no Drive permanece intacta.")
-                    st.rerun()
+                    removidas = model_unidade.deletar_unidade(cod)
+                    if removidas is None:
+                        st.error("Erro ao excluir unidade.")
+                    else:
+                        st.success(
+                            "Unidade excluída com sucesso! A pasta no Drive permanece intacta. "
+                            f"Registros removidos: {removidas}"
+                        )
+                        st.rerun()
 
     # ---- edição -----------------------------------------------------------
     if "editando_unidade" in st.session_state:
@@ -5,8 +5,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import logging
-from backend.Database.db_gestaodecontratos import autenticar_usuario
-from backend.Services.Service_googledrive import get_service
+from Database.db_gestaodecontratos import autenticar_usuario
+from Services.Service_googledrive import get_service
 
 # Configuração de loggings
 logging.basicConfig(level=logging.INFO)
@@ -174,7 +174,9 @@ def exibir_tela_servicos_ope():
             tipo = st.text_input("Tipo de Serviço", value=s[2])
             data_exec = st.date_input("Data de Execução", value=s[4] or None)
             status = st.selectbox("Status", ["Ativo", "Em andamento", "Pausada", "Encerrado"], index=["Ativo", "Em andamento", "Pausada", "Encerrado"].index(s[5]))
-            obs = st.text_area("Observações", value=s[6] or "")
+            # A listagem traz só o resumo das observações longas
+            obs_completas = model_servico.obter_observacoes_servico(s[0])
+            obs = st.text_area("Observações", value=obs_completas if obs_completas is not None else (s[6] or ""))
 
             enviado = st.form_submit_button("Salvar Atualizações")
 
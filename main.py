@@ -22,8 +22,9 @@ sys.path.insert(0, str(FRONTEND_PATH))
 sys.path.insert(0, str(STYLES_PATH))
 
 # Agora importa os módulos do backend
-from backend.Database import db_gestaodecontratos as db
-from backend.Database.db_gestaodecontratos import atualizar_banco, fechar_conexao
+# (pelo mesmo caminho usado pelos models, para que o processo tenha uma única
+#  instância do módulo de banco e, portanto, uma única réplica compartilhada)
+from Database import db_gestaodecontratos as db
 
 # Importa módulos do frontend
 from frontend.Screens.Screen_Login import login, logout
@@ -95,13 +96,9 @@ if not st.session_state["autenticado"]:
 from frontend.Styles.theme import aplicar_estilo_geral
 aplicar_estilo_geral()
 
-# Atualiza o banco de dados ao iniciar
-try:
-    # Garante que as variáveis estejam configuradas antes de atualizar o banco
-    configurar_variaveis_drive()
-    db.atualizar_banco()
-finally:
-    db.fechar_conexao()
+# Aplica migrações pendentes (só faz algo na primeira execução do processo
+# ou depois que a réplica local é substituída por uma versão mais nova)
+db.atualizar_banco()
 
 st.sidebar.title("📁 Menu")
 
@@ -136,6 +133,18 @@ tela = st.sidebar.selectbox("Escolha a tela:", opcoes_menu)
 st.sidebar.markdown("---")
 st.sidebar.markdown(f"👤 Usuário logado: `{st.session_state.get('usuario', 'Admin')}`")
 st.sidebar.markdown(f"👑 Tipo: `{st.session_state.get('tipo_usuario', '')}`")
+status_sync = db.status_sincronizacao()
+if status_sync["ultimo_erro"]:
+    st.sidebar.warning(f"☁️ Alterações aguardando envio ao Drive: {status_sync['ultimo_erro']}")
+elif status_sync["pendente"]:
+    st.sidebar.caption("☁️ Sincronizando alterações com o Drive...")
+else:
+    st.sidebar.caption("☁️ Dados sincronizados com o Drive")
+if status_sync["conflitos"]:
+    st.sidebar.warning(
+        f"⚠️ {status_sync['conflitos']} registro(s) editado(s) ao mesmo tempo em outra sessão; "
+        "prevaleceu a versão mais recente."
+    )
 if st.sidebar.button("🚪 Sair"):
     logout()
     st.rerun()
@@ -0,0 +1,93 @@
+# tests/conftest.py
+# -----------------------------------------------------------------------------
+#  Configuração comum dos testes
+#  • Os módulos de backend/ são importados como na aplicação (Database, Models)
+#  • A réplica e os arquivos auxiliares ficam em tempfile.gettempdir(): cada
+#    execução dos testes usa um diretório temporário próprio
+#  • A fixture `drive` troca as funções de Service_googledrive usadas pela
+#    sincronização por uma pasta do Drive em memória (DriveFalso)
+# -----------------------------------------------------------------------------
+
+import itertools
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+tempfile.tempdir = tempfile.mkdtemp(prefix="project_organizer_testes_")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+
+class DriveFalso:
+    """Pastas do Drive em memória, com a mesma interface das funções de Service_googledrive.
+
+    `arquivos` guarda {id: {"id", "name", "parents", "dados", "modifiedTime"}}.
+    Com `falhar_upload`, upload_file devolve False sem gravar nada.
+    """
+
+    def __init__(self):
+        self.arquivos = {}
+        self.uploads = []
+        self.downloads = []
+        self.falhar_upload = False
+        self._ids = itertools.count(1)
+
+    def criar(self, nome: str, parent_id: str, dados: bytes, idade: float = 0.0) -> str:
+        file_id = f"arquivo-{next(self._ids)}"
+        modificado = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - idade))
+        self.arquivos[file_id] = {
+            "id": file_id, "name": nome, "parents": [parent_id], "dados": dados, "modifiedTime": modificado,
+        }
+        return file_id
+
+    def nomes(self, prefixo: str = "") -> list:
+        return sorted(a["name"] for a in self.arquivos.values() if a["name"].startswith(prefixo))
+
+    # Interface de Service_googledrive ------------------------------------------------
+    def upload_file(self, local_path, parent_id, *, return_metadata=False):
+        if self.falhar_upload:
+            return False
+        local_path = Path(local_path)
+        file_id = self.criar(local_path.name, parent_id, local_path.read_bytes())
+        self.uploads.append(local_path.name)
+        return {"id": file_id} if return_metadata else file_id
+
+    def download_file(self, file_id, dest_path) -> bool:
+        arquivo = self.arquivos.get(file_id)
+        if arquivo is None:
+            return False
+        Path(dest_path).write_bytes(arquivo["dados"])
+        self.downloads.append(arquivo["name"])
+        return True
+
+    def list_files_by_prefix(self, prefix, parent_id) -> list:
+        return sorted(
+            (
+                {k: a[k] for k in ("id", "name", "modifiedTime")}
+                for a in self.arquivos.values()
+                if a["name"].startswith(prefix) and parent_id in a["parents"]
+            ),
+            key=lambda a: a["name"],
+        )
+
+    def delete_file(self, file_id) -> bool:
+        return self.arquivos.pop(file_id, None) is not None
+
+    def get_file_id_by_name(self, name, parent_id=None):
+        for arquivo in self.arquivos.values():
+            if arquivo["name"] == name and (parent_id is None or parent_id in arquivo["parents"]):
+                return arquivo["id"]
+        return None
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    """DriveFalso no lugar do Google Drive para os módulos de backend/Database."""
+    from Services import Service_googledrive as gdrive
+
+    falso = DriveFalso()
+    for nome in ("upload_file", "download_file", "list_files_by_prefix", "delete_file", "get_file_id_by_name"):
+        monkeypatch.setattr(gdrive, nome, getattr(falso, nome))
+    return falso
@@ -0,0 +1,76 @@
+# tests/test_baixar_snapshot.py
+# Substituição da réplica pelo snapshot do Drive com escritas concorrentes
+
+import contextlib
+import json
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+from Database import db_changeset, db_gestaodecontratos as db
+
+FOLDER_ID = "pasta-testes"
+
+
+def _empresas(caminho) -> set:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        return {r[0] for r in conn.execute("SELECT cod_empresa FROM empresas")}
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica local com a empresa E1, já publicada e dentro do lease."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    # As escritas confirmadas não são publicadas: não há Drive nos testes
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    yield db.DB_PATH
+    db.fechar_conexao()
+
+
+def test_escrita_durante_download_nao_se_perde(replica, tmp_path, monkeypatch):
+    # Snapshot remoto: a réplica atual mais uma empresa cadastrada por outra instância
+    remoto = tmp_path / "remoto.db"
+    with contextlib.closing(db._conectar()) as src, contextlib.closing(sqlite3.connect(str(remoto))) as dst:
+        src.backup(dst)
+    with contextlib.closing(sqlite3.connect(str(remoto))) as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+        conn.commit()
+
+    def gravar():
+        with db.obter_conexao() as conn:
+            conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('C', '3', 'E3')")
+
+    def baixar_devagar(file_id, destino, meta, folder_id):
+        # Outra sessão confirma uma escrita pelo pool enquanto o download acontece
+        escrita = threading.Thread(target=gravar)
+        escrita.start()
+        escrita.join(10)
+        assert not escrita.is_alive()
+        shutil.copyfile(remoto, destino)
+
+    monkeypatch.setattr(db, "_baixar_verificado", baixar_devagar)
+    with db._replica.lock:
+        db._baixar_snapshot("arquivo-remoto", {"id": "arquivo-remoto"}, FOLDER_ID)
+
+    assert _empresas(db.DB_PATH) == {"E1", "E2", "E3"}
+    # A escrita continua pendente de publicação na réplica nova
+    with contextlib.closing(db._conectar()) as conn:
+        pendentes = [
+            json.loads(dados)["cod_empresa"]
+            for (dados,) in conn.execute(
+                f"SELECT dados FROM {db_changeset.CHANGELOG_TABLE} WHERE tabela = 'empresas'"
+            )
+        ]
+    assert pendentes == ["E3"]
@@ -0,0 +1,115 @@
+# tests/test_blocos.py
+# Snapshot em blocos endereçados por conteúdo (db_blocos): montagem a partir
+# de blocos locais e remotos, verificação do sha256 e coleta de lixo
+
+import contextlib
+import gzip
+import sqlite3
+
+import pytest
+
+from Database import db_blocos
+
+DB_NAME = "blocos.db"
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture(autouse=True)
+def blocos_pequenos(monkeypatch):
+    # Duas páginas por bloco: poucas linhas já geram vários blocos
+    monkeypatch.setattr(db_blocos, "DB_BLOCO_BYTES", 8192)
+
+
+def _criar_banco(caminho, linhas: int = 200) -> None:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        conn.execute("PRAGMA page_size = 4096")
+        conn.execute("CREATE TABLE dados (id INTEGER PRIMARY KEY, valor TEXT)")
+        conn.executemany("INSERT INTO dados (valor) VALUES (?)", [(f"{i:04d}" * 100,) for i in range(linhas)])
+        conn.commit()
+
+
+def _alterar(caminho, ids) -> None:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        conn.executemany("UPDATE dados SET valor = ? WHERE id = ?", [("x" * 400, i) for i in ids])
+        conn.commit()
+
+
+def _blocos_no_drive(drive) -> set:
+    return {nome[len(f"{DB_NAME}.blk."):].split(".", 1)[0] for nome in drive.nomes(f"{DB_NAME}.blk.")}
+
+
+def test_montar_usa_blocos_locais_e_baixa_so_os_que_faltam(drive, tmp_path):
+    publicado = tmp_path / "publicado.db"
+    _criar_banco(publicado)
+    manifesto = db_blocos.enviar_blocos(publicado, DB_NAME, FOLDER_ID)
+    assert len(set(manifesto["blocos"])) > 5
+
+    # Cópia local desatualizada: as páginas da linha 1 diferem do publicado
+    local = tmp_path / "local.db"
+    local.write_bytes(publicado.read_bytes())
+    _alterar(local, [1])
+    diferentes = set(manifesto["blocos"]) - set(db_blocos.hashes(local, manifesto["bloco_bytes"]))
+    assert diferentes
+
+    destino = tmp_path / "montado.db"
+    baixados = db_blocos.montar(manifesto, destino, DB_NAME, FOLDER_ID, locais=[tmp_path / "ausente.db", local])
+
+    assert baixados == len(diferentes)
+    assert len(drive.downloads) == len(diferentes)
+    assert destino.read_bytes() == publicado.read_bytes()
+
+
+def test_montar_rejeita_bloco_que_nao_confere_com_o_hash(drive, tmp_path):
+    publicado = tmp_path / "publicado.db"
+    _criar_banco(publicado)
+    manifesto = db_blocos.enviar_blocos(publicado, DB_NAME, FOLDER_ID)
+
+    # Um bloco no Drive com conteúdo diferente do que o nome (sha256) promete
+    alvo = db_blocos.nome_bloco(DB_NAME, manifesto["blocos"][1])
+    arquivo = next(a for a in drive.arquivos.values() if a["name"] == alvo)
+    arquivo["dados"] = gzip.compress(b"\x00" * manifesto["bloco_bytes"])
+
+    destino = tmp_path / "montado.db"
+    destino.write_bytes(b"anterior")
+    with pytest.raises(IOError, match="não confere com o hash"):
+        db_blocos.montar(manifesto, destino, DB_NAME, FOLDER_ID)
+
+    # O destino não é tocado e a montagem parcial é removida
+    assert destino.read_bytes() == b"anterior"
+    assert list(tmp_path.glob("*.montagem")) == []
+
+
+def test_montar_falha_se_bloco_nao_esta_no_drive(drive, tmp_path):
+    publicado = tmp_path / "publicado.db"
+    _criar_banco(publicado)
+    manifesto = db_blocos.enviar_blocos(publicado, DB_NAME, FOLDER_ID)
+    alvo = db_blocos.nome_bloco(DB_NAME, manifesto["blocos"][0])
+    drive.delete_file(drive.get_file_id_by_name(alvo, FOLDER_ID))
+
+    with pytest.raises(IOError, match="não encontrado no Drive"):
+        db_blocos.montar(manifesto, tmp_path / "montado.db", DB_NAME, FOLDER_ID)
+
+
+def test_coletar_lixo_mantem_blocos_dos_manifestos_retidos(drive, tmp_path, monkeypatch):
+    banco = tmp_path / "banco.db"
+    _criar_banco(banco)
+    v1 = db_blocos.enviar_blocos(banco, DB_NAME, FOLDER_ID)
+    _alterar(banco, [1])
+    v2 = db_blocos.enviar_blocos(banco, DB_NAME, FOLDER_ID)
+    _alterar(banco, [150])
+    v3 = db_blocos.enviar_blocos(banco, DB_NAME, FOLDER_ID)
+    so_v1 = set(v1["blocos"]) - set(v2["blocos"]) - set(v3["blocos"])
+    assert so_v1
+
+    # Dentro do prazo de retenção nada é removido
+    assert db_blocos.coletar_lixo(v3["blocos"] + v2["blocos"], DB_NAME, FOLDER_ID) == 0
+
+    monkeypatch.setattr(db_blocos, "DB_BLOCOS_RETENCAO_SECONDS", 0)
+    removidos = db_blocos.coletar_lixo(v3["blocos"] + v2["blocos"], DB_NAME, FOLDER_ID)
+
+    assert removidos == len(so_v1)
+    assert _blocos_no_drive(drive) == set(v2["blocos"]) | set(v3["blocos"])
+    # O manifesto anterior continua montável só com o Drive
+    db_blocos.montar(v2, tmp_path / "v2.db", DB_NAME, FOLDER_ID)
+    with pytest.raises(IOError):
+        db_blocos.montar(v1, tmp_path / "v1.db", DB_NAME, FOLDER_ID)
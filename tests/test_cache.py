@@ -0,0 +1,115 @@
+# tests/test_cache.py
+# Cache das listagens (db_cache.em_cache): invalidação pelas escritas
+# confirmadas, descarte total, consultas com escrita aberta e limite LRU
+
+import contextlib
+
+import pytest
+
+from Database import db_cache, db_changeset, db_gestaodecontratos as db
+from Models import model_contrato, model_empresa, model_unidade
+
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica com E1 → C1, C2, C3, cada contrato com uma unidade, e o cache vazio."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        for i in (1, 2, 3):
+            conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES (?, 'E1')", (f"C{i}",))
+            conn.execute(
+                "INSERT INTO unidades (cod_unidade, numero_contrato, nome_unidade) VALUES (?, ?, ?)",
+                (f"U{i}", f"C{i}", f"Unidade {i}"),
+            )
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    db_cache.invalidar_tudo()
+    yield
+    db.fechar_conexao()
+    db_cache.invalidar_tudo()
+
+
+def _contagem() -> tuple:
+    estatisticas = db_cache.estatisticas()
+    return estatisticas["acertos"], estatisticas["falhas"]
+
+
+def _empresas() -> set:
+    return {e[0] for e in model_empresa._listar_empresas()}
+
+
+def test_escrita_confirmada_invalida_so_as_tabelas_alteradas(replica):
+    model_empresa._listar_empresas()
+    model_contrato._listar_contratos()
+    acertos, falhas = _contagem()
+
+    with db.obter_conexao() as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+
+    assert _empresas() == {"E1", "E2"}
+    assert _contagem() == (acertos, falhas + 1)
+    assert len(model_contrato._listar_contratos()) == 3
+    assert _contagem() == (acertos + 1, falhas + 1)
+
+
+def test_invalidar_tudo_descarta_todas_as_entradas(replica):
+    model_empresa._listar_empresas()
+    model_contrato._listar_contratos()
+    assert db_cache.estatisticas()["entradas"] == 2
+
+    db_cache.invalidar_tudo()
+
+    assert db_cache.estatisticas()["entradas"] == 0
+    acertos, falhas = _contagem()
+    model_empresa._listar_empresas()
+    model_contrato._listar_contratos()
+    assert _contagem() == (acertos, falhas + 2)
+
+
+def test_com_escrita_aberta_a_consulta_vai_ao_banco(replica):
+    assert _empresas() == {"E1"}
+    antes = db_cache.estatisticas()
+
+    with pytest.raises(RuntimeError):
+        with db.unit_of_work() as conn:
+            conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+            # A thread está com o escritor: enxerga a própria escrita e não usa nem grava o cache
+            assert _empresas() == {"E1", "E2"}
+            assert db_cache.estatisticas() == antes
+            raise RuntimeError("desfaz")
+
+    # O dado não confirmado não ficou no cache
+    assert _empresas() == {"E1"}
+    assert _contagem() == (antes["acertos"] + 1, antes["falhas"])
+
+
+def test_lru_mantem_o_total_abaixo_do_limite(replica, monkeypatch):
+    model_unidade.listar_unidades("C1")
+    tamanho = db_cache.estatisticas()["bytes"]
+    # Cabem duas listagens de uma unidade
+    monkeypatch.setattr(db_cache, "DB_CACHE_MAX_BYTES", int(tamanho * 2.5))
+    descartes = db_cache.estatisticas()["descartes"]
+
+    model_unidade.listar_unidades("C2")
+    model_unidade.listar_unidades("C1")   # C1 passa a ser a mais recente
+    model_unidade.listar_unidades("C3")   # descarta C2, a menos usada
+
+    estatisticas = db_cache.estatisticas()
+    assert estatisticas["bytes"] <= db_cache.DB_CACHE_MAX_BYTES
+    assert estatisticas["entradas"] == 2
+    assert estatisticas["descartes"] == descartes + 1
+    acertos, falhas = _contagem()
+    model_unidade.listar_unidades("C1")
+    assert _contagem() == (acertos + 1, falhas)
+    model_unidade.listar_unidades("C2")
+    assert _contagem() == (acertos + 1, falhas + 1)
@@ -0,0 +1,121 @@
+# tests/test_changeset.py
+# Changesets (db_changeset): publicação das linhas alteradas e reexecução em
+# outra réplica, pelo DriveFalso
+
+import contextlib
+import gzip
+import json
+import shutil
+import sqlite3
+
+import pytest
+
+from Database import db_changeset, db_merge, db_migracoes
+
+DB_NAME = "changeset.db"
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replicas(tmp_path):
+    """Conexões com duas réplicas (A, B) do mesmo banco, com a empresa E1 e a captura instalada."""
+    base = tmp_path / "base.db"
+    with contextlib.closing(sqlite3.connect(str(base))) as conn:
+        db_migracoes.aplicar_migracoes(conn)
+        db_changeset.instalar_captura(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('Original', '1', 'E1')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    shutil.copy(base, tmp_path / "b.db")
+    with contextlib.closing(sqlite3.connect(str(base))) as a, \
+            contextlib.closing(sqlite3.connect(str(tmp_path / "b.db"))) as b:
+        yield a, b
+
+
+def _changelog(conn) -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {db_changeset.CHANGELOG_TABLE}").fetchone()[0]
+
+
+def _empresas(conn) -> dict:
+    return dict(conn.execute("SELECT cod_empresa, nome FROM empresas"))
+
+
+def _publicar(conn, *comandos) -> str:
+    for comando in comandos:
+        conn.execute(comando)
+    conn.commit()
+    return db_changeset.publicar_changeset(conn, DB_NAME, FOLDER_ID)
+
+
+def test_alteracoes_da_mesma_linha_viram_uma_so(replicas, drive):
+    a, _ = replicas
+    nome = _publicar(
+        a,
+        "UPDATE empresas SET nome = 'Primeiro' WHERE cod_empresa = 'E1'",
+        "UPDATE empresas SET nome = 'Segundo' WHERE cod_empresa = 'E1'",
+        "INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('Nova', '2', 'E2')",
+        "UPDATE empresas SET cnpj = '3' WHERE cod_empresa = 'E2'",
+        "DELETE FROM empresas WHERE cod_empresa = 'E2'",
+    )
+
+    (arquivo,) = drive.arquivos.values()
+    assert arquivo["name"] == nome
+    linhas = json.loads(gzip.decompress(arquivo["dados"]))["linhas"]
+    assert [(l["op"], l["dados"]["cod_empresa"]) for l in linhas] == [("U", "E1"), ("D", "E2")]
+    assert linhas[0]["dados"]["nome"] == "Segundo"
+    assert _changelog(a) == 0
+    # O próprio changeset fica registrado como aplicado e não volta para esta réplica
+    assert db_changeset.aplicar_changesets_remotos(a, DB_NAME, FOLDER_ID) == 0
+
+
+def test_changesets_remotos_aplicados_em_ordem(replicas, drive):
+    a, b = replicas
+    _publicar(a, "INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('v1', '2', 'E2')")
+    _publicar(a, "UPDATE empresas SET nome = 'v2' WHERE cod_empresa = 'E2'")
+    _publicar(a, "UPDATE empresas SET nome = 'v3' WHERE cod_empresa = 'E2'", "DELETE FROM empresas WHERE cod_empresa = 'E1'")
+
+    assert db_changeset.aplicar_changesets_remotos(b, DB_NAME, FOLDER_ID) == 3
+
+    assert _empresas(b) == {"E2": "v3"}
+    # A reexecução não gera pendências para republicar, e nada é aplicado duas vezes
+    assert _changelog(b) == 0
+    assert db_changeset.aplicar_changesets_remotos(b, DB_NAME, FOLDER_ID) == 0
+
+
+def test_linha_com_alteracao_local_pendente_nao_e_sobrescrita(replicas, drive):
+    a, b = replicas
+    b.execute("UPDATE empresas SET nome = 'Local' WHERE cod_empresa = 'E1'")
+    b.commit()
+    _publicar(
+        a,
+        "UPDATE empresas SET nome = 'Remoto' WHERE cod_empresa = 'E1'",
+        "INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('Outra', '2', 'E2')",
+    )
+
+    assert db_changeset.aplicar_changesets_remotos(b, DB_NAME, FOLDER_ID) == 1
+
+    assert _empresas(b) == {"E1": "Local", "E2": "Outra"}
+    # A alteração local continua pendente e o conflito fica registrado
+    assert _changelog(b) == 1
+    (conflito,) = db_merge.listar_conflitos(b)
+    assert json.loads(conflito[2]) == {"cod_empresa": "E1"}
+    assert json.loads(conflito[4])["nome"] == "Remoto"
+
+
+def test_changelog_mantido_quando_o_envio_falha(replicas, drive):
+    a, _ = replicas
+    a.execute("UPDATE empresas SET nome = 'Alterada' WHERE cod_empresa = 'E1'")
+    a.commit()
+    aplicados = a.execute(f"SELECT COUNT(*) FROM {db_changeset.APLICADOS_TABLE}").fetchone()[0]
+
+    drive.falhar_upload = True
+    with pytest.raises(IOError):
+        db_changeset.publicar_changeset(a, DB_NAME, FOLDER_ID)
+
+    assert _changelog(a) == 1
+    assert a.execute(f"SELECT COUNT(*) FROM {db_changeset.APLICADOS_TABLE}").fetchone()[0] == aplicados
+    assert drive.arquivos == {}
+
+    drive.falhar_upload = False
+    assert db_changeset.publicar_changeset(a, DB_NAME, FOLDER_ID)
+    assert _changelog(a) == 0
@@ -0,0 +1,168 @@
+# tests/test_chaves_inteiras.py
+# Migração 5 (colunas id_* de db_merge.CHAVES_INTEIRAS) aplicada a um banco na
+# versão 4, e comparação de tempo entre as junções antigas pelas chaves de
+# texto e as junções pelos ids usadas pelos models
+
+import contextlib
+import sqlite3
+import time
+
+import pytest
+
+from Database import db_gestaodecontratos as db, db_merge, db_migracoes
+from Models import model_servico
+
+EMPRESAS, CONTRATOS, UNIDADES, SERVICOS = 120, 1_200, 12_000, 120_000
+BUSCAS = 20_000
+
+# Junções dos models antes da migração 5, pelas chaves de texto
+BUSCAR_SERVICO_POR_TEXTO = """
+    SELECT s.*, u.nome_unidade, c.numero_contrato, e.nome as nome_empresa
+    FROM main.servicos s
+    INNER JOIN unidades u ON s.cod_unidade = u.cod_unidade
+    INNER JOIN contratos c ON u.numero_contrato = c.numero_contrato
+    INNER JOIN empresas e ON c.cod_empresa = e.cod_empresa
+    WHERE s.cod_servico = ?
+"""
+INFO_UNIDADE_POR_TEXTO = """
+    SELECT u.nome_unidade, c.numero_contrato, e.nome
+    FROM unidades u
+    JOIN contratos c ON u.numero_contrato = c.numero_contrato
+    JOIN empresas e ON c.cod_empresa = e.cod_empresa
+    WHERE u.cod_unidade = ?
+"""
+
+
+def _migrar_ate(conn: sqlite3.Connection, versao: int, monkeypatch) -> None:
+    """Aplica as migrações até `versao`, como um banco criado por uma versão anterior."""
+    with monkeypatch.context() as m:
+        m.setattr(db_migracoes, "MIGRACOES", [x for x in db_migracoes.MIGRACOES if x[0] <= versao])
+        m.setattr(db_migracoes, "VERSAO_ESQUEMA", versao)
+        db_migracoes.aplicar_migracoes(conn)
+    assert db_migracoes.versao_esquema(conn) == versao
+
+
+def _popular(conn: sqlite3.Connection) -> None:
+    """Grava as tabelas pelas chaves de texto; servicos[0] aponta para uma unidade inexistente."""
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES (?, ?, ?)",
+        [(f"Empresa {i}", f"{i:014d}", f"E{i}") for i in range(EMPRESAS)],
+    )
+    conn.executemany(
+        "INSERT INTO contratos (numero_contrato, cod_empresa) VALUES (?, ?)",
+        [(f"C{i}", f"E{i % EMPRESAS}") for i in range(CONTRATOS)],
+    )
+    conn.executemany(
+        "INSERT INTO unidades (cod_unidade, numero_contrato, nome_unidade) VALUES (?, ?, ?)",
+        [(f"U{i}", f"C{i % CONTRATOS}", f"Unidade {i}") for i in range(UNIDADES)],
+    )
+    conn.executemany(
+        "INSERT INTO funcionarios (nome, cpf, cod_funcionario) VALUES (?, ?, ?)",
+        [(f"Funcionário {i}", f"{i:011d}", f"F{i}") for i in range(200)],
+    )
+    conn.executemany(
+        "INSERT INTO servicos (cod_servico, cod_unidade, status) VALUES (?, ?, ?)",
+        [("S0", "U_removida", "Ativo")]
+        + [(f"S{i}", f"U{i % UNIDADES}", "Ativo") for i in range(1, SERVICOS)],
+    )
+    conn.executemany(
+        "INSERT INTO servico_funcionarios (cod_servico, cod_funcionario) VALUES (?, ?)",
+        [(f"S{i}", f"F{i % 200}") for i in range(0, SERVICOS, 2)],
+    )
+    conn.commit()
+
+
+@pytest.fixture(scope="module")
+def banco_v5(tmp_path_factory):
+    """Banco gravado na versão 4 e levado à 5 pelo aplicador de migrações."""
+    caminho = tmp_path_factory.mktemp("chaves_inteiras") / "v4.db"
+    with pytest.MonkeyPatch.context() as monkeypatch, contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        _migrar_ate(conn, 4, monkeypatch)
+        assert "id_unidade" not in db_migracoes._colunas(conn, "servicos")
+        _popular(conn)
+        assert db_migracoes.aplicar_migracoes(conn) == [5]
+        conn.execute("ANALYZE")
+    return caminho
+
+
+def test_m005_preenche_os_ids_a_partir_das_chaves_de_texto(banco_v5):
+    with contextlib.closing(sqlite3.connect(str(banco_v5))) as conn:
+        for tabela, chaves in db_merge.CHAVES_INTEIRAS.items():
+            total = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            assert total > 0, tabela
+            for coluna, natural, pai, natural_pai in chaves:
+                assert coluna in db_migracoes._colunas(conn, tabela)
+                # Todo id_* é o id do pai com a mesma chave de texto (NULL se não há pai)
+                divergentes = conn.execute(f"""
+                    SELECT COUNT(*) FROM {tabela} t LEFT JOIN {pai} p ON p.{natural_pai} = t.{natural}
+                    WHERE t.{coluna} IS NOT p.id
+                """).fetchone()[0]
+                assert divergentes == 0, (tabela, coluna)
+                sem_pai = conn.execute(f"SELECT COUNT(*) FROM {tabela} WHERE {coluna} IS NULL").fetchone()[0]
+                esperado = 1 if (tabela, coluna) == ("servicos", "id_unidade") else 0
+                assert sem_pai == esperado, (tabela, coluna)
+
+
+def test_m005_mantem_os_ids_nas_gravacoes_seguintes(banco_v5, tmp_path):
+    caminho = tmp_path / "copia.db"
+    with contextlib.closing(sqlite3.connect(str(banco_v5))) as origem, \
+            contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        origem.backup(conn)
+        # Pai gravado depois do filho (replay de changeset): o trigger do lado do pai preenche
+        conn.execute("INSERT INTO unidades (cod_unidade, numero_contrato, nome_unidade) VALUES ('U_removida', 'C1', 'Nova')")
+        id_unidade = conn.execute("SELECT id FROM unidades WHERE cod_unidade = 'U_removida'").fetchone()[0]
+        assert conn.execute("SELECT id_unidade FROM servicos WHERE cod_servico = 'S0'").fetchone()[0] == id_unidade
+        # Troca da chave de texto no filho
+        conn.execute("UPDATE servicos SET cod_unidade = 'U2' WHERE cod_servico = 'S0'")
+        id_u2 = conn.execute("SELECT id FROM unidades WHERE cod_unidade = 'U2'").fetchone()[0]
+        assert conn.execute("SELECT id_unidade FROM servicos WHERE cod_servico = 'S0'").fetchone()[0] == id_u2
+        # Remoção do pai
+        conn.execute("DELETE FROM servico_funcionarios WHERE cod_funcionario = 'F0'")
+        conn.execute("DELETE FROM funcionarios WHERE cod_funcionario = 'F0'")
+        conn.execute("INSERT INTO servico_funcionarios (cod_servico, cod_funcionario) VALUES ('S1', 'F0')")
+        assert conn.execute(
+            "SELECT id_funcionario FROM servico_funcionarios WHERE cod_servico = 'S1' AND cod_funcionario = 'F0'"
+        ).fetchone()[0] is None
+
+
+def _sql_do_model(conn: sqlite3.Connection, monkeypatch, chamada) -> str:
+    """Último SELECT executado pelo model (a junção), com os parâmetros já expandidos."""
+    executadas = []
+    conn.set_trace_callback(executadas.append)
+    with monkeypatch.context() as m:
+        m.setattr(db, "obter_conexao_leitura", lambda: conn)
+        assert chamada()
+    conn.set_trace_callback(None)
+    return [s for s in executadas if s.lstrip().upper().startswith("SELECT")][-1]
+
+
+def _tempos(conn: sqlite3.Connection, consultas: tuple, valores: list) -> list[float]:
+    """Melhor de cinco rodadas de cada consulta, alternadas para o cache afetar as duas igualmente."""
+    melhores = [float("inf")] * len(consultas)
+    for _ in range(5):
+        for n, sql in enumerate(consultas):
+            inicio = time.perf_counter()
+            for valor in valores:
+                assert conn.execute(sql, (valor,)).fetchone()
+            melhores[n] = min(melhores[n], time.perf_counter() - inicio)
+    return melhores
+
+
+@pytest.mark.parametrize("model, sql_texto, literal, prefixo, total", [
+    ("buscar_servico_por_codigo", BUSCAR_SERVICO_POR_TEXTO, "'S7'", "S", SERVICOS),
+    ("obter_info_unidade", INFO_UNIDADE_POR_TEXTO, "'U7'", "U", UNIDADES),
+], ids=["buscar_servico_por_codigo", "obter_info_unidade"])
+def test_junta_pelo_id_nao_e_mais_lenta_que_pelo_texto(banco_v5, monkeypatch, capsys, model, sql_texto, literal, prefixo, total):
+    with contextlib.closing(sqlite3.connect(str(banco_v5))) as conn:
+        sql_id = _sql_do_model(conn, monkeypatch, lambda: getattr(model_servico, model)("S7"))
+        assert "c.id = u.id_contrato" in sql_id and literal in sql_id, sql_id
+        sql_id = sql_id.replace(literal, "?")
+
+        valores = [f"{prefixo}{i}" for i in range(1, total, max(1, total // BUSCAS))]
+        texto, inteiro = _tempos(conn, (sql_texto, sql_id), valores)
+    with capsys.disabled():
+        print(f"\n{model}: {len(valores)} buscas — chaves de texto {texto:.3f}s, ids {inteiro:.3f}s")
+    # O ganho medido é de 5% a 20%; a margem evita falhas por ruído de medição,
+    # e os planos (SEARCH ... INTEGER PRIMARY KEY) são verificados em test_indices.py
+    assert inteiro <= texto * 1.1, f"junção pelos ids mais lenta: {inteiro:.3f}s contra {texto:.3f}s"
@@ -0,0 +1,93 @@
+# tests/test_escritas.py
+# Rastreamento das escritas por transação (db_escritas): descarte no
+# rollback, notificação única no commit e triggers recriados com o esquema
+
+import contextlib
+import json
+
+import pytest
+
+from Database import db_changeset, db_escritas, db_gestaodecontratos as db, db_merge
+
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica com a empresa E1; devolve as escritas entregues a um ouvinte de teste."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.execute("INSERT INTO funcionarios (nome, cpf, cod_funcionario) VALUES ('F', '9', 'F1')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    notificadas = []
+    monkeypatch.setattr(db_escritas, "_ouvintes", list(db_escritas._ouvintes))
+    db_escritas.registrar_ouvinte(notificadas.append)
+    yield notificadas
+    db.fechar_conexao()
+
+
+def _registros() -> int:
+    with db.obter_conexao() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM temp.{db_escritas.ESCRITAS_TABLE}").fetchone()[0]
+
+
+def test_rollback_descarta_linhas_e_registros_sem_notificar(replica):
+    with pytest.raises(RuntimeError):
+        with db.unit_of_work() as conn:
+            conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+            conn.execute("UPDATE empresas SET nome = 'A2' WHERE cod_empresa = 'E1'")
+            assert _registros() == 3
+            raise RuntimeError("desfaz")
+
+    assert replica == []
+    assert _registros() == 0
+    with db.obter_conexao_leitura() as conn:
+        assert [tuple(r) for r in conn.execute("SELECT cod_empresa, nome FROM empresas")] == [("E1", "A")]
+
+
+def test_commit_notifica_uma_vez_com_as_chaves_naturais(replica):
+    with db.unit_of_work() as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+        conn.execute("UPDATE empresas SET nome = 'A2' WHERE cod_empresa = 'E1'")
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES ('C1', 'E2')")
+        conn.execute("INSERT INTO unidades (cod_unidade, numero_contrato) VALUES ('U1', 'C1')")
+        conn.execute("INSERT INTO servicos (cod_servico, cod_unidade) VALUES ('S1', 'U1')")
+        conn.execute("INSERT INTO servico_funcionarios (cod_servico, cod_funcionario) VALUES ('S1', 'F1')")
+
+    (escritas,) = replica
+    assert escritas["empresas"] == {"E1", "E2"}
+    assert escritas["contratos"] == {"C1"}
+    # Chave composta: json_array das colunas
+    assert {tuple(json.loads(c)) for c in escritas["servico_funcionarios"]} == {("S1", "F1")}
+    assert _registros() == 0
+
+    # Transação só de leitura não notifica
+    with db.obter_conexao() as conn:
+        conn.execute("SELECT COUNT(*) FROM empresas").fetchone()
+    assert len(replica) == 1
+
+
+def test_triggers_recriados_quando_o_esquema_muda(replica, monkeypatch):
+    with db.obter_conexao() as conn:
+        conn.execute("CREATE TABLE anotacoes (texto TEXT)")
+    with db.obter_conexao() as conn:
+        conn.execute("INSERT INTO anotacoes (texto) VALUES ('a')")
+    # Tabela nova rastreada; sem chave natural, pelo rowid
+    assert replica[-1] == {"anotacoes": {1}}
+
+    # A chave natural passa a existir: os triggers são refeitos com ela
+    monkeypatch.setitem(db_merge.CHAVES_NATURAIS, "anotacoes", ("codigo",))
+    with db.obter_conexao() as conn:
+        conn.execute("ALTER TABLE anotacoes ADD COLUMN codigo TEXT")
+    with db.obter_conexao() as conn:
+        conn.execute("INSERT INTO anotacoes (texto, codigo) VALUES ('b', 'N2')")
+    assert replica[-1] == {"anotacoes": {"N2"}}
@@ -0,0 +1,73 @@
+# tests/test_excluir_em_cascata.py
+# Exclusão com cascata pelas chaves estrangeiras (db.excluir_em_cascata):
+# contagem por tabela e desfazimento até o savepoint quando bloqueada
+
+import contextlib
+
+import pytest
+
+from Database import db_changeset, db_gestaodecontratos as db
+
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica com E1 → C1 → U1, U2 → S1, S2 (em U1) e S3 (em U2), S1 com um funcionário e um arquivo."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES ('C1', 'E1')")
+        conn.executemany(
+            "INSERT INTO unidades (cod_unidade, numero_contrato) VALUES (?, 'C1')", [("U1",), ("U2",)]
+        )
+        conn.executemany(
+            "INSERT INTO servicos (cod_servico, cod_unidade) VALUES (?, ?)",
+            [("S1", "U1"), ("S2", "U1"), ("S3", "U2")],
+        )
+        conn.execute("INSERT INTO funcionarios (nome, cpf, cod_funcionario) VALUES ('F', '9', 'F1')")
+        conn.execute("INSERT INTO servico_funcionarios (cod_servico, cod_funcionario) VALUES ('S1', 'F1')")
+        conn.execute("INSERT INTO arquivos_servico (cod_servico, nome_arquivo) VALUES ('S1', 'a.pdf')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    yield
+    db.fechar_conexao()
+
+
+def _codigos(tabela: str, coluna: str) -> set:
+    with db.obter_conexao_leitura() as conn:
+        return {r[0] for r in conn.execute(f"SELECT {coluna} FROM {tabela}")}
+
+
+def test_devolve_as_linhas_removidas_por_tabela(replica):
+    removidas = db.excluir_em_cascata("unidades", "cod_unidade", "U1")
+
+    assert removidas == {"unidades": 1, "servicos": 2, "servico_funcionarios": 1, "arquivos_servico": 1}
+    assert _codigos("unidades", "cod_unidade") == {"U2"}
+    assert _codigos("servicos", "cod_servico") == {"S3"}
+    assert _codigos("funcionarios", "cod_funcionario") == {"F1"}
+
+
+def test_linha_inexistente_devolve_vazio(replica):
+    assert db.excluir_em_cascata("unidades", "cod_unidade", "U9") == {}
+    assert _codigos("unidades", "cod_unidade") == {"U1", "U2"}
+
+
+def test_bloqueada_desfaz_so_a_exclusao(replica):
+    with db.unit_of_work() as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('B', '2', 'E2')")
+        with pytest.raises(db.ExclusaoBloqueada) as erro:
+            db.excluir_em_cascata("empresas", "cod_empresa", "E1", bloquear=("contratos",))
+
+    # O que seria removido vem na exceção; nada saiu, e a escrita anterior da unidade foi confirmada
+    assert erro.value.removidas["contratos"] == 1
+    assert erro.value.removidas["servicos"] == 3
+    assert _codigos("empresas", "cod_empresa") == {"E1", "E2"}
+    assert _codigos("servicos", "cod_servico") == {"S1", "S2", "S3"}
@@ -0,0 +1,160 @@
+# tests/test_indices.py
+# Planos de consulta (EXPLAIN QUERY PLAN) das listagens e buscas mais usadas,
+# executadas pelos próprios models sobre um banco migrado com 100k serviços
+
+import contextlib
+import sqlite3
+
+import pytest
+
+from Database import db_gestaodecontratos as db, db_migracoes
+from Models import model_servico, model_servico_funcionarios
+
+SERVICOS = 100_000
+
+
+@pytest.fixture(scope="module")
+def banco(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp("indices") / "indices.db"
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        db_migracoes.aplicar_migracoes(conn)
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES (?, ?, ?)",
+            [(f"Empresa {i}", f"{i:014d}", f"E{i}") for i in range(20)],
+        )
+        conn.executemany(
+            "INSERT INTO contratos (numero_contrato, cod_empresa) VALUES (?, ?)",
+            [(f"C{i}", f"E{i % 20}") for i in range(200)],
+        )
+        conn.executemany(
+            "INSERT INTO unidades (cod_unidade, numero_contrato, nome_unidade) VALUES (?, ?, ?)",
+            [(f"U{i}", f"C{i % 200}", f"Unidade {i}") for i in range(2_000)],
+        )
+        conn.executemany(
+            "INSERT INTO funcionarios (nome, cpf, cod_funcionario) VALUES (?, ?, ?)",
+            [(f"Funcionário {i}", f"{i:011d}", f"F{i}") for i in range(200)],
+        )
+        conn.executemany(
+            "INSERT INTO servicos (cod_servico, cod_unidade, status, data_criacao) VALUES (?, ?, ?, ?)",
+            [
+                (f"S{i}", f"U{i % 2_000}", ("Ativo", "Encerrado", "Pausada")[i % 3], f"20{10 + i % 15}-01-01")
+                for i in range(SERVICOS)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO servico_funcionarios (cod_servico, cod_funcionario) VALUES (?, ?)",
+            [(f"S{i}", f"F{i % 200}") for i in range(0, SERVICOS, 2)],
+        )
+        conn.executemany(
+            "INSERT INTO arquivos_servico (cod_servico, nome_arquivo, drive_file_id, data_upload) VALUES (?, ?, ?, ?)",
+            [(f"S{i}", f"a{i}.pdf", f"d{i}", "2024-01-01") for i in range(0, SERVICOS, 3)],
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+    return caminho
+
+
+@pytest.fixture
+def consultas(banco, monkeypatch):
+    """Executa os models sobre `banco` e devolve os SELECTs que eles rodaram."""
+    conn = sqlite3.connect(str(banco))
+    conn.row_factory = sqlite3.Row
+    executadas = []
+    conn.set_trace_callback(executadas.append)
+    monkeypatch.setattr(db, "obter_conexao_leitura", lambda: conn)
+    yield conn, executadas
+    conn.close()
+
+
+def _plano(conn: sqlite3.Connection, sql: str) -> list[str]:
+    return [r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def _plano_do_model(consultas, chamada) -> list[str]:
+    conn, executadas = consultas
+    executadas.clear()
+    chamada()
+    selects = [s for s in executadas if s.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1, selects
+    conn.set_trace_callback(None)
+    try:
+        return _plano(conn, selects[0])
+    finally:
+        conn.set_trace_callback(executadas.append)
+
+
+def _sem_varredura(plano: list[str]) -> None:
+    """Nenhuma tabela é lida por inteiro nem ordenada à parte."""
+    for passo in plano:
+        assert not (passo.startswith("SCAN") and "INDEX" not in passo), plano
+        assert "TEMP B-TREE" not in passo, plano
+
+
+def test_indices_criados_de_forma_idempotente(banco):
+    with contextlib.closing(sqlite3.connect(str(banco))) as conn:
+        assert db_migracoes.aplicar_migracoes(conn) == []
+        antes = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name").fetchall()
+        db_migracoes._m003_indices(conn)
+        db_migracoes._m005_chaves_inteiras(conn)
+        depois = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' ORDER BY name").fetchall()
+    assert antes == depois
+    nomes = {n for (n,) in depois}
+    assert {nome for nome, _, _ in db_migracoes.INDICES} <= nomes
+
+
+def test_listar_servicos_por_status_e_data(consultas):
+    plano = _plano_do_model(
+        consultas, lambda: model_servico.listar_servicos(status=["Encerrado"], data_ini="2020-01-01")
+    )
+    assert any("USING INDEX idx_servicos_status_data" in p for p in plano), plano
+    _sem_varredura(plano)
+
+
+def test_listar_servicos_sem_filtro_ordena_pelo_indice(consultas):
+    plano = _plano_do_model(consultas, lambda: model_servico.listar_servicos())
+    assert plano == ["SCAN servicos USING INDEX idx_servicos_data_criacao"], plano
+
+
+def test_listar_arquivos_servico(consultas):
+    plano = _plano_do_model(consultas, lambda: model_servico.listar_arquivos_servico("S3"))
+    assert any("USING INDEX idx_arquivos_servico_servico_data (cod_servico=?)" in p for p in plano), plano
+    _sem_varredura(plano)
+
+
+def test_listar_funcionarios_por_servico_junta_pelo_id(consultas):
+    plano = _plano_do_model(
+        consultas, lambda: model_servico_funcionarios.listar_funcionarios_por_servico("S2")
+    )
+    assert any(p.startswith("SEARCH sf USING INDEX") and "(cod_servico=?)" in p for p in plano), plano
+    assert "SEARCH f USING INTEGER PRIMARY KEY (rowid=?)" in plano, plano
+    _sem_varredura(plano)
+
+
+def test_listar_servicos_por_funcionario_junta_pelo_id(consultas):
+    plano = _plano_do_model(
+        consultas, lambda: model_servico_funcionarios.listar_servicos_por_funcionario("F7")
+    )
+    assert any("USING INDEX idx_servico_funcionarios_funcionario (cod_funcionario=?)" in p for p in plano), plano
+    assert "SEARCH s USING INTEGER PRIMARY KEY (rowid=?)" in plano, plano
+    _sem_varredura(plano)
+
+
+def test_buscar_servico_por_codigo_junta_pelas_chaves_inteiras(consultas):
+    plano = _plano_do_model(consultas, lambda: model_servico.buscar_servico_por_codigo("S42"))
+    assert any(p.startswith("SEARCH s USING INDEX") and "(cod_servico=?)" in p for p in plano), plano
+    for alias in ("u", "c", "e"):
+        assert f"SEARCH {alias} USING INTEGER PRIMARY KEY (rowid=?)" in plano, plano
+    _sem_varredura(plano)
+
+
+def test_indices_das_chaves_inteiras_no_lado_do_pai(banco):
+    # Listagens que partem do pai (serviços de uma unidade, etc.) usam os
+    # índices das colunas inteiras criados pela migração 5
+    with contextlib.closing(sqlite3.connect(str(banco))) as conn:
+        plano = _plano(conn, """
+            SELECT s.cod_servico FROM unidades u JOIN servicos s ON s.id_unidade = u.id
+            WHERE u.cod_unidade = 'U7'
+        """)
+    assert any("USING INDEX idx_servicos_id_unidade (id_unidade=?)" in p for p in plano), plano
+    _sem_varredura(plano)
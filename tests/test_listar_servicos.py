@@ -0,0 +1,78 @@
+# tests/test_listar_servicos.py
+# Colunas de model_servico.listar_servicos, com e sem o banco histórico anexado
+
+import contextlib
+import sqlite3
+
+import pytest
+
+from Database import db_changeset, db_gestaodecontratos as db
+from Models import model_servico
+
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica com S1 e S2, e um histórico de esquema antigo (sem tipo_servico) com S2 e S3."""
+    db.fechar_conexao()
+    for caminho in (db.DB_PATH, db.DB_PATH.with_name(db.DB_NAME + "-wal"),
+                    db.DB_PATH.with_name(db.DB_NAME + "-shm"), db.HISTORICO_PATH):
+        caminho.unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    # O histórico já está no disco: nada é buscado no Drive
+    monkeypatch.setattr(db, "_atualizar_historico", lambda folder_id: db.HISTORICO_PATH.exists())
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES ('C1', 'E1')")
+        conn.execute("INSERT INTO unidades (cod_unidade, numero_contrato) VALUES ('U1', 'C1')")
+        conn.executemany(
+            """
+            INSERT INTO servicos (cod_servico, cod_unidade, tipo_servico, data_criacao, data_execucao, status, observacoes)
+            VALUES (?, 'U1', 'Vistoria', ?, NULL, ?, 'obs')
+            """,
+            [("S1", "2024-03-01", "Pendente"), ("S2", "2023-01-01", "Encerrado")],
+        )
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    with contextlib.closing(sqlite3.connect(str(db.HISTORICO_PATH))) as conn:
+        conn.execute(
+            "CREATE TABLE servicos (id INTEGER, cod_servico TEXT, cod_unidade TEXT, data_execucao TEXT,"
+            " status TEXT, observacoes TEXT, data_criacao TEXT)"
+        )
+        conn.executemany(
+            "INSERT INTO servicos VALUES (?, ?, 'U1', ?, 'Encerrado', ?, ?)",
+            [(2, "S2", "2023-02-01", "antigo", "2023-01-01"), (3, "S3", "2021-06-01", None, "2021-05-01")],
+        )
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    yield
+    db.fechar_conexao()
+    db.HISTORICO_PATH.unlink(missing_ok=True)
+
+
+def _listar(**filtros) -> list:
+    return [tuple(s) for s in model_servico.listar_servicos(**filtros)]
+
+
+def test_colunas_na_ordem_das_telas(replica):
+    assert _listar() == [
+        ("S1", "U1", "Vistoria", "2024-03-01", None, "Pendente", "obs"),
+        ("S2", "U1", "Vistoria", "2023-01-01", None, "Encerrado", "obs"),
+    ]
+
+
+def test_historico_com_as_mesmas_colunas(replica):
+    # S2 está nos dois bancos (arquivamento interrompido): vale a linha da réplica;
+    # tipo_servico não existe no histórico e vem como NULL
+    assert _listar(incluir_historico=True) == [
+        ("S1", "U1", "Vistoria", "2024-03-01", None, "Pendente", "obs"),
+        ("S2", "U1", "Vistoria", "2023-01-01", None, "Encerrado", "obs"),
+        ("S3", "U1", None, "2021-05-01", "2021-06-01", "Encerrado", None),
+    ]
+    assert _listar(status=["Encerrado"], data_fim="2022-01-01", incluir_historico=True) == [
+        ("S3", "U1", None, "2021-05-01", "2021-06-01", "Encerrado", None),
+    ]
@@ -0,0 +1,81 @@
+# tests/test_memoria.py
+# Cópia em memória da réplica compartilhada pelas conexões de leitura
+
+import contextlib
+import sqlite3
+
+import pytest
+
+from Database import db_memoria
+
+
+@pytest.fixture
+def replica(tmp_path):
+    caminho = tmp_path / "replica.db"
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE empresas (cod_empresa TEXT)")
+        conn.execute("INSERT INTO empresas VALUES ('E1')")
+        conn.commit()
+    # Atraso longo: a cópia só é refeita quando o teste chama _atualizar()
+    memoria = db_memoria.ReplicaMemoria(
+        caminho, lambda: sqlite3.connect(str(caminho), check_same_thread=False), lambda: 0, atraso=3600
+    )
+    yield caminho, memoria
+    memoria.descartar()
+
+
+def _empresas(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT cod_empresa FROM empresas")}
+
+
+def test_leitores_compartilham_uma_copia(replica):
+    _, memoria = replica
+    assert memoria.abrir_leitor() is None  # Sem cópia ainda: leitura vai ao arquivo
+    memoria._atualizar()
+
+    leitores = [memoria.abrir_leitor() for _ in range(3)]
+    try:
+        # Uma tabela criada no banco em memória aparece para todos os leitores
+        with contextlib.closing(sqlite3.connect(memoria._uri, uri=True)) as conn:
+            conn.execute("CREATE TABLE marca (x)")
+        for leitor in leitores:
+            assert _empresas(leitor) == {"E1"}
+            assert leitor.execute("SELECT count(*) FROM marca").fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            leitores[0].execute("DELETE FROM empresas")
+    finally:
+        for leitor in leitores:
+            leitor.close()
+
+
+def test_commit_manda_leituras_ao_arquivo_ate_a_nova_copia(replica):
+    caminho, memoria = replica
+    memoria._atualizar()
+    antigo = memoria.abrir_leitor()
+
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        conn.execute("INSERT INTO empresas VALUES ('E2')")
+        conn.commit()
+
+    # A cópia atrasada não é entregue nem refeita na leitura: fica agendada
+    assert memoria.abrir_leitor() is None
+    assert memoria._timer is not None
+
+    memoria._atualizar()
+    novo = memoria.abrir_leitor()
+    try:
+        assert _empresas(novo) == {"E1", "E2"}
+        # O leitor aberto antes da troca continua com a cópia anterior até fechar
+        assert _empresas(antigo) == {"E1"}
+    finally:
+        novo.close()
+        antigo.close()
+
+
+def test_replica_grande_le_do_arquivo(replica):
+    _, memoria = replica
+    memoria.max_bytes = 10
+    memoria._atualizar()
+    assert not memoria.ativa()
+    assert memoria.abrir_leitor() is None
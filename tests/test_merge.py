@@ -0,0 +1,150 @@
+# tests/test_merge.py
+# Mesclagem three-way (db_merge.mesclar_snapshot) de réplicas com o esquema
+# migrado, e gravação pela chave natural (db_merge.gravar_linha)
+
+import contextlib
+import json
+import shutil
+import sqlite3
+
+import pytest
+
+from Database import db_merge, db_migracoes
+
+
+@pytest.fixture
+def replicas(tmp_path):
+    """Caminhos (base, local, remoto): três cópias do mesmo banco inicial."""
+    base = tmp_path / "base.db"
+    with contextlib.closing(sqlite3.connect(str(base))) as conn:
+        db_migracoes.aplicar_migracoes(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('Empresa', '1', 'E1')")
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES ('C1', 'E1')")
+        conn.executemany(
+            "INSERT INTO unidades (cod_unidade, numero_contrato, nome_unidade) VALUES (?, 'C1', ?)",
+            [("U1", "Unidade 1"), ("U2", "Unidade 2")],
+        )
+        conn.executemany(
+            "INSERT INTO servicos (cod_servico, cod_unidade, status) VALUES (?, ?, 'Ativo')",
+            [("S1", "U1"), ("S2", "U1"), ("S3", "U2")],
+        )
+        conn.commit()
+    local, remoto = tmp_path / "local.db", tmp_path / "remoto.db"
+    shutil.copy(base, local)
+    shutil.copy(base, remoto)
+    return base, local, remoto
+
+
+def _alterar(caminho, *comandos) -> None:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        for comando in comandos:
+            conn.execute(comando)
+        conn.commit()
+
+
+def _mesclar(replicas) -> list:
+    base, local, remoto = replicas
+    with contextlib.closing(sqlite3.connect(str(local))) as conn:
+        conflitos = db_merge.mesclar_snapshot(conn, base, remoto)
+        conn.commit()
+    return conflitos
+
+
+def _servicos(caminho) -> dict:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        return dict(conn.execute("SELECT cod_servico, status FROM servicos"))
+
+
+def _conflitos_registrados(caminho) -> list:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        return db_merge.listar_conflitos(conn)
+
+
+def test_alteracoes_em_linhas_diferentes_sao_combinadas(replicas):
+    base, local, remoto = replicas
+    _alterar(local, "UPDATE servicos SET status = 'Encerrado' WHERE cod_servico = 'S1'")
+    _alterar(
+        remoto,
+        "UPDATE servicos SET status = 'Pausada' WHERE cod_servico = 'S2'",
+        "INSERT INTO servicos (cod_servico, cod_unidade, status) VALUES ('S4', 'U2', 'Ativo')",
+        "DELETE FROM servicos WHERE cod_servico = 'S3'",
+    )
+
+    assert _mesclar(replicas) == []
+    assert _servicos(local) == {"S1": "Encerrado", "S2": "Pausada", "S4": "Ativo"}
+    assert _conflitos_registrados(local) == []
+
+
+def test_mesma_linha_alterada_nos_dois_lados_fica_registrada(replicas):
+    base, local, remoto = replicas
+    _alterar(local, "UPDATE servicos SET status = 'Encerrado' WHERE cod_servico = 'S1'")
+    _alterar(remoto, "UPDATE servicos SET status = 'Pausada' WHERE cod_servico = 'S1'")
+
+    conflitos = _mesclar(replicas)
+
+    assert [(c["tabela"], c["chave"]) for c in conflitos] == [("servicos", {"cod_servico": "S1"})]
+    assert _servicos(local)["S1"] == "Encerrado"  # vale a versão local
+    (registro,) = _conflitos_registrados(local)
+    _, tabela, chave, versao_local, versao_remota, _, resolvido = registro
+    assert (tabela, json.loads(chave), resolvido) == ("servicos", {"cod_servico": "S1"}, 0)
+    assert json.loads(versao_local)["status"] == "Encerrado"
+    assert json.loads(versao_remota)["status"] == "Pausada"
+    # O id e as colunas locais (id_unidade) não entram na comparação
+    assert "id" not in json.loads(versao_remota) and "id_unidade" not in json.loads(versao_remota)
+
+
+def test_mesma_alteracao_nos_dois_lados_nao_e_conflito(replicas):
+    base, local, remoto = replicas
+    for caminho in (local, remoto):
+        _alterar(caminho, "UPDATE servicos SET status = 'Encerrado' WHERE cod_servico = 'S1'")
+
+    assert _mesclar(replicas) == []
+    assert _conflitos_registrados(local) == []
+
+
+def test_remocao_remota_de_linha_editada_localmente_e_conflito(replicas):
+    base, local, remoto = replicas
+    _alterar(local, "UPDATE servicos SET status = 'Encerrado' WHERE cod_servico = 'S2'")
+    _alterar(remoto, "DELETE FROM servicos WHERE cod_servico = 'S2'")
+
+    (conflito,) = _mesclar(replicas)
+
+    assert conflito["chave"] == {"cod_servico": "S2"}
+    assert conflito["local"]["status"] == "Encerrado" and conflito["remoto"] is None
+    assert _servicos(local)["S2"] == "Encerrado"  # a edição local não é perdida
+    (registro,) = _conflitos_registrados(local)
+    assert registro[4] is None
+
+
+def test_gravar_linha_nao_reaproveita_id_ocupado_e_recalcula_chaves_inteiras(replicas):
+    base, local, remoto = replicas
+    with contextlib.closing(sqlite3.connect(str(local))) as conn:
+        id_u1, id_u2 = (conn.execute("SELECT id FROM unidades WHERE cod_unidade = ?", (c,)).fetchone()[0] for c in ("U1", "U2"))
+
+        # Serviço remoto chega antes da unidade e com o id de S1 na origem
+        id_s1 = conn.execute("SELECT id FROM servicos WHERE cod_servico = 'S1'").fetchone()[0]
+        db_merge.gravar_linha(conn, "servicos", ("cod_servico",), {
+            "id": id_s1, "cod_servico": "S9", "cod_unidade": "U9", "status": "Ativo",
+        })
+        s9 = conn.execute("SELECT id, id_unidade FROM servicos WHERE cod_servico = 'S9'").fetchone()
+        assert s9[0] != id_s1 and s9[1] is None
+        assert conn.execute("SELECT cod_servico FROM servicos WHERE id = ?", (id_s1,)).fetchone()[0] == "S1"
+
+        # Unidade remota com o id de U1 na origem: ganha outro id, e o serviço
+        # que chegou antes passa a apontar para ele, não para U1
+        db_merge.gravar_linha(conn, "unidades", ("cod_unidade",), {
+            "id": id_u1, "cod_unidade": "U9", "numero_contrato": "C1", "nome_unidade": "Unidade 9",
+        })
+        id_u9 = conn.execute("SELECT id FROM unidades WHERE cod_unidade = 'U9'").fetchone()[0]
+        assert id_u9 not in (id_u1, id_u2)
+        assert conn.execute("SELECT id_unidade FROM servicos WHERE cod_servico = 'S9'").fetchone()[0] == id_u9
+        assert conn.execute("SELECT cod_unidade FROM unidades WHERE id = ?", (id_u1,)).fetchone()[0] == "U1"
+
+        # Atualização pela chave natural com o id da outra réplica: a linha
+        # local mantém o id e o id_unidade segue a nova unidade
+        db_merge.gravar_linha(conn, "servicos", ("cod_servico",), {
+            "id": 999, "cod_servico": "S1", "cod_unidade": "U2", "status": "Pausada",
+        })
+        assert conn.execute(
+            "SELECT id, id_unidade, status FROM servicos WHERE cod_servico = 'S1'"
+        ).fetchone() == (id_s1, id_u2, "Pausada")
@@ -0,0 +1,112 @@
+# tests/test_migracoes.py
+# Execução das migrações (db_migracoes.aplicar_migracoes): banco anterior às
+# migrações levado versão a versão, segunda execução sem efeito e falha que
+# mantém a versão da última migração concluída
+
+import contextlib
+import sqlite3
+
+import pytest
+
+from Database import db_migracoes, db_textos
+
+ESPECIFICACOES = "especificação " * 100   # acima de DB_TEXTO_LIMITE
+
+
+def _tabelas(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def _indices(conn) -> set:
+    return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def _esquema(conn) -> list:
+    return conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY type, name").fetchall()
+
+
+# O que cada versão deixa no banco
+VERIFICACOES = {
+    1: lambda conn: {"empresas", "contratos", "unidades", "servicos", "servico_funcionarios"} <= _tabelas(conn),
+    2: lambda conn: (
+        {"tipo_servico", "data_criacao"} <= db_migracoes._colunas(conn, "servicos")
+        and "arquivos_servico" in _tabelas(conn)
+    ),
+    3: lambda conn: {nome for nome, _, _ in db_migracoes.INDICES} <= _indices(conn),
+    4: lambda conn: conn.execute(
+        "SELECT especificacoes_ref IS NOT NULL AND length(especificacoes) < ? FROM contratos",
+        (len(ESPECIFICACOES),),
+    ).fetchone()[0] == 1,
+    5: lambda conn: conn.execute(
+        "SELECT u.id_contrato = c.id FROM unidades u JOIN contratos c USING (numero_contrato)"
+    ).fetchone()[0] == 1,
+}
+
+
+@pytest.fixture
+def banco_legado(tmp_path):
+    """Banco criado antes das migrações: tabelas iniciais e dados, user_version 0."""
+    caminho = tmp_path / "legado.db"
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        db_migracoes._m001_esquema_inicial(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.execute(
+            "INSERT INTO contratos (numero_contrato, cod_empresa, especificacoes) VALUES ('C1', 'E1', ?)",
+            (ESPECIFICACOES,),
+        )
+        conn.execute("INSERT INTO unidades (cod_unidade, numero_contrato) VALUES ('U1', 'C1')")
+        conn.commit()
+        assert db_migracoes.versao_esquema(conn) == 0
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        yield conn
+
+
+def test_cada_migracao_leva_a_proxima_versao(banco_legado, monkeypatch):
+    conn = banco_legado
+    for versao, _, _ in db_migracoes.MIGRACOES:
+        with monkeypatch.context() as m:
+            m.setattr(db_migracoes, "MIGRACOES", db_migracoes.MIGRACOES[:versao])
+            m.setattr(db_migracoes, "VERSAO_ESQUEMA", versao)
+            assert db_migracoes.aplicar_migracoes(conn) == [versao]
+        assert db_migracoes.versao_esquema(conn) == versao
+        assert VERIFICACOES[versao](conn)
+
+    assert set(VERIFICACOES) == {v for v, _, _ in db_migracoes.MIGRACOES}
+    # O texto longo continua acessível pela referência
+    ref = conn.execute("SELECT especificacoes_ref FROM contratos").fetchone()[0]
+    assert db_textos._ler_local(ref) == ESPECIFICACOES
+
+
+def test_segunda_execucao_nao_altera_nada(banco_legado):
+    conn = banco_legado
+    assert db_migracoes.aplicar_migracoes(conn) == [v for v, _, _ in db_migracoes.MIGRACOES]
+    esquema = _esquema(conn)
+    dados = conn.execute("SELECT * FROM contratos").fetchall()
+
+    assert db_migracoes.aplicar_migracoes(conn) == []
+
+    assert db_migracoes.versao_esquema(conn) == db_migracoes.VERSAO_ESQUEMA
+    assert _esquema(conn) == esquema
+    assert conn.execute("SELECT * FROM contratos").fetchall() == dados
+
+
+def test_migracao_com_erro_mantem_a_versao_anterior(banco_legado, monkeypatch):
+    conn = banco_legado
+
+    def falhar(conn):
+        conn.execute("CREATE TABLE parcial (id INTEGER)")
+        conn.execute("ALTER TABLE contratos ADD COLUMN parcial TEXT")
+        raise sqlite3.OperationalError("falha no meio da migração")
+
+    migracoes = [*db_migracoes.MIGRACOES[:3], (4, "falha", falhar), *db_migracoes.MIGRACOES[4:]]
+    monkeypatch.setattr(db_migracoes, "MIGRACOES", migracoes)
+
+    with pytest.raises(sqlite3.OperationalError):
+        db_migracoes.aplicar_migracoes(conn)
+
+    # 1–3 concluídas; da 4 nada ficou, e a 5 não foi tentada
+    assert db_migracoes.versao_esquema(conn) == 3
+    assert "parcial" not in _tabelas(conn)
+    assert "parcial" not in db_migracoes._colunas(conn, "contratos")
+    assert "id_contrato" not in db_migracoes._colunas(conn, "unidades")
+    assert not conn.in_transaction
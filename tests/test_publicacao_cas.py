@@ -0,0 +1,220 @@
+# tests/test_publicacao_cas.py
+# Publicação do snapshot por compare-and-swap no etag do Drive: conflito (412),
+# mesclagem da versão remota e nova tentativa
+
+import contextlib
+import hashlib
+import sqlite3
+import types
+
+import pytest
+
+from Database import db_blocos, db_changeset, db_gestaodecontratos as db
+from Services import Service_googledrive as gdrive
+
+FOLDER_ID = "pasta-testes"
+
+
+def _empresas(caminho) -> set:
+    with contextlib.closing(sqlite3.connect(str(caminho))) as conn:
+        return {r[0] for r in conn.execute("SELECT cod_empresa FROM empresas")}
+
+
+def _pendentes() -> int:
+    with contextlib.closing(db._conectar()) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {db_changeset.CHANGELOG_TABLE}").fetchone()[0]
+
+
+class ArquivoRemoto:
+    """Versões do arquivo DB_NAME no DriveFalso, com upload condicional pelo etag.
+
+    `concorrente`, se definido, é chamado antes de cada upload condicional:
+    simula outra instância que publica entre a mesclagem e o envio.
+    """
+
+    def __init__(self, drive):
+        self.drive = drive
+        self.versao = 0
+        self.tentativas = []
+        self.concorrente = None
+
+    def meta(self, file_id: str) -> dict:
+        dados = self.drive.arquivos[file_id]["dados"]
+        return {
+            "id": file_id,
+            "etag": f"etag-{self.versao}",
+            "headRevisionId": f"rev-{self.versao}",
+            "md5Checksum": hashlib.md5(dados).hexdigest(),
+        }
+
+    def substituir(self, file_id: str, caminho) -> dict:
+        self.drive.arquivos[file_id]["dados"] = caminho.read_bytes()
+        self.versao += 1
+        return self.meta(file_id)
+
+    def update_file_if_match(self, file_id, caminho, etag) -> dict:
+        if self.concorrente:
+            self.concorrente()
+        self.tentativas.append(etag)
+        if etag != self.meta(file_id)["etag"]:
+            raise gdrive.RevisionConflictError(file_id, etag)
+        return self.substituir(file_id, caminho)
+
+
+@pytest.fixture
+def replica(monkeypatch, drive):
+    """Réplica com a empresa E1 já publicada no DriveFalso (uma réplica nova, sem versão registrada)."""
+    db.fechar_conexao()
+    for caminho in (db.DB_PATH, db.DB_PATH.with_name(db.DB_NAME + "-wal"),
+                    db.DB_PATH.with_name(db.DB_NAME + "-shm"), db.BASE_PATH):
+        caminho.unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_replica", db._EstadoReplica(versao_path=db.VERSAO_PATH.with_name("cas.versao.json")))
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    remoto = ArquivoRemoto(drive)
+    monkeypatch.setattr(gdrive, "update_file_if_match", remoto.update_file_if_match)
+    monkeypatch.setattr(gdrive, "get_file_version", remoto.meta)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.commit()
+    with db._replica.lock:
+        assert db._publicar_banco(FOLDER_ID)
+    db._replica.renovar_lease()
+    yield remoto
+    db.fechar_conexao()
+
+
+def _gravar_local(cod_empresa: str) -> None:
+    with contextlib.closing(db._conectar()) as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES (?, ?, ?)", (cod_empresa, cod_empresa, cod_empresa))
+        conn.commit()
+
+
+def _publicar_por_outra_instancia(remoto: ArquivoRemoto, cod_empresa: str, tmp_path) -> None:
+    """Outra instância baixa a versão atual, cadastra `cod_empresa` e publica em blocos."""
+    drive = remoto.drive
+    file_id = drive.get_file_id_by_name(db.DB_NAME, FOLDER_ID)
+    copia = tmp_path / f"outra_{cod_empresa}.db"
+    db._baixar_verificado(file_id, copia, remoto.meta(file_id), FOLDER_ID, locais=())
+    with contextlib.closing(sqlite3.connect(str(copia))) as conn:
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES (?, ?, ?)", (cod_empresa, cod_empresa, cod_empresa))
+        conn.commit()
+    manifesto = db_blocos.enviar_blocos(copia, db.DB_NAME, FOLDER_ID)
+    comprimido = tmp_path / db.DB_NAME
+    db_blocos.gravar_manifesto(manifesto, comprimido)
+    remoto.substituir(file_id, comprimido)
+
+
+def _conteudo_publicado(remoto: ArquivoRemoto, tmp_path) -> set:
+    file_id = remoto.drive.get_file_id_by_name(db.DB_NAME, FOLDER_ID)
+    destino = tmp_path / "publicado.db"
+    db._baixar_verificado(file_id, destino, remoto.meta(file_id), FOLDER_ID, locais=())
+    return _empresas(destino)
+
+
+def test_conflito_mescla_e_publica_de_novo(replica, tmp_path):
+    _publicar_por_outra_instancia(replica, "E2", tmp_path)
+    _gravar_local("E3")
+
+    with db._replica.lock:
+        assert db._publicar_banco(FOLDER_ID)
+
+    # 1ª tentativa com o etag conhecido (412), 2ª com o etag da versão mesclada
+    assert replica.tentativas == ["etag-0", "etag-1"]
+    assert _empresas(db.DB_PATH) == {"E1", "E2", "E3"}
+    assert _conteudo_publicado(replica, tmp_path) == {"E1", "E2", "E3"}
+    assert db._replica.etag == "etag-2"
+    assert _empresas(db.BASE_PATH) == {"E1", "E2", "E3"}
+    assert _pendentes() == 0
+
+
+def test_tentativas_esgotadas_mantem_pendencias_e_invalidam_o_lease(replica, tmp_path):
+    _gravar_local("E3")
+    publicadas = iter(["E4", "E5", "E6"])
+    replica.concorrente = lambda: _publicar_por_outra_instancia(replica, next(publicadas), tmp_path)
+
+    with db._replica.lock:
+        assert not db._publicar_banco(FOLDER_ID)
+
+    assert len(replica.tentativas) == db._TENTATIVAS_PUBLICACAO
+    # Cada conflito mesclou a versão remota; a escrita local não foi publicada
+    assert _empresas(db.DB_PATH) == {"E1", "E3", "E4", "E5", "E6"}
+    replica.concorrente = None
+    assert "E3" not in _conteudo_publicado(replica, tmp_path)
+    assert _pendentes() > 0
+    assert db._replica.verificado_em is None
+
+
+def test_mesclagem_impossivel_desiste_sem_nova_tentativa(replica, tmp_path):
+    _publicar_por_outra_instancia(replica, "E2", tmp_path)
+    _gravar_local("E3")
+    db.BASE_PATH.unlink()  # sem a versão base não há three-way merge
+
+    with db._replica.lock:
+        assert not db._publicar_banco(FOLDER_ID)
+
+    assert replica.tentativas == ["etag-0"]
+    assert _empresas(db.DB_PATH) == {"E1", "E3"}
+    assert _pendentes() > 0
+    assert db._replica.verificado_em is None
+
+
+def test_enviar_snapshot_sem_etag_conhecido_e_conflito(replica):
+    _gravar_local("E3")
+    db._replica.etag = None
+    file_id = db._replica.file_id
+    with pytest.raises(gdrive.RevisionConflictError):
+        db._enviar_snapshot(file_id, FOLDER_ID)
+    assert replica.tentativas == []
+
+
+# ───────────── update_file_if_match contra a API (requisição falsa) ─────────────
+
+class _Requisicao:
+    def __init__(self, respostas: list, cabecalhos: list):
+        self.headers = {}
+        self._respostas = respostas
+        self._cabecalhos = cabecalhos
+
+    def execute(self):
+        self._cabecalhos.append(dict(self.headers))
+        resposta = self._respostas.pop(0)
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+
+def _erro_http(status: int) -> Exception:
+    return gdrive.HttpError(types.SimpleNamespace(status=status, reason=""), b"")
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """Serviço v2 falso: cada execute() consome uma resposta de `respostas`."""
+    respostas, cabecalhos = [], []
+    servico = types.SimpleNamespace(
+        files=lambda: types.SimpleNamespace(update=lambda **kwargs: _Requisicao(respostas, cabecalhos))
+    )
+    monkeypatch.setattr(gdrive, "_get_service_v2", lambda: servico)
+    monkeypatch.setattr(gdrive, "MediaFileUpload", lambda *args, **kwargs: None)
+    monkeypatch.setattr(gdrive, "RETRY_DELAY", 0)
+    arquivo = tmp_path / "db_gestaodecontratos.db"
+    arquivo.write_bytes(b"conteudo")
+    return respostas, cabecalhos, arquivo
+
+
+def test_update_file_if_match_412_levanta_conflito_sem_repetir(api):
+    respostas, cabecalhos, arquivo = api
+    respostas.append(_erro_http(412))
+    with pytest.raises(gdrive.RevisionConflictError) as erro:
+        gdrive.update_file_if_match("arquivo-1", arquivo, "etag-1")
+    assert (erro.value.file_id, erro.value.expected_etag) == ("arquivo-1", "etag-1")
+    assert cabecalhos == [{"If-Match": "etag-1"}]
+
+
+def test_update_file_if_match_repete_falha_transitoria(api):
+    respostas, cabecalhos, arquivo = api
+    respostas.extend([_erro_http(503), {"id": "arquivo-1", "etag": "etag-2"}])
+    assert gdrive.update_file_if_match("arquivo-1", arquivo, "etag-1") == {"id": "arquivo-1", "etag": "etag-2"}
+    assert cabecalhos == [{"If-Match": "etag-1"}] * 2
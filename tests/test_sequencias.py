@@ -0,0 +1,78 @@
+# tests/test_sequencias.py
+# Códigos de serviço reservados pela sequência e colisões com outras réplicas
+
+import contextlib
+
+import pytest
+import streamlit as st
+
+from Database import db_changeset, db_sequencias, db_gestaodecontratos as db
+from Models import model_servico
+
+FOLDER_ID = "pasta-testes"
+
+
+def _sequencias() -> set:
+    with db.obter_conexao_leitura() as conn:
+        return {r[0] for r in conn.execute(f"SELECT nome FROM {db_sequencias.SEQUENCIAS_TABLE}")}
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica local com a unidade U1 (contrato C1, empresa E1), dentro do lease."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", lambda folder_id: None)
+    monkeypatch.setattr(db_sequencias, "_reservados", {})
+    monkeypatch.setitem(st.session_state, model_servico._BLOCOS_SESSAO, {})
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES ('C1', 'E1')")
+        conn.execute("INSERT INTO unidades (cod_unidade, numero_contrato) VALUES ('U1', 'C1')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    yield db.DB_PATH
+    db.fechar_conexao()
+
+
+def _criar(cod_servico: str) -> bool:
+    with db.unit_of_work():
+        return model_servico.criar_servico(
+            cod_servico, "U1", "Inspeção", "2025-01-02", None, "Pendente", "", pasta_servico_id="P-" + cod_servico
+        )
+
+
+def test_codigo_gravado_por_outra_replica_gera_outro(replica):
+    reservado = model_servico.gerar_codigo_servico()
+    # O mesmo código chega de outra réplica (mesclagem) antes do cadastro ser gravado
+    with db.obter_conexao() as conn:
+        conn.execute("INSERT INTO servicos (cod_servico, cod_unidade) VALUES (?, 'U1')", (reservado,))
+
+    with pytest.raises(model_servico.CodigoServicoEmUso):
+        _criar(reservado)
+
+    novo = model_servico.gerar_codigo_servico()
+    assert novo != reservado
+    assert _criar(novo)
+    with db.obter_conexao_leitura() as conn:
+        assert conn.execute("SELECT pasta_servico FROM servicos WHERE cod_servico = ?", (novo,)).fetchone()[0] == "P-" + novo
+
+
+def test_sequencias_sem_uso_sao_descartadas(replica):
+    with db.obter_conexao() as conn:
+        db_sequencias.reservar(conn, "servico:OS_20000101_")
+        db_sequencias.reservar(conn, "arquivo:OS_20000101_001")
+        conn.execute("INSERT INTO servicos (cod_servico, cod_unidade) VALUES ('OS_20000101_001', 'U1')")
+
+    codigo = model_servico.gerar_codigo_servico()
+    assert _sequencias() == {"servico:" + codigo[:-3], "arquivo:OS_20000101_001"}
+    # Bloco de um código já consumido: nada fica na sessão
+    assert st.session_state[model_servico._BLOCOS_SESSAO] == {}
+
+    assert model_servico.deletar_servico("OS_20000101_001") is not None
+    assert _sequencias() == {"servico:" + codigo[:-3]}
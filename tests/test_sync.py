@@ -0,0 +1,91 @@
+# tests/test_sync.py
+# Outbox persistente do SincronizadorDrive: falha mantida na fila e repetida
+# com backoff, entrega única e em ordem depois do reinício do processo
+
+import threading
+import time
+
+from Database import db_sync
+
+ESPERA = 5.0  # limite dos testes para qualquer publicação
+
+
+class Publicador:
+    """Publicação falsa: levanta enquanto houver falhas em `falhas` e registra cada chamada."""
+
+    def __init__(self, falhas: int = 0):
+        self.falhas = falhas
+        self.chamadas = []     # (folder_id, time.monotonic())
+        self.publicadas = []
+        self.evento = threading.Event()
+        self.ao_publicar = None
+
+    def __call__(self, folder_id: str) -> None:
+        self.chamadas.append((folder_id, time.monotonic()))
+        self.evento.set()
+        if self.ao_publicar:
+            self.ao_publicar()
+        if self.falhas:
+            self.falhas -= 1
+            raise IOError("Drive indisponível")
+        self.publicadas.append(folder_id)
+
+
+def _esperar(condicao) -> None:
+    limite = time.monotonic() + ESPERA
+    while not condicao():
+        assert time.monotonic() < limite, "tempo esgotado"
+        time.sleep(0.01)
+
+
+def test_falha_fica_na_fila_e_e_repetida_com_backoff(tmp_path):
+    publicar = Publicador(falhas=2)
+    fila_na_terceira = []
+
+    def observar_fila():
+        if len(publicar.chamadas) == 3:
+            fila_na_terceira.extend(sync.fila())
+
+    publicar.ao_publicar = observar_fila
+    sync = db_sync.SincronizadorDrive(
+        publicar, janela=0, espera_erro=0.1, espera_erro_maxima=1.0, caminho_outbox=tmp_path / "outbox.db"
+    )
+
+    ticket = sync.agendar("pasta-1")
+    assert sync.aguardar(ticket, ESPERA)
+
+    assert publicar.publicadas == ["pasta-1"]
+    instantes = [t for _, t in publicar.chamadas]
+    assert len(instantes) == 3
+    # Backoff exponencial: espera_erro após a 1ª falha, o dobro após a 2ª
+    assert instantes[1] - instantes[0] >= 0.1
+    assert instantes[2] - instantes[1] >= 0.2
+    # Até a publicação dar certo o item continuava na fila, com as tentativas e o erro
+    (item,) = fila_na_terceira
+    assert (item["folder_id"], item["tentativas"], item["ultimo_erro"]) == ("pasta-1", 2, "Drive indisponível")
+    assert sync.fila() == []
+    assert sync.status()["ultimo_erro"] is None
+
+
+def test_fila_retomada_apos_reinicio_entrega_uma_vez_em_ordem(tmp_path):
+    caminho = tmp_path / "outbox.db"
+    # 1º processo: o Drive falha e a próxima tentativa ficaria para bem depois
+    falhando = Publicador(falhas=10**6)
+    anterior = db_sync.SincronizadorDrive(falhando, janela=0.2, espera_erro=3600, caminho_outbox=caminho)
+    anterior.agendar("pasta-1")
+    anterior.agendar("pasta-2")
+    anterior.agendar("pasta-1")
+    _esperar(lambda: len(anterior.fila()) == 2 and all(i["tentativas"] for i in anterior.fila()))
+    assert [i["escritas"] for i in anterior.fila()] == [2, 1]
+
+    # 2º processo: a fila em disco é retomada sem nenhuma escrita nova
+    publicar = Publicador()
+    sync = db_sync.SincronizadorDrive(publicar, janela=0, espera_erro=3600, caminho_outbox=caminho)
+    assert sync.aguardar(1, ESPERA)
+
+    assert publicar.publicadas == ["pasta-1", "pasta-2"]
+    assert sync.fila() == []
+    # Nada volta a ser publicado depois que a fila esvazia
+    publicar.evento.clear()
+    assert not publicar.evento.wait(0.3)
+    assert publicar.publicadas == ["pasta-1", "pasta-2"]
@@ -0,0 +1,85 @@
+# tests/test_unit_of_work.py
+# Unidade de trabalho (db.unit_of_work): uma transação e uma publicação para
+# várias operações; exceção ou rollback de uma operação desfaz tudo
+
+import contextlib
+import sqlite3
+
+import pytest
+
+from Database import db_changeset, db_gestaodecontratos as db
+
+FOLDER_ID = "pasta-testes"
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """Réplica com a empresa E1; devolve a lista de publicações agendadas."""
+    db.fechar_conexao()
+    for sufixo in ("", "-wal", "-shm"):
+        db.DB_PATH.with_name(db.DB_PATH.name + sufixo).unlink(missing_ok=True)
+    agendadas = []
+    monkeypatch.setattr(db, "_get_drive_folder_id", lambda: FOLDER_ID)
+    monkeypatch.setattr(db._sincronizador, "agendar", agendadas.append)
+    with contextlib.closing(db._conectar()) as conn:
+        db.inicializar_tabelas(conn)
+        conn.execute("INSERT INTO empresas (nome, cnpj, cod_empresa) VALUES ('A', '1', 'E1')")
+        db_changeset.descartar_pendencias(conn)
+        conn.commit()
+    db._replica.folder_id = FOLDER_ID
+    db._replica.renovar_lease()
+    yield agendadas
+    db.fechar_conexao()
+
+
+def _inserir_contrato(numero: str) -> None:
+    """Como os models: conexão própria, commit ao sair do with."""
+    with db.obter_conexao() as conn:
+        conn.execute("INSERT INTO contratos (numero_contrato, cod_empresa) VALUES (?, 'E1')", (numero,))
+
+
+def _contratos() -> set:
+    """Contratos confirmados, vistos por uma conexão fora do pool."""
+    with contextlib.closing(sqlite3.connect(str(db.DB_PATH))) as conn:
+        return {r[0] for r in conn.execute("SELECT numero_contrato FROM contratos")}
+
+
+def test_operacoes_confirmadas_juntas_com_uma_publicacao(replica):
+    with db.unit_of_work():
+        _inserir_contrato("C1")
+        with db.unit_of_work():   # unidade aninhada participa da externa
+            _inserir_contrato("C2")
+        # Nada confirmado ainda: outra conexão não vê as linhas
+        assert _contratos() == set()
+
+    assert _contratos() == {"C1", "C2"}
+    assert replica == [FOLDER_ID]
+
+
+def test_excecao_no_bloco_desfaz_todas_as_operacoes(replica):
+    with pytest.raises(RuntimeError):
+        with db.unit_of_work():
+            _inserir_contrato("C1")
+            _inserir_contrato("C2")
+            raise RuntimeError("falha depois das gravações")
+
+    assert _contratos() == set()
+    assert replica == []
+
+
+def test_rollback_de_uma_operacao_desfaz_a_unidade(replica):
+    with pytest.raises(db.TransacaoDesfeita):
+        with db.unit_of_work():
+            _inserir_contrato("C1")
+            # Operação que trata o próprio erro (rollback) sem propagar a exceção
+            try:
+                _inserir_contrato("C1")
+            except Exception:
+                pass
+            _inserir_contrato("C2")
+
+    assert _contratos() == set()
+    assert replica == []
+    # A conexão de escrita volta ao pool sem transação nem unidade pendente
+    _inserir_contrato("C3")
+    assert _contratos() == {"C3"}